@@ -0,0 +1,99 @@
+import glob
+import os
+import threading
+
+PARAM_FILE_PATTERNS = ('*.txt', '*.params', '*.json')
+
+
+def expand_param_paths(paths):
+    """Turn a mix of parameter files and directories into a sorted list of files"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in PARAM_FILE_PATTERNS:
+                files.extend(glob.glob(os.path.join(path, pattern)))
+        else:
+            files.append(path)
+    seen = set()
+    unique = []
+    for path in sorted(files):
+        real = os.path.realpath(path)
+        if real not in seen:
+            seen.add(real)
+            unique.append(path)
+    return unique
+
+
+def dedupe_by_env_name(entries):
+    """Keep the first (path, params) per ENV_NAME; returns (kept, skipped) lists"""
+    kept = []
+    skipped = []
+    owners = {}
+    for path, params in entries:
+        env_name = params.get('ENV_NAME')
+        if not env_name:
+            skipped.append((path, "no ENV_NAME"))
+        elif env_name in owners:
+            skipped.append((path, f"duplicate ENV_NAME '{env_name}' (already in {owners[env_name]})"))
+        else:
+            owners[env_name] = path
+            kept.append((path, params))
+    return kept, skipped
+
+
+class TriggerLimiter:
+    """Caps how many triggered builds may be waiting for an executor at once
+
+    A slot is taken just before a build is triggered and given back as soon
+    as the build has left the queue, so the batch never queues more builds
+    than Jenkins has executors free to run them.
+    """
+
+    def __init__(self, limit):
+        self.limit = max(1, limit)
+        self._semaphore = threading.BoundedSemaphore(self.limit)
+
+    def __enter__(self):
+        self._semaphore.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._semaphore.release()
+
+
+def trigger_limit(client, configured_limit):
+    """Concurrent trigger cap: the configured limit, lowered to the number of idle executors"""
+    try:
+        computer = client.get_json("computer/api/json", params={'tree': 'busyExecutors,totalExecutors'},
+                                   max_age=0)
+        idle = computer.get('totalExecutors', 0) - computer.get('busyExecutors', 0)
+    except Exception as e:
+        print(f"⚠️  Could not read executor capacity ({e}), using limit of {configured_limit}")
+        return configured_limit
+    if idle <= 0:
+        print("⚠️  No idle executors right now; triggering one build at a time")
+        return 1
+    return min(configured_limit, idle)
+
+
+def format_summary(results):
+    """Per-environment summary table for a finished batch"""
+    headers = ('ENV', 'Build', 'Status', 'MySQL', 'Time', 'Source / note')
+    rows = []
+    for result in results:
+        rows.append((
+            result.get('env_name') or '-',
+            f"#{result['build_number']}" if result.get('build_number') else '-',
+            result.get('status') or '-',
+            {True: '✓', False: '✗'}.get(result.get('mysql_ok'), '-'),
+            f"{result['elapsed']:.0f}s" if result.get('elapsed') is not None else '-',
+            result.get('error') or result.get('path') or '',
+        ))
+    widths = [max(len(str(row[i])) for row in rows + [headers]) for i in range(len(headers))]
+    lines = [_format_row(headers, widths), _format_row(['-' * width for width in widths], widths)]
+    lines.extend(_format_row(row, widths) for row in rows)
+    return '\n'.join(lines)
+
+
+def _format_row(values, widths):
+    return '  '.join(str(value).ljust(width) for value, width in zip(values, widths)).rstrip()
@@ -0,0 +1,111 @@
+"""Export benchmark: table_export against synthetic rows generated on the fly
+
+A fake connection hands out rows through fetchmany() the way pymysql's
+SSCursor does, so multi-million-row exports run without a MySQL server and
+the peak memory shows whether anything accumulates rows.
+
+Run from the repository root:  python -m benchmarks.bench_export [ROWS ...]
+"""
+import datetime
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from table_export import export_tables
+
+ROW_COUNTS = [100000, 1000000]
+COLUMNS = [['id', 'int(11)', 'NO', 'PRI'], ['email', 'varchar(255)', 'NO', 'UNI'], ['name', 'varchar(64)', 'YES', ''],
+           ['created_at', 'datetime', 'NO', ''], ['balance', 'decimal(10,2)', 'YES', '']]
+EPOCH = datetime.datetime(2024, 1, 1)
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.description = [(column[0],) for column in COLUMNS]
+        self._next = 1
+        self._end = rows + 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def execute(self, sql, args=()):
+        if 'MIN(' in sql:
+            self._result = [(1, self.rows)]
+        elif args:
+            self._next, self._end = args
+        self.sql = sql
+
+    def fetchone(self):
+        return self._result[0]
+
+    def fetchmany(self, size):
+        stop = min(self._next + size, self._end)
+        chunk = [(i, f"user{i}@example.com", None if i % 10 == 0 else f"User {i}",
+                  EPOCH + datetime.timedelta(seconds=i), i * 1.5) for i in range(self._next, stop)]
+        self._next = stop
+        return chunk
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self.rows)
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    database = 'cloudways_new'
+
+    def __init__(self, rows):
+        self.connection = FakeConnection(rows)
+
+    def columns(self):
+        return {'users': COLUMNS}
+
+    def open_connection(self):
+        return FakeConnection(self.connection.rows)
+
+
+def _export(rows, fmt, workers, split, directory):
+    return export_tables(FakeSession(rows), ['users'], directory, fmt=fmt, workers=workers, split=split,
+                         cursor_factory=lambda connection: connection.cursor())
+
+
+def run(row_counts=ROW_COUNTS):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in row_counts:
+            for fmt in ('csv', 'ndjson'):
+                for workers, split in ((1, 1), (4, 4)):
+                    started = time.perf_counter()
+                    exported = _export(rows, fmt, workers, split, directory)[0]
+                    elapsed = time.perf_counter() - started
+                    if exported['rows'] != rows:
+                        raise AssertionError(f"exported {exported['rows']} rows, expected {rows}")
+                    results.append({'rows': rows, 'format': fmt, 'workers': workers, 'split': split,
+                                    'seconds': round(elapsed, 3), 'rows_per_s': round(rows / elapsed),
+                                    'output_mb': round(exported['bytes'] / 1024 / 1024, 2)})
+        # Peak memory of a single-connection export, on the smallest table (tracemalloc is slow)
+        tracemalloc.start()
+        _export(min(row_counts), 'csv', 1, 1, directory)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {'exports': results, 'peak_mb': round(peak / 1024 / 1024, 2), 'peak_rows': min(row_counts)}
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or ROW_COUNTS
+    print(json.dumps(run(counts), indent=2))
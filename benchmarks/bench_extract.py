@@ -0,0 +1,100 @@
+"""Micro-benchmark: streaming ConsoleExtractor vs. the original regex-per-field extract_info
+
+Run from the repository root:  python -m benchmarks.bench_extract
+"""
+import json
+import re
+import sys
+import time
+import tracemalloc
+
+from extractor import extract_from_text
+from benchmarks.synthetic_logs import generate_console_log
+
+SIZES_MB = [1, 10, 40]
+REPEATS = 3
+
+
+def legacy_extract_info(console_output):
+    """The original extract_info implementation, kept as the benchmark baseline"""
+    patterns = {
+        "elk": r"ELK EndPoint:\s*(\S+)",
+        "scannerapi": r"Scannerapi EndPoint:\s*(\S+)",
+        "alb": r"ALB EndPoint:\s*(\S+)",
+        "cnc": r"cnc EndPoint:\s*(\S+)",
+        "api": r"api-endpoint:\s*(\S+)",
+        "private_ips": r"Instance PrivateIP:\s*((?:\d{1,3}\.){3}\d{1,3}(?:\n\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})?)",
+        "mysql_user": r"MySQL User:\s*(\S+)",
+        "mysql_pass": r"MySQL Pass:\s*(\S+)",
+        "pgsql_host": r"pgSQL private HOST:\s*(\S+)",
+        "pgsql_user": r"pgSQL User:\s*(\S+)",
+        "pgsql_pass": r"pgSQL Pass:\s*(\S+)"
+    }
+
+    extracted = {}
+    for key, pattern in patterns.items():
+        match = re.search(pattern, console_output)
+        if match:
+            extracted[key] = match.group(1).strip()
+
+    mysql_ips = []
+    lines = console_output.split('\n')
+    for i, line in enumerate(lines):
+        line = line.strip()
+        if 'MySQL private HOST:' in line:
+            for j in range(i+1, min(i+4, len(lines))):
+                next_line = lines[j].strip()
+                ip_pattern = r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b'
+                ips = re.findall(ip_pattern, next_line)
+                mysql_ips.extend(ips)
+
+    mysql_ips = list(set(mysql_ips))
+    if mysql_ips:
+        extracted['mysql_ips'] = mysql_ips
+    return extracted
+
+
+def _normalise(info):
+    info = dict(info)
+    if 'mysql_ips' in info:
+        info['mysql_ips'] = sorted(info['mysql_ips'])
+    return info
+
+
+def _measure(func, text):
+    best = None
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        result = func(text)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    func(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def run(sizes_mb=SIZES_MB, marker_position=0.8):
+    results = []
+    for size_mb in sizes_mb:
+        text = generate_console_log(size_mb * 1024 * 1024, marker_position=marker_position)
+        legacy, legacy_s, legacy_peak = _measure(legacy_extract_info, text)
+        streaming, streaming_s, streaming_peak = _measure(extract_from_text, text)
+        if _normalise(legacy) != _normalise(streaming):
+            raise AssertionError(f"Extractors disagree on {size_mb} MB log:\n{legacy}\n{streaming}")
+        results.append({
+            'size_mb': size_mb,
+            'marker_position': marker_position,
+            'legacy_s': round(legacy_s, 4),
+            'streaming_s': round(streaming_s, 4),
+            'speedup': round(legacy_s / streaming_s, 2) if streaming_s else None,
+            'legacy_peak_mb': round(legacy_peak / 1024 / 1024, 2),
+            'streaming_peak_mb': round(streaming_peak / 1024 / 1024, 2),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES_MB
+    print(json.dumps(run(sizes), indent=2))
@@ -0,0 +1,145 @@
+"""End-to-end benchmarks of main.py's Jenkins paths against the local fake Jenkins
+
+Covers the ENV_NAME build lookup (cold and warm build index), the queue and
+build wait loops, and following a running build's console. Each result
+counts the requests and bytes the fake server saw, so fewer round trips
+show up even when latency is zero.
+
+Run from the repository root:  python -m benchmarks.bench_jenkins [--latency 0.05]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+
+import main
+from benchmarks.fake_jenkins import FakeJenkins
+
+
+@contextlib.contextmanager
+def pointed_at(fake, index_path):
+    """Point main's Jenkins client and build index at `fake` and a throwaway index file"""
+    saved = (main.JENKINS_URL, main.JOB_NAME, main.JENKINS_CACHE_DIR, main.BUILD_INDEX_PATH,
+             main.BUILD_INDEX_MAX_AGE, main.JENKINS_RATE_LIMIT)
+    main.JENKINS_URL = fake.base_url + '/'
+    main.JOB_NAME = fake.job_name
+    main.JENKINS_CACHE_DIR = None
+    main.BUILD_INDEX_PATH = index_path
+    # Always do the incremental refresh, as a lookup more than a minute after the last one would
+    main.BUILD_INDEX_MAX_AGE = 0
+    # The fake server is what is measured; the shared request budget would only add sleeps
+    main.JENKINS_RATE_LIMIT = 0
+    main._jenkins_client = None
+    main._build_index = None
+    try:
+        yield
+    finally:
+        if main._jenkins_client is not None:
+            main._jenkins_client.close()
+        (main.JENKINS_URL, main.JOB_NAME, main.JENKINS_CACHE_DIR, main.BUILD_INDEX_PATH,
+         main.BUILD_INDEX_MAX_AGE, main.JENKINS_RATE_LIMIT) = saved
+        main._jenkins_client = None
+        main._build_index = None
+
+
+def _measure(fake, func, *args, **kwargs):
+    """Run func quietly; returns (result, stats) with wall time and the server-side request/byte counts"""
+    requests_before, bytes_before = fake.requests, fake.bytes_sent
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func(*args, **kwargs)
+    return result, {
+        'seconds': round(time.perf_counter() - started, 4),
+        'requests': fake.requests - requests_before,
+        'bytes': fake.bytes_sent - bytes_before,
+    }
+
+
+def bench_lookup(history=500, latency=0.0):
+    """Look up an env near the top, in the middle and absent from `history` builds"""
+    results = []
+    fake = FakeJenkins(history=history, latency=latency, log_size=1024)
+    targets = {
+        'newest': f"e{(history - 1) % (history // 4):02d}",
+        'deep': 'deep-env',
+        'missing': 'no-such-env',
+    }
+    # Only one build far back in history carries 'deep-env'
+    fake.builds[history // 10].params['ENV_NAME'] = 'deep-env'
+    with fake, tempfile.TemporaryDirectory() as index_dir:
+        for label, env_name in targets.items():
+            with pointed_at(fake, os.path.join(index_dir, f"{label}.sqlite3")):
+                cold_result, cold = _measure(fake, main.check_existing_build_by_env_name, env_name)
+                # Only the build index carries over to the warm lookup, not responses the 5s HTTP cache still holds
+                main.get_jenkins().cache.clear()
+                warm_result, warm = _measure(fake, main.check_existing_build_by_env_name, env_name)
+            if cold_result != warm_result:
+                raise AssertionError(f"Cold and warm lookups disagree for {env_name}: {cold_result} {warm_result}")
+            results.append({'target': label, 'history': history, 'latency_s': latency,
+                            'found': cold_result[0], 'cold': cold, 'warm': warm})
+    return results
+
+
+def bench_wait(build_duration=8.0, queue_delay=1.5, latency=0.0):
+    """Trigger a build, wait for it to leave the queue and to finish; report how late each wait returned"""
+    fake = FakeJenkins(history=10, build_duration=build_duration, queue_delay=queue_delay, latency=latency,
+                       log_size=1024)
+    with fake, tempfile.TemporaryDirectory() as index_dir:
+        with pointed_at(fake, os.path.join(index_dir, 'index.sqlite3')):
+            triggered_at = time.time()
+            build_number, trigger = _measure(fake, main.trigger_job, {'ENV_NAME': 'bench-wait'})
+            build = fake.builds[build_number]
+            result, wait = _measure(fake, main.wait_for_job_completion, build_number, timeout=build_duration * 10)
+            finished_at = time.time()
+    return {
+        'build_duration_s': build_duration,
+        'queue_delay_s': queue_delay,
+        'latency_s': latency,
+        'result': result,
+        'queue': dict(trigger, lag_s=round(triggered_at + trigger['seconds'] - build.started_at, 3)),
+        'build': dict(wait, lag_s=round(finished_at - (build.started_at + build_duration), 3)),
+    }
+
+
+def bench_tail(build_duration=8.0, log_size=4 * 1024 * 1024, marker_position=0.5, latency=0.0):
+    """Follow a running build's console; report when the MySQL fields were seen and bytes downloaded"""
+    fake = FakeJenkins(history=10, build_duration=build_duration, log_size=log_size,
+                       marker_position=marker_position, latency=latency)
+    seen = {}
+    with fake, tempfile.TemporaryDirectory() as index_dir:
+        with pointed_at(fake, os.path.join(index_dir, 'index.sqlite3')):
+            build_number = fake.add_running_build('bench-tail')
+            build = fake.builds[build_number]
+            info, stats = _measure(fake, main.tail_console_info, build_number,
+                                   on_mysql_ready=lambda info: seen.setdefault('at', time.time()))
+    return {
+        'build_duration_s': build_duration,
+        'log_size_mb': round(log_size / 1024 / 1024, 2),
+        'marker_position': marker_position,
+        'latency_s': latency,
+        'fields_found': len(info),
+        'mysql_ready_lag_s': round(seen['at'] - (build.started_at + build_duration * marker_position), 3)
+        if 'at' in seen else None,
+        'log_downloaded_ratio': round(stats['bytes'] / log_size, 3),
+        **stats,
+    }
+
+
+def run(latency=0.0, history=500, build_duration=8.0):
+    return {
+        'lookup': bench_lookup(history=history, latency=latency),
+        'wait': bench_wait(build_duration=build_duration, latency=latency),
+        'tail': bench_tail(build_duration=build_duration, latency=latency),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every fake Jenkins response")
+    parser.add_argument('--history', type=int, default=500, help="builds in the fake job's history")
+    parser.add_argument('--build-duration', type=float, default=8.0, help="seconds a triggered build runs")
+    args = parser.parse_args()
+    print(json.dumps(run(args.latency, args.history, args.build_duration), indent=2))
@@ -0,0 +1,84 @@
+"""Startup benchmark: `python -X importtime` cost of main.py and wall time of quick subcommands
+
+Fails (exit 1) when importing main takes longer than IMPORT_BUDGET_MS or
+loads one of HEAVY_MODULES, so it can gate CI.
+
+Run from the repository root:  python -m benchmarks.bench_startup
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic_logs import generate_console_log
+
+IMPORT_BUDGET_MS = 150  # Cumulative import time of main.py, as reported by -X importtime
+HEAVY_MODULES = ('requests', 'paramiko', 'pymysql', 'cryptography')
+REPEATS = 5
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_profile():
+    """Cumulative import time of main (microseconds) and the slowest modules it pulled in"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=ROOT,
+                          capture_output=True, text=True, check=True)
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    main_us = next(cumulative for name, _, cumulative in modules if name == 'main')
+    slowest = sorted(modules, key=lambda module: module[1], reverse=True)[:10]
+    return main_us, [name for name, _, _ in modules], slowest
+
+
+def command_time(args, cwd, stdin_path=None):
+    """Best and median of REPEATS wall times of `python <args>`, in seconds"""
+    timings = []
+    for _ in range(REPEATS):
+        with open(stdin_path or os.devnull, 'rb') as stdin:
+            started = time.perf_counter()
+            subprocess.run([sys.executable, *args], cwd=cwd, stdin=stdin, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+            timings.append(time.perf_counter() - started)
+    return {'best_s': round(min(timings), 4), 'median_s': round(statistics.median(timings), 4)}
+
+
+def run():
+    main_us, loaded, slowest = import_profile()
+    heavy = [name for name in loaded if name.split('.')[0] in HEAVY_MODULES]
+    main_py = os.path.join(ROOT, 'main.py')
+    # Commands run in a scratch directory so the build index they open is a throwaway one
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, 'console.log')
+        with open(log_path, 'w', encoding='utf-8') as f:
+            f.write(generate_console_log(1024 * 1024))
+        commands = {
+            'python -c pass': command_time(['-c', 'pass'], tmp),
+            'main.py --help': command_time([main_py, '--help'], tmp),
+            'main.py extract FILE (1 MB)': command_time([main_py, 'extract', log_path], tmp),
+            'main.py extract < stdin (1 MB)': command_time([main_py, 'extract'], tmp, stdin_path=log_path),
+            'main.py lookup --cached': command_time([main_py, 'lookup', '--cached', 'xyr', '--trace', ''], tmp),
+        }
+    return {
+        'import_main_ms': round(main_us / 1000, 2),
+        'import_budget_ms': IMPORT_BUDGET_MS,
+        'heavy_modules_loaded': sorted(set(name.split('.')[0] for name in heavy)),
+        'slowest_imports': [{'module': name, 'self_ms': round(self_us / 1000, 2),
+                             'cumulative_ms': round(cumulative_us / 1000, 2)}
+                            for name, self_us, cumulative_us in slowest],
+        'commands': commands,
+    }
+
+
+if __name__ == "__main__":
+    report = run()
+    print(json.dumps(report, indent=2))
+    if report['heavy_modules_loaded'] or report['import_main_ms'] > IMPORT_BUDGET_MS:
+        print(f"✗ Startup over budget: import main took {report['import_main_ms']} ms "
+              f"(budget {IMPORT_BUDGET_MS} ms), heavy modules: {report['heavy_modules_loaded']}", file=sys.stderr)
+        sys.exit(1)
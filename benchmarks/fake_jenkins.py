@@ -0,0 +1,263 @@
+"""A local http.server stand-in for the parts of the Jenkins API main.py uses
+
+Serves, for one job inside the 'Environments' folder:
+  GET  /api/json, /computer/api/json
+  GET  /job/Environments/job/<job>/api/json            (tree=builds[...]{start,end}, lastBuild)
+  POST /job/Environments/job/<job>/buildWithParameters  (201 + queue Location)
+  GET  /queue/item/<id>/api/json
+  GET  /job/Environments/job/<job>/<n>/api/json
+  GET  /job/Environments/job/<job>/<n>/consoleText
+  GET  /job/Environments/job/<job>/<n>/logText/progressiveText?start=<offset>
+
+Builds run on the wall clock: a triggered build leaves the queue after
+`queue_delay` seconds and reveals its console log progressively over
+`build_duration` seconds. Every request is delayed by `latency` seconds.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.synthetic_logs import generate_console_log
+
+_RANGE_RE = re.compile(r'builds\[.*\]\{(\d+),(\d+)\}')
+
+
+class FakeBuild:
+    def __init__(self, number, params, result, started_at, duration):
+        self.number = number
+        self.params = params
+        self.final_result = result
+        self.started_at = started_at
+        self.duration = duration
+
+    def elapsed(self, now):
+        return max(0.0, now - self.started_at)
+
+    def building(self, now):
+        return self.elapsed(now) < self.duration
+
+    def visible_log(self, log, now):
+        """The part of `log` printed so far, growing linearly over the build's duration"""
+        if not self.building(now):
+            return log
+        return log[:int(len(log) * self.elapsed(now) / self.duration)]
+
+    def to_json(self, base_url, job_path, now):
+        building = self.building(now)
+        return {
+            '_class': 'org.jenkinsci.plugins.workflow.job.WorkflowRun',
+            'number': self.number,
+            'url': f"{base_url}{job_path}/{self.number}/",
+            'building': building,
+            'result': None if building else self.final_result,
+            'timestamp': int(self.started_at * 1000),
+            'estimatedDuration': int(self.duration * 1000),
+            'duration': 0 if building else int(self.duration * 1000),
+            'actions': [
+                {'_class': 'hudson.model.CauseAction'},
+                {'_class': 'hudson.model.ParametersAction',
+                 'parameters': [{'name': k, 'value': v} for k, v in self.params.items()]},
+            ],
+        }
+
+
+class FakeJenkins:
+    """In-process fake Jenkins server; use as a context manager or call start()/stop()"""
+
+    def __init__(self, job_name='test', history=200, env_names=None, log_size=256 * 1024,
+                 build_duration=5.0, queue_delay=1.0, latency=0.0, marker_position=0.8, executors=4):
+        self.job_name = job_name
+        self.job_path = f"/job/Environments/job/{job_name}"
+        self.log_size = log_size
+        self.build_duration = build_duration
+        self.queue_delay = queue_delay
+        self.latency = latency
+        self.marker_position = marker_position
+        self.executors = executors
+        self.requests = 0
+        self.bytes_sent = 0
+        self.builds = {}
+        self.queue = {}
+        self._logs = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+        env_names = env_names or [f"e{i:02d}" for i in range(max(1, history // 4))]
+        now = time.time()
+        for number in range(1, history + 1):
+            env = env_names[(number - 1) % len(env_names)]
+            result = 'FAILURE' if number % 7 == 0 else 'SUCCESS'
+            started = now - (history - number + 1) * 3600
+            self.builds[number] = FakeBuild(number, self._params(env), result, started, 1800.0)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        handler = type('Handler', (_Handler,), {'fake': self})
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name='fake-jenkins')
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def add_running_build(self, env_name, started_ago=0.0):
+        """Add a build that is already running, as if someone else had triggered it"""
+        with self._lock:
+            number = max(self.builds, default=0) + 1
+            self.builds[number] = FakeBuild(number, self._params(env_name), 'SUCCESS', time.time() - started_ago,
+                                            self.build_duration)
+        return number
+
+    def log_for(self, build):
+        env = build.params.get('ENV_NAME', 'xyr')
+        with self._lock:
+            if env not in self._logs:
+                text = generate_console_log(self.log_size, env=env, marker_position=self.marker_position)
+                self._logs[env] = text.encode('utf-8')
+            return self._logs[env]
+
+    def trigger(self, params):
+        with self._lock:
+            queue_id = len(self.queue) + 1
+            self.queue[queue_id] = {'params': dict(params), 'queued_at': time.time(), 'number': None}
+        return queue_id
+
+    def queue_item(self, queue_id):
+        with self._lock:
+            item = self.queue.get(queue_id)
+            if item is None:
+                return None
+            if item['number'] is None and time.time() - item['queued_at'] >= self.queue_delay:
+                number = max(self.builds, default=0) + 1
+                self.builds[number] = FakeBuild(number, item['params'], 'SUCCESS', time.time(),
+                                                self.build_duration)
+                item['number'] = number
+            return dict(item)
+
+    @staticmethod
+    def _params(env_name):
+        return {'ENV_TYPE': 'dev', 'ENV_NAME': env_name, 'PLATFORMAPI_BRANCH': 'master', 'MWAPI_BRANCH': 'master'}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    fake = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def _dispatch(self, method):
+        fake = self.fake
+        if fake.latency:
+            time.sleep(fake.latency)
+        with fake._lock:
+            fake.requests += 1
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        path = url.path.rstrip('/')
+        now = time.time()
+
+        if method == 'POST':
+            if path in (f"{fake.job_path}/buildWithParameters", f"{fake.job_path}/build"):
+                params = {k: v[-1] for k, v in parse_qs(body.decode('utf-8')).items()}
+                queue_id = fake.trigger(params)
+                return self._send(201, b'', headers={'Location': f"{fake.base_url}/queue/item/{queue_id}/"})
+            return self._send(404, b'Not found')
+
+        if path == '/api/json':
+            return self._json({'mode': 'NORMAL', 'nodeDescription': 'fake jenkins'})
+        if path == '/computer/api/json':
+            busy = sum(1 for build in list(fake.builds.values()) if build.building(now))
+            return self._json({'busyExecutors': min(busy, fake.executors), 'totalExecutors': fake.executors})
+        if path == f"{fake.job_path}/api/json":
+            return self._json(self._job_json(query.get('tree', [''])[0], now))
+
+        match = re.fullmatch(r'/queue/item/(\d+)/api/json', path)
+        if match:
+            item = fake.queue_item(int(match.group(1)))
+            if item is None:
+                return self._send(404, b'Not found')
+            data = {'id': int(match.group(1)), 'cancelled': False, 'why': None if item['number'] else 'Waiting'}
+            if item['number']:
+                data['executable'] = {'number': item['number'], 'url': f"{fake.base_url}{fake.job_path}/{item['number']}/"}
+            return self._json(data)
+
+        match = re.fullmatch(re.escape(fake.job_path) + r'/(\d+)/(api/json|consoleText|logText/progressiveText)', path)
+        if match:
+            build = fake.builds.get(int(match.group(1)))
+            if build is None:
+                return self._send(404, b'Not found')
+            endpoint = match.group(2)
+            if endpoint == 'api/json':
+                return self._json(build.to_json(fake.base_url, fake.job_path, now))
+            log = build.visible_log(fake.log_for(build), now)
+            if endpoint == 'consoleText':
+                return self._send(200, log, content_type='text/plain; charset=utf-8')
+            start = int(query.get('start', ['0'])[0])
+            return self._send(200, log[start:], content_type='text/plain; charset=utf-8', headers={
+                'X-Text-Size': str(len(log)),
+                'X-More-Data': 'true' if build.building(now) else 'false',
+            })
+
+        return self._send(404, b'Not found')
+
+    def _job_json(self, tree, now):
+        fake = self.fake
+        numbers = sorted(fake.builds, reverse=True)
+        match = _RANGE_RE.search(tree)
+        if match:
+            numbers = numbers[int(match.group(1)):int(match.group(2))]
+        data = {'name': fake.job_name}
+        if not tree or 'builds' in tree:
+            data['builds'] = [fake.builds[n].to_json(fake.base_url, fake.job_path, now) for n in numbers]
+        if fake.builds and (not tree or 'lastBuild' in tree):
+            data['lastBuild'] = {'number': max(fake.builds)}
+        return data
+
+    def _json(self, data):
+        body = json.dumps(data).encode('utf-8')
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            return self._send(304, b'', headers={'ETag': etag})
+        return self._send(200, body, content_type='application/json', headers={'ETag': etag})
+
+    def _send(self, status, body, content_type='text/plain', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+        with self.fake._lock:
+            self.fake.bytes_sent += len(body)
@@ -0,0 +1,54 @@
+"""Run every offline benchmark and write one JSON report, for comparing commits
+
+Run from the repository root:
+    python -m benchmarks.run --output bench-$(git rev-parse --short HEAD).json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+from benchmarks import bench_export, bench_extract, bench_jenkins, bench_startup
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(extract_sizes_mb, latency, history, build_duration):
+    started = time.time()
+    report = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'started_at': started,
+        'startup': bench_startup.run(),
+        'extract': bench_extract.run(extract_sizes_mb),
+        'export': bench_export.run([100000]),
+        'jenkins': bench_jenkins.run(latency=latency, history=history, build_duration=build_duration),
+    }
+    report['duration_s'] = round(time.time() - started, 2)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', help="write the report here instead of stdout")
+    parser.add_argument('--extract-sizes', type=int, nargs='+', default=[1, 10], metavar='MB',
+                        help="console log sizes for the extract benchmark")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every fake Jenkins response")
+    parser.add_argument('--history', type=int, default=500, help="builds in the fake job's history")
+    parser.add_argument('--build-duration', type=float, default=8.0, help="seconds a triggered build runs")
+    args = parser.parse_args()
+    report = json.dumps(run(args.extract_sizes, args.latency, args.history, args.build_duration), indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report + '\n')
+        print(f"✓ Benchmark report written to {args.output}", file=sys.stderr)
+    else:
+        print(report)
@@ -0,0 +1,70 @@
+import random
+import sys
+
+FILLER_LINES = [
+    "[Pipeline] sh",
+    "+ ansible-playbook -i inventory/{env} site.yml --tags provision",
+    "TASK [common : Install base packages] *******************************************",
+    "ok: [10.20.{a}.{b}]",
+    "changed: [10.20.{a}.{b}] => (item=nginx)",
+    "PLAY RECAP *********************************************************************",
+    "10.20.{a}.{b}              : ok=42   changed=7    unreachable=0    failed=0",
+    "Still waiting for stack {env}-stack to reach CREATE_COMPLETE ({n}s elapsed)",
+    "[Pipeline] echo",
+    "[Pipeline] }}",
+]
+
+
+def endpoint_block(env='xyr', mysql_hosts=3):
+    """Marker lines in the shape the provisioning job prints them"""
+    lines = [
+        f"ELK EndPoint: https://elk-{env}.internal.example.com",
+        f"Scannerapi EndPoint: https://scannerapi-{env}.example.com",
+        f"ALB EndPoint: {env}-alb-1234567890.us-east-1.elb.amazonaws.com",
+        f"cnc EndPoint: https://cnc-{env}.example.com",
+        f"api-endpoint: https://api-{env}.example.com",
+        "Instance PrivateIP: 10.30.1.11",
+        "10.30.1.12",
+        "MySQL private HOST:",
+    ]
+    lines += [f"10.40.0.{10 + i}" for i in range(mysql_hosts)]
+    lines += [
+        f"MySQL User: {env}_admin",
+        "MySQL Pass: s3cr3t-Pa55",
+        "pgSQL private HOST: 10.50.0.20",
+        f"pgSQL User: {env}_pg",
+        "pgSQL Pass: pg-s3cr3t",
+    ]
+    return lines
+
+
+def generate_console_log(size_bytes, env='xyr', marker_position=0.8, seed=0):
+    """Build a console log of roughly `size_bytes` with the endpoint markers at `marker_position`"""
+    rng = random.Random(seed)
+    before = int(size_bytes * marker_position)
+    out = []
+    written = 0
+    markers_written = False
+    n = 0
+    while written < size_bytes:
+        if not markers_written and written >= before:
+            for line in endpoint_block(env):
+                out.append(line)
+                written += len(line) + 1
+            markers_written = True
+            continue
+        n += 1
+        line = rng.choice(FILLER_LINES).format(env=env, a=rng.randint(0, 255), b=rng.randint(0, 255), n=n)
+        out.append(line)
+        written += len(line) + 1
+    if not markers_written:
+        out.extend(endpoint_block(env))
+    return '\n'.join(out) + '\n'
+
+
+if __name__ == "__main__":
+    # python -m benchmarks.synthetic_logs SIZE_MB [ENV] [MARKER_POSITION] > console.log
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 1
+    env = sys.argv[2] if len(sys.argv) > 2 else 'xyr'
+    position = float(sys.argv[3]) if len(sys.argv) > 3 else 0.8
+    sys.stdout.write(generate_console_log(int(size_mb * 1024 * 1024), env=env, marker_position=position))
@@ -0,0 +1,368 @@
+"""Long-running environment broker: answers env queries from warm state over local HTTP
+
+Run through `python main.py serve`. Endpoints (all JSON):
+  GET  /health
+  GET  /env/<ENV_NAME>[?fresh=1]     build number, status and extracted endpoints/credentials
+  GET  /env/<ENV_NAME>/mysql         a live forward to the env's cloudways_new host (127.0.0.1:<port>)
+  POST /env/<ENV_NAME>/provision     body: parameter dict; ?wait=1 blocks until it finishes
+
+Over TCP every request must carry `Authorization: Bearer <token>`, the
+token being the contents of a per-user file (created mode 0600 on first
+start), and a localhost Host header, so web pages cannot reach the broker
+through the browser (CSRF, DNS rebinding). A Unix socket is created mode
+0600 and needs neither.
+"""
+import hmac
+import json
+import os
+import re
+import secrets
+import socket
+import socketserver
+import stat
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from fingerprint import param_fingerprint
+
+DEFAULT_TTL = 60  # Seconds an env answer is served without looking again
+DEFAULT_REFRESH_INTERVAL = 30  # How often the background refresher wakes up
+DEFAULT_KEEP_WARM = 3600  # Entries not asked for in this long are no longer refreshed
+
+_ENV_PATH_RE = re.compile(r'^/env/([A-Za-z0-9_.-]+)(?:/(mysql|provision))?$')
+_LOCAL_HOSTS = ('127.0.0.1', 'localhost', '[::1]')
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution
+
+    The first caller runs the function; callers arriving while it runs wait
+    for and share its result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(func())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result()
+
+
+class EnvEntry:
+    """What the broker knows about one ENV_NAME"""
+
+    def __init__(self, env_name):
+        self.env_name = env_name
+        self.build_number = None
+        self.status = None
+        self.info = None
+        self.fetched_at = 0.0
+        self.accessed_at = time.time()
+
+    def age(self):
+        return time.time() - self.fetched_at
+
+    def to_dict(self):
+        return {'env_name': self.env_name, 'build_number': self.build_number, 'status': self.status,
+                'info': self.info, 'age_s': round(self.age(), 3)}
+
+
+class Broker:
+    """Warm per-env state shared by every client of the daemon
+
+    `lookup(env_name)` returns (build_number, status, info), as
+    main.lookup_env_info does; `provision(params)` returns a result dict,
+    as main.provision_environment does; `open_mysql(info)` returns
+    (mysql_host, forward) for a live ssh_forward.LocalForward.
+    """
+
+    def __init__(self, lookup, provision, open_mysql, ttl=DEFAULT_TTL, refresh_interval=DEFAULT_REFRESH_INTERVAL,
+                 keep_warm=DEFAULT_KEEP_WARM):
+        self._lookup = lookup
+        self._provision = provision
+        self._open_mysql = open_mysql
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.keep_warm = keep_warm
+        self.started_at = time.time()
+        self.requests = 0
+        self._entries = {}
+        self._forwards = {}
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._stop = threading.Event()
+        self._refresher = None
+
+    def env(self, env_name, fresh=False):
+        """Status and endpoints for env_name, from memory unless stale (or `fresh`)"""
+        with self._lock:
+            entry = self._entries.setdefault(env_name, EnvEntry(env_name))
+            entry.accessed_at = time.time()
+        if fresh or entry.age() > self.ttl:
+            self._flight.do(('env', env_name), lambda: self._refresh(entry))
+        return dict(entry.to_dict(), provisioning=self._job(env_name))
+
+    def mysql(self, env_name):
+        """A live local forward to env_name's cloudways_new host, reused while its build stays the same"""
+        state = self.env(env_name)
+        key = (env_name, state['build_number'])
+        with self._lock:
+            pooled = self._forwards.get(key)
+        if pooled is None or pooled[1].closed:
+            pooled = self._flight.do(('mysql',) + key, lambda: self._open_forward(key, state['info']))
+        mysql_host, forward, info = pooled
+        return {'env_name': env_name, 'mysql_host': mysql_host, 'local_host': '127.0.0.1',
+                'local_port': forward.local_port, 'user': info.get('mysql_user'),
+                'password': info.get('mysql_pass'), 'database': 'cloudways_new'}
+
+    def provision(self, params, wait=False):
+        """Start (or join) provisioning of params['ENV_NAME']; one Jenkins operation per env at a time"""
+        env_name = params.get('ENV_NAME')
+        if not env_name:
+            raise ValueError("ENV_NAME is required")
+        fingerprint = param_fingerprint(params)
+        with self._lock:
+            job = self._jobs.get(env_name)
+            if job is None or job['state'] != 'running':
+                job = {'state': 'running', 'fingerprint': fingerprint, 'started_at': time.time(), 'result': None,
+                       'done': threading.Event()}
+                self._jobs[env_name] = job
+                threading.Thread(target=self._run_provision, args=(env_name, params, job), daemon=True,
+                                 name=f"provision-{env_name}").start()
+            elif job['fingerprint'] != fingerprint:
+                raise ConflictError(f"{env_name} is already being provisioned with different parameters")
+        if wait:
+            job['done'].wait()
+        return dict(self._job(env_name), env_name=env_name)
+
+    def start(self):
+        self._refresher = threading.Thread(target=self._refresh_loop, daemon=True, name='broker-refresh')
+        self._refresher.start()
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            forwards, self._forwards = list(self._forwards.values()), {}
+        for _, forward, _ in forwards:
+            forward.close()
+
+    def health(self):
+        with self._lock:
+            return {'uptime_s': round(time.time() - self.started_at, 1), 'requests': self.requests,
+                    'envs': len(self._entries), 'forwards': sum(1 for _, f, _ in self._forwards.values()
+                                                                if not f.closed),
+                    'provisioning': sorted(env for env, job in self._jobs.items() if job['state'] == 'running')}
+
+    def _refresh(self, entry):
+        build_number, status, info = self._lookup(entry.env_name)
+        with self._lock:
+            if info is None and build_number == entry.build_number:
+                info = entry.info  # keep what we had while the same build is still reported
+            entry.build_number, entry.status, entry.info = build_number, status, info
+            entry.fetched_at = time.time()
+
+    def _open_forward(self, key, info):
+        env_name = key[0]
+        if not info or not info.get('mysql_ips'):
+            raise LookupError(f"no MySQL endpoints known for {env_name}")
+        mysql_host, forward = self._open_mysql(info)
+        pooled = (mysql_host, forward, info)
+        with self._lock:
+            # Forwards to an earlier build of the env point at hosts that may be gone
+            stale = [self._forwards.pop(other) for other in list(self._forwards)
+                     if other[0] == env_name and other != key]
+            self._forwards[key] = pooled
+        for _, old_forward, _ in stale:
+            old_forward.close()
+        return pooled
+
+    def _run_provision(self, env_name, params, job):
+        try:
+            result = self._provision(params)
+            job['result'] = {k: v for k, v in result.items() if k != 'info'}
+            job['state'] = 'failed' if result.get('error') else 'done'
+        except Exception as e:
+            job['result'] = {'error': str(e)}
+            job['state'] = 'failed'
+        finally:
+            with self._lock:
+                entry = self._entries.get(env_name)
+                if entry is not None:
+                    entry.fetched_at = 0.0
+            job['done'].set()
+
+    def _job(self, env_name):
+        with self._lock:
+            job = self._jobs.get(env_name)
+        if job is None:
+            return None
+        return {'state': job['state'], 'started_at': job['started_at'], 'result': job['result']}
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            now = time.time()
+            with self._lock:
+                due = [entry for entry in self._entries.values()
+                       if now - entry.accessed_at < self.keep_warm and entry.age() >= self.refresh_interval]
+            for entry in due:
+                try:
+                    self._flight.do(('env', entry.env_name), lambda entry=entry: self._refresh(entry))
+                except Exception as e:
+                    print(f"⚠️  Background refresh of {entry.env_name} failed: {e}")
+
+
+class ConflictError(Exception):
+    """A request clashes with work already in progress"""
+
+
+class _Handler(BaseHTTPRequestHandler):
+    broker = None
+    token = None  # Required bearer token; None on a Unix socket
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def _refusal(self):
+        if self.token is None:
+            return None
+        host = self.headers.get('Host') or ''
+        host = host[:host.find(']') + 1] if host.startswith('[') else host.split(':')[0]
+        if host not in _LOCAL_HOSTS:
+            return f"Host {self.headers.get('Host')!r} is not allowed"
+        auth = self.headers.get('Authorization') or ''
+        if not hmac.compare_digest(auth.encode('utf-8'), f"Bearer {self.token}".encode('utf-8')):
+            return "missing or wrong Authorization bearer token"
+        return None
+
+    def _dispatch(self, method):
+        started = time.perf_counter()
+        broker = self.broker
+        with broker._lock:
+            broker.requests += 1
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        refusal = self._refusal()
+        try:
+            if refusal:
+                self.close_connection = True  # any request body is left unread
+                status, body = 403, {'error': refusal}
+            elif method == 'GET' and url.path == '/health':
+                status, body = 200, broker.health()
+            else:
+                match = _ENV_PATH_RE.match(url.path)
+                if not match:
+                    status, body = 404, {'error': f"no route for {method} {url.path}"}
+                elif match.group(2) is None and method == 'GET':
+                    body = broker.env(match.group(1), fresh=query.get('fresh', ['0'])[0] == '1')
+                    status = 200 if body['build_number'] else 404
+                elif match.group(2) == 'mysql' and method == 'GET':
+                    status, body = 200, broker.mysql(match.group(1))
+                elif match.group(2) == 'provision' and method == 'POST':
+                    length = int(self.headers.get('Content-Length') or 0)
+                    params = json.loads(self.rfile.read(length) or b'{}') if length else {}
+                    params['ENV_NAME'] = match.group(1)
+                    wait = query.get('wait', ['0'])[0] == '1'
+                    body = broker.provision(params, wait=wait)
+                    status = 200 if body['state'] != 'running' else 202
+                else:
+                    status, body = 405, {'error': f"{method} not allowed on {url.path}"}
+        except ConflictError as e:
+            status, body = 409, {'error': str(e)}
+        except (ValueError, LookupError) as e:
+            status, body = 400 if isinstance(e, ValueError) else 404, {'error': str(e)}
+        except Exception as e:
+            status, body = 500, {'error': f"{type(e).__name__}: {e}"}
+        body['served_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        payload = json.dumps(body, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class _UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def load_token(path):
+    """The broker token stored at `path`, created (mode 0600) with a random value if missing"""
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, encoding='utf-8') as f:
+            token = f.read().strip()
+        if not token:
+            raise ValueError(f"broker token file {path} is empty")
+        return token
+    token = secrets.token_urlsafe(32)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(token + '\n')
+    return token
+
+
+def _remove_stale_socket(path):
+    """Unlink a Unix socket nobody is listening on; refuse to touch anything else"""
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise OSError(f"{path} exists and is not a socket")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.remove(path)
+        return
+    finally:
+        probe.close()
+    raise OSError(f"another broker is already listening on {path}")
+
+
+def make_server(broker, host='127.0.0.1', port=8765, socket_path=None, token=None):
+    """HTTP server for `broker` on host:port (requiring `token`), or on a Unix socket (mode 0600) at socket_path"""
+    if socket_path:
+        handler = type('Handler', (_Handler,), {'broker': broker})
+        _remove_stale_socket(socket_path)
+        # Created without group/other access from the start, not chmodded after bind()
+        umask = os.umask(0o177)
+        try:
+            return _UnixHTTPServer(socket_path, handler)
+        finally:
+            os.umask(umask)
+    if not token:
+        raise ValueError("a token is required to serve over TCP")
+    handler = type('Handler', (_Handler,), {'broker': broker, 'token': token})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
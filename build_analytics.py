@@ -0,0 +1,236 @@
+import gzip
+import os
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from extractor import FIELD_RULES, ConsoleExtractor
+from jenkins_client import build_parameters
+from tracing import tracer
+
+BUILD_TREE = 'number,result,building,duration,timestamp,actions[_class,parameters[name,value]]'
+DEFAULT_FETCH_WORKERS = 8
+DEFAULT_PARSE_WORKERS = os.cpu_count() or 2
+MAX_PARAM_VALUES = 20  # Parameters with more distinct values than this (e.g. ENV_NAME) are not broken down
+PERCENTILES = (50, 90, 99)
+
+_STAGE_RE = re.compile(r'\[Pipeline\] \{ \((.+)\)\s*$')
+# Timestamper plugin prefixes: "[2024-05-01T10:00:00.123Z] ..." or "10:00:00 ..."
+_TIMESTAMP_RE = re.compile(r'^\[?(\d{4}-\d{2}-\d{2}[T ])?(\d{2}):(\d{2}):(\d{2})(?:\.\d+)?Z?\]?\s')
+_ERROR_RE = re.compile(r'^(?:ERROR|FATAL|Error)\b:?\s+(.*)')
+
+
+def console_cache_path(directory, job, number):
+    return os.path.join(directory, job, f"{number}.log.gz")
+
+
+def fetch_console(client, job, number, directory, chunk_size=256 * 1024):
+    """Download a finished build's consoleText into the gzip cache once; returns the cached path"""
+    path = console_cache_path(directory, job, number)
+    if os.path.exists(path):
+        tracer.count('console_cache_hits')
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    response = client.get(client.job_url(job, number, "consoleText"), stream=True)
+    try:
+        response.raise_for_status()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, 'wb', compresslevel=3) as out:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                tracer.count('http_bytes', len(chunk), endpoint='GET consoleText')
+                out.write(chunk)
+        os.replace(tmp_path, path)
+    finally:
+        response.close()
+    return path
+
+
+def _seconds(match):
+    return int(match.group(2)) * 3600 + int(match.group(3)) * 60 + int(match.group(4))
+
+
+def parse_console(path):
+    """Stages, first error and missing endpoint fields of one cached console log
+
+    Runs in a worker process. Stage offsets (seconds from the first
+    timestamped line) are only known when the job uses the Timestamper
+    plugin; otherwise they are None.
+    """
+    extractor = ConsoleExtractor(stop_early=False)
+    stages = []
+    error = None
+    error_stage = None
+    first_ts = None
+    last_ts = None
+    with gzip.open(path, 'rt', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            ts_match = _TIMESTAMP_RE.match(line)
+            if ts_match:
+                ts = _seconds(ts_match)
+                if first_ts is None:
+                    first_ts = ts
+                # Wall-clock prefixes wrap at midnight
+                while last_ts is not None and ts < last_ts - 12 * 3600:
+                    ts += 24 * 3600
+                last_ts = ts
+                line = line[ts_match.end():]
+            extractor.feed_line(line)
+            stage = _STAGE_RE.search(line)
+            if stage:
+                stages.append([stage.group(1), None if ts_match is None else last_ts - first_ts])
+                continue
+            if error is None:
+                error_match = _ERROR_RE.match(line)
+                if error_match:
+                    error = error_match.group(1).strip()[:200] or line.strip()[:200]
+                    error_stage = stages[-1][0] if stages else None
+    extractor.close()
+    found = extractor.result()
+    end = None if last_ts is None else last_ts - first_ts
+    # A failed build failed in the stage of its first error; without one the stage is unknown
+    failed_stage = error_stage if error else None
+    return {'stages': stages, 'end': end, 'error': error, 'failed_stage': failed_stage,
+            'missing_fields': sorted({rule.key for rule in FIELD_RULES} - set(found))}
+
+
+def stage_durations(stages, end):
+    """{stage: seconds} from ordered [name, offset] pairs; a stage lasts until the next one starts"""
+    durations = {}
+    for i, (name, offset) in enumerate(stages):
+        following = stages[i + 1][1] if i + 1 < len(stages) else end
+        if offset is not None and following is not None:
+            durations[name] = durations.get(name, 0) + following - offset
+    return durations
+
+
+def analyze_builds(client, job, count, cache_dir, fetch_workers=DEFAULT_FETCH_WORKERS,
+                   parse_workers=DEFAULT_PARSE_WORKERS, batch_size=100):
+    """Fetch (or reuse cached) consoles of the last `count` finished builds and parse them
+
+    Downloads run on `fetch_workers` threads and each log is handed to a
+    process pool of `parse_workers` as soon as it is on disk. Returns one
+    record per build: number, result, duration, timestamp, params, stage
+    durations, failed stage, first error and missing endpoint fields.
+    """
+    builds = [build for build in client.iter_builds(job, BUILD_TREE, batch_size=batch_size, max_builds=count)
+              if not build.get('building')]
+    records = []
+    with ThreadPoolExecutor(max_workers=max(1, fetch_workers), thread_name_prefix='console-fetch') as fetchers, \
+            ProcessPoolExecutor(max_workers=max(1, parse_workers)) as parsers:
+        fetches = {fetchers.submit(fetch_console, client, job, build['number'], cache_dir): build for build in builds}
+        parses = {}
+        for future in as_completed(fetches):
+            build = fetches[future]
+            try:
+                parses[parsers.submit(parse_console, future.result())] = build
+            except Exception as e:
+                print(f"⚠️  Could not fetch console of build #{build['number']}: {e}")
+        for future in as_completed(parses):
+            build = parses[future]
+            try:
+                parsed = future.result()
+            except Exception as e:
+                print(f"⚠️  Could not parse console of build #{build['number']}: {e}")
+                continue
+            records.append({
+                'number': build['number'], 'result': build.get('result'),
+                'duration': (build.get('duration') or 0) / 1000, 'timestamp': (build.get('timestamp') or 0) / 1000,
+                'params': build_parameters(build), 'stages': stage_durations(parsed['stages'], parsed['end']),
+                'failed_stage': parsed['failed_stage'], 'error': parsed['error'],
+                'missing_fields': parsed['missing_fields'],
+            })
+    records.sort(key=lambda record: record['number'], reverse=True)
+    return records
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of `values` (None when empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-p * len(ordered) // 100))
+    return ordered[min(len(ordered), rank) - 1]
+
+
+def _distribution(values):
+    stats = {'count': len(values)}
+    for p in PERCENTILES:
+        stats[f"p{p}"] = percentile(values, p)
+    stats['max'] = max(values) if values else None
+    return stats
+
+
+def summarize(records, max_param_values=MAX_PARAM_VALUES):
+    """Duration percentiles, per-stage timings, failure histograms and per-parameter breakdowns"""
+    succeeded = [record for record in records if record['result'] == 'SUCCESS']
+    failed = [record for record in records if record['result'] not in ('SUCCESS', None)]
+
+    stage_times = {}
+    for record in succeeded:
+        for stage, seconds in record['stages'].items():
+            stage_times.setdefault(stage, []).append(seconds)
+
+    values_by_param = {}
+    for record in records:
+        for name, value in record['params'].items():
+            values_by_param.setdefault(name, {}).setdefault(str(value), []).append(record)
+    by_param = {}
+    for name, groups in sorted(values_by_param.items()):
+        if len(groups) < 2 or len(groups) > max_param_values:
+            continue
+        by_param[name] = {
+            value: dict(_distribution([r['duration'] for r in group if r['result'] == 'SUCCESS']),
+                        builds=len(group),
+                        success_rate=sum(1 for r in group if r['result'] == 'SUCCESS') / len(group))
+            for value, group in sorted(groups.items())
+        }
+
+    return {
+        'builds': len(records),
+        'results': dict(Counter(record['result'] for record in records)),
+        'duration': _distribution([record['duration'] for record in succeeded]),
+        'stages': {stage: _distribution(times) for stage, times in stage_times.items()},
+        'failure_stages': dict(Counter(record['failed_stage'] or '(unknown)' for record in failed).most_common()),
+        'failure_errors': dict(Counter(record['error'] or '(none)' for record in failed).most_common(10)),
+        'missing_fields': dict(Counter(field for record in succeeded for field in record['missing_fields'])),
+        'by_param': by_param,
+        'first_build_at': datetime.fromtimestamp(min(r['timestamp'] for r in records)).isoformat()
+        if records else None,
+    }
+
+
+def _minutes(seconds):
+    return '-' if seconds is None else f"{seconds / 60:.1f}m"
+
+
+def format_report(summary):
+    """Printable text version of `summarize()` output"""
+    lines = [f"{summary['builds']} builds since {summary['first_build_at']}: "
+             + ', '.join(f"{result}={count}" for result, count in sorted(summary['results'].items(), key=str))]
+    duration = summary['duration']
+    lines.append(f"SUCCESS duration: p50 {_minutes(duration['p50'])}, p90 {_minutes(duration['p90'])}, "
+                 f"p99 {_minutes(duration['p99'])}, max {_minutes(duration['max'])}")
+    if summary['stages']:
+        lines.append(f"\n{'Stage':<40} {'Count':>5} {'p50':>7} {'p90':>7} {'max':>7}")
+        for stage, stats in sorted(summary['stages'].items(), key=lambda item: -(item[1]['p50'] or 0)):
+            lines.append(f"{stage[:40]:<40} {stats['count']:>5} {_minutes(stats['p50']):>7} "
+                         f"{_minutes(stats['p90']):>7} {_minutes(stats['max']):>7}")
+    if summary['failure_stages']:
+        lines.append("\nFailures by stage:")
+        width = max(summary['failure_stages'].values())
+        for stage, count in summary['failure_stages'].items():
+            lines.append(f"  {stage[:40]:<40} {count:>5} {'#' * max(1, round(30 * count / width))}")
+    if summary['failure_errors']:
+        lines.append("\nMost common first errors:")
+        for error, count in summary['failure_errors'].items():
+            lines.append(f"  {count:>5}  {error[:100]}")
+    if summary['missing_fields']:
+        lines.append("\nSUCCESS builds missing endpoint fields: "
+                     + ', '.join(f"{field}={count}" for field, count in sorted(summary['missing_fields'].items())))
+    for name, values in summary['by_param'].items():
+        lines.append(f"\n{name}:")
+        for value, stats in values.items():
+            lines.append(f"  {value[:38]:<38} {stats['builds']:>5} builds, {stats['success_rate']:>4.0%} ok, "
+                         f"p50 {_minutes(stats['p50'])}, p90 {_minutes(stats['p90'])}")
+    return '\n'.join(lines)
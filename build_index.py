@@ -0,0 +1,280 @@
+import itertools
+import json
+import sqlite3
+import threading
+import time
+
+from fingerprint import param_fingerprint
+from jenkins_client import build_parameters
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    job TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    env_name TEXT,
+    result TEXT,
+    building INTEGER NOT NULL,
+    params TEXT NOT NULL,
+    fingerprint TEXT,
+    info TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job, number)
+);
+CREATE INDEX IF NOT EXISTS builds_by_env ON builds (job, env_name, number DESC);
+CREATE TABLE IF NOT EXISTS refreshes (
+    job TEXT PRIMARY KEY,
+    refreshed_at REAL NOT NULL,
+    oldest INTEGER,
+    complete INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class BuildIndex:
+    """Local SQLite cache of Environments builds: number, ENV_NAME, result, parameters and extracted info
+
+    Completed builds never change, so once recorded they are only read
+    back. `refresh()` fetches just the builds newer than the highest cached
+    number and re-checks the ones that were still building. Older history
+    is paged in lazily: the index remembers the oldest build it holds
+    without gaps and goes further back only when a lookup needs it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.executescript(SCHEMA)
+            self._migrate()
+
+    def _migrate(self):
+        """Bring an index written by an older version up to the current schema"""
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(builds)")}
+        if 'fingerprint' not in columns:
+            self._db.execute("ALTER TABLE builds ADD COLUMN fingerprint TEXT")
+            rows = self._db.execute("SELECT job, number, params FROM builds").fetchall()
+            self._db.executemany(
+                "UPDATE builds SET fingerprint = ? WHERE job = ? AND number = ?",
+                [(param_fingerprint(json.loads(row['params'])), row['job'], row['number']) for row in rows],
+            )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS builds_by_fingerprint ON builds (job, fingerprint, number DESC)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(refreshes)")}
+        if 'oldest' not in columns:
+            # Older versions always paged through the whole lookup window
+            self._db.execute("ALTER TABLE refreshes ADD COLUMN oldest INTEGER")
+            self._db.execute("ALTER TABLE refreshes ADD COLUMN complete INTEGER NOT NULL DEFAULT 0")
+            self._db.execute(
+                "UPDATE refreshes SET complete = 1, "
+                "oldest = (SELECT MIN(number) FROM builds WHERE builds.job = refreshes.job)"
+            )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def max_number(self, job):
+        with self._lock:
+            row = self._db.execute("SELECT MAX(number) FROM builds WHERE job = ?", (job,)).fetchone()
+        return row[0] or 0
+
+    def last_refresh(self, job):
+        with self._lock:
+            row = self._db.execute("SELECT refreshed_at FROM refreshes WHERE job = ?", (job,)).fetchone()
+        return row[0] if row else None
+
+    def coverage(self, job):
+        """(oldest build cached with no gaps up to the newest, whether history is exhausted), or None when cold"""
+        with self._lock:
+            row = self._db.execute("SELECT oldest, complete FROM refreshes WHERE job = ?", (job,)).fetchone()
+        return (row['oldest'], bool(row['complete'])) if row else None
+
+    def has_deciding_build(self, job, env_name):
+        """Whether a cached build of env_name is building or succeeded (the newest such one decides a lookup)"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM builds WHERE job = ? AND env_name = ? AND (building = 1 OR result = 'SUCCESS') "
+                "LIMIT 1", (job, env_name),
+            ).fetchone()
+        return row is not None
+
+    def record_build(self, job, build):
+        """Insert or update one build from Jenkins JSON (number, result, building, actions)"""
+        params = build_parameters(build)
+        building = bool(build.get('building')) or build.get('result') is None
+        with self._lock, self._db:
+            self._db.execute(
+                """
+                INSERT INTO builds (job, number, env_name, result, building, params, fingerprint, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (job, number) DO UPDATE SET
+                    env_name = excluded.env_name,
+                    result = excluded.result,
+                    building = excluded.building,
+                    params = excluded.params,
+                    fingerprint = excluded.fingerprint,
+                    updated_at = excluded.updated_at
+                """,
+                (job, build['number'], params.get('ENV_NAME'), build.get('result'), int(building),
+                 json.dumps(params, sort_keys=True), param_fingerprint(params), time.time()),
+            )
+
+    def forget_build(self, job, number):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM builds WHERE job = ? AND number = ?", (job, number))
+
+    def store_info(self, job, number, info):
+        """Remember the extract_info() output of a completed build"""
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE builds SET info = ? WHERE job = ? AND number = ? AND building = 0",
+                (json.dumps(info), job, number),
+            )
+
+    def get_info(self, job, number):
+        with self._lock:
+            row = self._db.execute("SELECT info FROM builds WHERE job = ? AND number = ?", (job, number)).fetchone()
+        return json.loads(row['info']) if row and row['info'] else None
+
+    def builds_for_env(self, job, env_name):
+        """Cached builds with this ENV_NAME, newest first"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM builds WHERE job = ? AND env_name = ? ORDER BY number DESC",
+                (job, env_name),
+            ).fetchall()
+        return [_row_to_dict(row) for row in rows]
+
+    def builds_with_fingerprint(self, job, fingerprint):
+        """Cached builds that ran with exactly these parameters (see fingerprint.param_fingerprint), newest first"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM builds WHERE job = ? AND fingerprint = ? ORDER BY number DESC",
+                (job, fingerprint),
+            ).fetchall()
+        return [_row_to_dict(row) for row in rows]
+
+    def refresh(self, client, job, tree, batch_size=25, max_builds=None, max_age=0, env_name=None):
+        """Bring the index up to date with Jenkins; returns the number of builds fetched
+
+        The incremental part is skipped when the last refresh is younger
+        than `max_age` seconds. With `env_name`, history is only paged as
+        far back as the newest building or successful build of that
+        ENV_NAME: a cold index stops there instead of reading `max_builds`
+        builds, and older pages are fetched only when no cached build of
+        env_name is building or succeeded.
+
+        Refreshes run one at a time: callers arriving during one wait for
+        it and then usually find the index fresh enough to skip their own.
+        """
+        with self._refresh_lock:
+            fetched = 0
+            last = self.last_refresh(job)
+            if not (max_age and last and time.time() - last < max_age):
+                fetched += self._fetch_newest(client, job, tree, batch_size, max_builds, env_name)
+            if env_name and not self.has_deciding_build(job, env_name):
+                fetched += self._backfill(client, job, tree, batch_size, max_builds, env_name)
+            return fetched
+
+    def _fetch_newest(self, client, job, tree, batch_size, max_builds, env_name):
+        coverage = self.coverage(job)
+        newest_cached = self.max_number(job) if coverage else 0
+        oldest = None
+        fetched = 0
+        seen = set()
+        complete = True
+        for build in client.iter_builds(job, tree, batch_size=batch_size, max_builds=max_builds):
+            if build['number'] <= newest_cached:
+                break
+            self.record_build(job, build)
+            seen.add(build['number'])
+            fetched += 1
+            oldest = build['number']
+            if coverage is None and _decides(build, env_name):
+                complete = False
+                break
+
+        with self._lock:
+            still_building = [
+                row[0] for row in self._db.execute(
+                    "SELECT number FROM builds WHERE job = ? AND building = 1", (job,)
+                ).fetchall()
+            ]
+        for number in still_building:
+            if number in seen:
+                continue
+            try:
+                build = client.get_json(client.job_url(job, number, "api/json"), params={'tree': tree}, max_age=0)
+            except Exception as e:
+                if getattr(getattr(e, 'response', None), 'status_code', None) == 404:
+                    self.forget_build(job, number)
+                else:
+                    print(f"  Could not re-check build #{number}: {e}")
+                continue
+            self.record_build(job, build)
+            fetched += 1
+
+        if coverage is not None:
+            oldest, complete = coverage
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO refreshes (job, refreshed_at, oldest, complete) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (job) DO UPDATE SET refreshed_at = excluded.refreshed_at, oldest = excluded.oldest, "
+                "complete = excluded.complete",
+                (job, time.time(), oldest, int(complete)),
+            )
+        return fetched
+
+    def _backfill(self, client, job, tree, batch_size, max_builds, env_name):
+        """Page further back than the cached history until a build deciding env_name turns up"""
+        coverage = self.coverage(job)
+        if coverage is None or coverage[1] or coverage[0] is None:
+            return 0
+        oldest = coverage[0]
+        with self._lock:
+            cached = self._db.execute("SELECT COUNT(*) FROM builds WHERE job = ? AND number >= ?",
+                                      (job, oldest)).fetchone()[0]
+        # Every build from `oldest` up is cached, so older history starts about `cached` builds back;
+        # builds Jenkins has discarded since put it nearer. Page from one build earlier and step back
+        # while the first build fetched is already older than `oldest`.
+        start = max(0, cached - 1)
+        while True:
+            builds = client.iter_builds(job, tree, batch_size=batch_size, max_builds=max_builds, start=start)
+            first = next(builds, None)
+            if start == 0 or (first is not None and first['number'] >= oldest):
+                break
+            start = max(0, start - batch_size)
+        fetched = 0
+        complete = True
+        for build in itertools.chain([first] if first else [], builds):
+            if build['number'] >= oldest:
+                continue  # Newer builds arrived since, shifting the pages
+            self.record_build(job, build)
+            fetched += 1
+            oldest = build['number']
+            if _decides(build, env_name):
+                complete = False
+                break
+        with self._lock, self._db:
+            self._db.execute("UPDATE refreshes SET oldest = ?, complete = ? WHERE job = ?",
+                             (oldest, int(complete), job))
+        return fetched
+
+
+def _decides(build, env_name):
+    """Whether this Jenkins build JSON is a building or successful build of env_name"""
+    if not env_name or build_parameters(build).get('ENV_NAME') != env_name:
+        return False
+    return bool(build.get('building')) or build.get('result') in (None, 'SUCCESS')
+
+
+def _row_to_dict(row):
+    build = dict(row)
+    build['building'] = bool(build['building'])
+    build['params'] = json.loads(build['params'])
+    build['info'] = json.loads(build['info']) if build['info'] else None
+    return build
@@ -0,0 +1,153 @@
+import time
+
+DEFAULT_MIN_INTERVAL = 2  # Densest polling, used around and after the expected finish
+DEFAULT_MAX_INTERVAL = 60  # Sparsest polling, used early in a long build
+UNKNOWN_ESTIMATE_INTERVAL = 10  # Used when Jenkins has no estimate (first build of a job)
+MAX_CONSECUTIVE_ERRORS = 5
+
+BUILD_STATUS_TREE = 'building,result,estimatedDuration,timestamp'
+
+
+class WaitTimeout(Exception):
+    """Raised when a queue item or build does not finish before its deadline"""
+
+
+class PollSchedule:
+    """Decides when to poll a running build, using Jenkins' estimatedDuration and timestamp
+
+    Early in a build the next poll is scheduled for halfway to the expected
+    finish (capped at `max_interval`), so polls get denser as the finish
+    approaches; once the estimate has passed, polling stays at `min_interval`.
+    """
+
+    def __init__(self, estimated_ms=None, started_ms=None, min_interval=DEFAULT_MIN_INTERVAL,
+                 max_interval=DEFAULT_MAX_INTERVAL):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.estimated = None
+        self.started = None
+        self.update(estimated_ms, started_ms)
+
+    def update(self, estimated_ms, started_ms):
+        """Take the latest estimatedDuration/timestamp (milliseconds) from build JSON"""
+        if estimated_ms and estimated_ms > 0:
+            self.estimated = estimated_ms / 1000
+        if started_ms and started_ms > 0:
+            self.started = started_ms / 1000
+
+    def elapsed(self):
+        if self.started is None:
+            return None
+        return max(0.0, time.time() - self.started)
+
+    def eta(self):
+        """Seconds until the expected finish (negative once overdue), or None without an estimate"""
+        elapsed = self.elapsed()
+        if elapsed is None or self.estimated is None:
+            return None
+        return self.estimated - elapsed
+
+    def percent(self):
+        elapsed = self.elapsed()
+        if elapsed is None or not self.estimated:
+            return None
+        return min(99.0, 100.0 * elapsed / self.estimated)
+
+    def next_interval(self):
+        remaining = self.eta()
+        if remaining is None:
+            interval = UNKNOWN_ESTIMATE_INTERVAL
+        elif remaining <= 0:
+            interval = self.min_interval
+        else:
+            interval = remaining / 2
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def describe(self):
+        """Human-readable progress, e.g. '42% complete, ETA 3m10s'"""
+        percent = self.percent()
+        remaining = self.eta()
+        if percent is None or remaining is None:
+            elapsed = self.elapsed()
+            return f"running for {_format_seconds(elapsed)}" if elapsed is not None else "no estimate yet"
+        if remaining <= 0:
+            return f"overdue by {_format_seconds(-remaining)}"
+        return f"{percent:.0f}% complete, ETA {_format_seconds(remaining)}"
+
+
+def wait_for_queue(client, queue_location, timeout, initial_interval=0.5, max_interval=10, factor=2):
+    """Poll a queue item with exponential backoff until it has a build number
+
+    Returns the build number, or None if the item was cancelled. Raises
+    WaitTimeout once `timeout` seconds have passed.
+    """
+    deadline = time.monotonic() + timeout
+    interval = initial_interval
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            queue_data = client.get_json(f"{queue_location}api/json",
+                                         params={'tree': 'executable[number],cancelled,why'}, max_age=0)
+            if queue_data.get('cancelled'):
+                print("✗ Queue item was cancelled")
+                return None
+            executable = queue_data.get('executable') or {}
+            if executable.get('number'):
+                return executable['number']
+            why = queue_data.get('why') or 'waiting'
+            print(f"  Attempt {attempt}: Build still in queue ({why})...")
+        except Exception as e:
+            print(f"  Error checking queue: {e}")
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise WaitTimeout(f"build did not leave the queue within {timeout}s")
+        time.sleep(min(interval, remaining))
+        interval = min(max_interval, interval * factor)
+
+
+def wait_for_build(client, build_url, timeout, min_interval=DEFAULT_MIN_INTERVAL,
+                   max_interval=DEFAULT_MAX_INTERVAL, on_poll=None):
+    """Poll a build until it stops building, scheduling polls from its estimated duration
+
+    `on_poll(status, schedule)` is called after every successful poll.
+    Returns the final build JSON. Raises WaitTimeout after `timeout`
+    seconds, and re-raises the last error after MAX_CONSECUTIVE_ERRORS
+    failed polls in a row.
+    """
+    deadline = time.monotonic() + timeout
+    schedule = PollSchedule(min_interval=min_interval, max_interval=max_interval)
+    errors = 0
+    while True:
+        try:
+            status = client.get_json(build_url, params={'tree': BUILD_STATUS_TREE}, max_age=0)
+            errors = 0
+        except Exception as e:
+            errors += 1
+            if errors >= MAX_CONSECUTIVE_ERRORS:
+                raise
+            print(f"  Error checking build status ({errors}/{MAX_CONSECUTIVE_ERRORS}): {e}")
+            status = None
+
+        if status is not None:
+            schedule.update(status.get('estimatedDuration'), status.get('timestamp'))
+            if not status.get('building'):
+                return status
+            if on_poll:
+                on_poll(status, schedule)
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise WaitTimeout(f"build did not finish within {timeout}s")
+        interval = schedule.min_interval if status is None else schedule.next_interval()
+        time.sleep(min(interval, remaining))
+
+
+def _format_seconds(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
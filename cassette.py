@@ -0,0 +1,551 @@
+"""Record a run's Jenkins/HTTP exchanges, bastion channels and MySQL queries to a file, and replay them
+
+A cassette is a JSON file. Replay serves each recorded answer again without
+Jenkins, the bastion or MySQL, under a virtual clock that turns sleeps into
+no-ops in the modules it is installed in, so a whole provisioning flow
+re-runs in well under a second.
+
+Interactions are matched by their request (method, URL and body; or
+database, SQL and arguments; or forward and channel target) and, for identical
+requests, served in the order they were recorded. Once a request has used
+up its recordings the last answer keeps being served, which is what a poll
+loop asking again after the recorded end of a build expects.
+
+Cassettes hold whatever the run saw, console logs and credentials included;
+keep them out of version control unless the run was against a test stack.
+"""
+import base64
+import datetime
+import decimal
+import io
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+FORMAT_VERSION = 2
+RECORD = 'record'
+REPLAY = 'replay'
+# Hop-by-hop and encoding headers no longer describe a body stored decoded
+_DROPPED_HEADERS = {'content-encoding', 'transfer-encoding', 'content-length', 'connection'}
+
+
+class CassetteMiss(LookupError):
+    """Replay was asked for something the cassette never recorded"""
+
+
+class RecordedError(Exception):
+    """An error raised during recording, raised again on replay with the same arguments"""
+
+
+def encode_value(value):
+    """JSON-safe form of a value coming back from MySQL"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [encode_value(item) for item in value]
+    if isinstance(value, (bytes, bytearray)):
+        return {'$bytes': base64.b64encode(bytes(value)).decode('ascii')}
+    if isinstance(value, datetime.datetime):
+        return {'$datetime': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'$date': value.isoformat()}
+    if isinstance(value, datetime.timedelta):
+        return {'$timedelta': value.total_seconds()}
+    if isinstance(value, decimal.Decimal):
+        return {'$decimal': str(value)}
+    return str(value)
+
+
+def decode_value(value):
+    if isinstance(value, list):
+        return tuple(decode_value(item) for item in value)
+    if isinstance(value, dict):
+        (tag, raw), = value.items()
+        if tag == '$bytes':
+            return base64.b64decode(raw)
+        if tag == '$datetime':
+            return datetime.datetime.fromisoformat(raw)
+        if tag == '$date':
+            return datetime.date.fromisoformat(raw)
+        if tag == '$timedelta':
+            return datetime.timedelta(seconds=raw)
+        if tag == '$decimal':
+            return decimal.Decimal(raw)
+    return value
+
+
+class _ClockedTime:
+    """Stands in for the `time` module inside one module: the clock's sleep/time/monotonic, the rest real"""
+
+    def __init__(self, clock):
+        self.sleep = clock.sleep
+        self.time = clock.time
+        self.monotonic = clock.monotonic
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+class VirtualClock:
+    """Virtual time.sleep/time.time/time.monotonic: sleeping only moves the clock forward
+
+    Installed per module, by pointing that module's `time` global at the
+    clock; the time module itself and every other module (HTTP, SSH and
+    MySQL libraries, test runners) keep real time. Real elapsed time still
+    counts, so the clock never runs backwards; time.perf_counter is left
+    alone so profiles measure real work.
+    """
+
+    def __init__(self, start=None):
+        self._real = (time.sleep, time.time, time.monotonic)
+        self._start_wall = time.time() if start is None else start
+        self._start_mono = time.monotonic()
+        self._offset = 0.0
+        self._lock = threading.Lock()
+        self._installed = []
+
+    def sleep(self, seconds):
+        with self._lock:
+            self._offset += max(0.0, seconds)
+
+    def monotonic(self):
+        return self._start_mono + self._elapsed()
+
+    def time(self):
+        return self._start_wall + self._elapsed()
+
+    def _elapsed(self):
+        with self._lock:
+            return self._real[2]() - self._start_mono + self._offset
+
+    def install(self, modules):
+        """Make each of `modules` (which must `import time`) use this clock"""
+        for module in modules:
+            self._installed.append((module, module.time))
+            module.time = _ClockedTime(self)
+
+    def uninstall(self):
+        while self._installed:
+            module, original = self._installed.pop()
+            module.time = original
+
+    @contextmanager
+    def installed(self, modules):
+        self.install(modules)
+        try:
+            yield self
+        finally:
+            self.uninstall()
+
+
+class Cassette:
+    """One run's interactions, being recorded (mode RECORD) or replayed (mode REPLAY)
+
+    On replay the virtual clock is installed in `clock_modules` until close().
+    """
+
+    def __init__(self, path, mode, clock_modules=()):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"unknown cassette mode {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.clock = None
+        self._lock = threading.Lock()
+        self._interactions = {'http': [], 'db': [], 'forward': [], 'channel': []}
+        self._queues = {}
+        self._servers = {}  # local forward port -> the MySQL host behind it
+        if mode == RECORD:
+            self.started_at = time.time()
+            return
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != FORMAT_VERSION:
+            raise ValueError(f"{path}: cassette format {data.get('version')} (expected {FORMAT_VERSION})")
+        self.started_at = data['started_at']
+        for kind in self._interactions:
+            for interaction in data.get(kind, []):
+                self._queues.setdefault((kind, interaction['key']), deque()).append(interaction)
+        self.clock = VirtualClock(self.started_at)
+        self.clock.install(clock_modules)
+
+    def record(self, kind, key, **answer):
+        with self._lock:
+            self._interactions[kind].append(dict(answer, key=key))
+
+    def replay(self, kind, key):
+        with self._lock:
+            queue = self._queues.get((kind, key))
+            if not queue:
+                raise CassetteMiss(f"no recorded {kind} interaction for {key}")
+            return queue.popleft() if len(queue) > 1 else queue[0]
+
+    def close(self):
+        """Write the cassette (when recording) and put the real clock back"""
+        if self.clock is not None:
+            self.clock.uninstall()
+            self.clock = None
+        if self.mode != RECORD:
+            return
+        data = dict(self._interactions, version=FORMAT_VERSION, started_at=self.started_at)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+    # HTTP, through a requests transport adapter
+
+    def attach(self, session):
+        """Route a requests.Session through the cassette"""
+        adapter = _recording_adapter(self, session) if self.mode == RECORD else _replay_adapter(self)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    @staticmethod
+    def http_key(request):
+        body = request.body
+        if isinstance(body, bytes):
+            body = body.decode('utf-8', errors='replace')
+        return json.dumps([request.method, request.url, body])
+
+    # MySQL, through mysql_session.connection_hook
+
+    def connection_hook(self, connect, settings):
+        # Connections all go to 127.0.0.1 on a random forward port, so they
+        # are told apart by the host at the far end of the forward
+        server = self._servers.get(settings.get('port'), settings.get('host'))
+        database = settings.get('database')
+        key = json.dumps(['connect', server, database, settings.get('user')])
+        if self.mode == REPLAY:
+            recorded = self.replay('db', key)
+            if 'error' in recorded:
+                raise RecordedError(*decode_value(recorded['error']))
+            return ReplayConnection(self, server, database)
+        try:
+            connection = connect(settings)
+        except Exception as e:
+            self.record('db', key, error=encode_value(list(e.args)))
+            raise
+        self.record('db', key)
+        return RecordingConnection(connection, self, server, database)
+
+    def remember_forward(self, forward, remote_host):
+        with self._lock:
+            self._servers[forward.local_port] = remote_host
+        return forward
+
+    # The bastion, wrapping ssh_forward.SSHForwarder
+
+    def forwarder(self, forwarder):
+        return RecordingForwarder(forwarder, self) if self.mode == RECORD else ReplayForwarder(self)
+
+
+def _recording_adapter(cassette, session):
+    from requests.adapters import HTTPAdapter
+
+    current = session.get_adapter('https://')
+
+    class RecordingAdapter(HTTPAdapter):
+        def send(self, request, **kwargs):
+            response = super().send(request, **kwargs)
+            content = response.content  # Streamed bodies too; they are replayed from memory
+            headers = {k: v for k, v in response.headers.items() if k.lower() not in _DROPPED_HEADERS}
+            cassette.record('http', Cassette.http_key(request), status=response.status_code,
+                            reason=response.reason, headers=headers,
+                            body=base64.b64encode(content).decode('ascii'))
+            return response
+
+    return RecordingAdapter(pool_connections=getattr(current, '_pool_connections', 10),
+                            pool_maxsize=getattr(current, '_pool_maxsize', 10))
+
+
+def _replay_adapter(cassette):
+    from requests.adapters import BaseAdapter
+    from requests.models import Response
+    from requests.structures import CaseInsensitiveDict
+    from requests.utils import get_encoding_from_headers
+
+    class ReplayAdapter(BaseAdapter):
+        def send(self, request, **kwargs):
+            recorded = cassette.replay('http', Cassette.http_key(request))
+            content = base64.b64decode(recorded['body'])
+            response = Response()
+            response.status_code = recorded['status']
+            response.reason = recorded.get('reason')
+            response.headers = CaseInsensitiveDict(recorded['headers'])
+            response.headers['Content-Length'] = str(len(content))
+            response.encoding = get_encoding_from_headers(response.headers)
+            response.raw = io.BytesIO(content)
+            response.url = request.url
+            response.request = request
+            response.connection = self
+            return response
+
+        def close(self):
+            pass
+
+    return ReplayAdapter()
+
+
+class _ServedCursor:
+    """Cursor whose rows are already in memory; the base of both recording and replay cursors"""
+
+    def __init__(self):
+        self.description = None
+        self.rowcount = -1
+        self._rows = []
+        self._position = 0
+
+    def _serve(self, rows, description, rowcount):
+        self._rows = rows
+        self._position = 0
+        self.description = description
+        self.rowcount = rowcount
+
+    def fetchone(self):
+        if self._position >= len(self._rows):
+            return None
+        self._position += 1
+        return self._rows[self._position - 1]
+
+    def fetchmany(self, size=1):
+        chunk = self._rows[self._position:self._position + size]
+        self._position += len(chunk)
+        return chunk
+
+    def fetchall(self):
+        rest = self._rows[self._position:]
+        self._position = len(self._rows)
+        return rest
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _db_key(connection, sql, args):
+    return json.dumps([connection.server, connection.database, sql, encode_value(args)])
+
+
+class RecordingCursor(_ServedCursor):
+    """Runs each query on a real cursor, reads the whole result and records it"""
+
+    def __init__(self, cursor, connection):
+        super().__init__()
+        self._cursor = cursor
+        self._connection = connection
+
+    def execute(self, sql, args=None):
+        self._run(_db_key(self._connection, sql, args), self._cursor.execute, sql, args)
+
+    def executemany(self, sql, args):
+        args = list(args)
+        # Only the batch size is part of the key; the rows themselves can be large
+        self._run(_db_key(self._connection, sql, ['many', len(args)]), self._cursor.executemany, sql,
+                  args)
+
+    def _run(self, key, method, sql, args):
+        cassette = self._connection.cassette
+        try:
+            result = method(sql, args)
+        except Exception as e:
+            cassette.record('db', key, error=encode_value(list(e.args)))
+            raise
+        rows = [tuple(row) for row in self._cursor.fetchall()] if self._cursor.description else []
+        description = [list(column[:2]) for column in self._cursor.description or []] or None
+        self._serve(rows, description, self._cursor.rowcount)
+        cassette.record('db', key, result=result, rows=encode_value(rows), description=description,
+                        rowcount=self._cursor.rowcount)
+        return result
+
+    def close(self):
+        self._cursor.close()
+
+
+class RecordingConnection:
+    """A real DB-API connection whose cursors record every query"""
+
+    def __init__(self, connection, cassette, server, database):
+        self.connection = connection
+        self.cassette = cassette
+        self.server = server
+        self.database = database
+
+    def cursor(self, cursor_class=None):
+        cursor = self.connection.cursor(cursor_class) if cursor_class else self.connection.cursor()
+        return RecordingCursor(cursor, self)
+
+    def select_db(self, database):
+        self.connection.select_db(database)
+        self.database = database
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+
+class ReplayCursor(_ServedCursor):
+    def __init__(self, connection):
+        super().__init__()
+        self._connection = connection
+
+    def execute(self, sql, args=None):
+        return self._replay(_db_key(self._connection, sql, args))
+
+    def executemany(self, sql, args):
+        return self._replay(_db_key(self._connection, sql, ['many', len(list(args))]))
+
+    def _replay(self, key):
+        recorded = self._connection.cassette.replay('db', key)
+        if 'error' in recorded:
+            raise RecordedError(*decode_value(recorded['error']))
+        rows = list(decode_value(recorded['rows']))
+        self._serve(rows, [tuple(column) for column in recorded['description']] if recorded['description'] else None,
+                    recorded['rowcount'])
+        return recorded['result']
+
+
+class ReplayConnection:
+    """Stands in for a pymysql connection, answering from the cassette"""
+
+    open = True
+
+    def __init__(self, cassette, server, database):
+        self.cassette = cassette
+        self.server = server
+        self.database = database
+
+    def cursor(self, cursor_class=None):
+        return ReplayCursor(self)
+
+    def select_db(self, database):
+        self.database = database
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        self.open = False
+
+
+class _RecordingTransport:
+    def __init__(self, transport, cassette):
+        self._transport = transport
+        self._cassette = cassette
+
+    def open_channel(self, kind, dest_addr, src_addr=None, timeout=None):
+        key = json.dumps([kind, list(dest_addr)])
+        try:
+            channel = self._transport.open_channel(kind, dest_addr, src_addr, timeout=timeout)
+        except Exception as e:
+            self._cassette.record('channel', key, error=str(e))
+            raise
+        self._cassette.record('channel', key)
+        return channel
+
+    def __getattr__(self, name):
+        return getattr(self._transport, name)
+
+
+class RecordingForwarder:
+    """An SSHForwarder whose forwards and bastion channel opens (as used by endpoint probes) are recorded
+
+    Only whether each forward opened is recorded; the MySQL traffic over it
+    is recorded at the connection.
+    """
+
+    def __init__(self, forwarder, cassette):
+        self._forwarder = forwarder
+        self._cassette = cassette
+
+    @property
+    def connected(self):
+        return self._forwarder.connected
+
+    def connect(self):
+        return _RecordingTransport(self._forwarder.connect(), self._cassette)
+
+    def forward(self, remote_host, remote_port, *args, **kwargs):
+        key = json.dumps([remote_host, remote_port])
+        try:
+            forward = self._forwarder.forward(remote_host, remote_port, *args, **kwargs)
+        except Exception as e:
+            self._cassette.record('forward', key, error=str(e))
+            raise
+        self._cassette.record('forward', key)
+        return self._cassette.remember_forward(forward, remote_host)
+
+    def close(self):
+        self._forwarder.close()
+
+
+class _ReplayChannel:
+    def close(self):
+        pass
+
+
+class _ReplayTransport:
+    def __init__(self, cassette):
+        self._cassette = cassette
+
+    def open_channel(self, kind, dest_addr, src_addr=None, timeout=None):
+        recorded = self._cassette.replay('channel', json.dumps([kind, list(dest_addr)]))
+        if 'error' in recorded:
+            raise RecordedError(recorded['error'])
+        return _ReplayChannel()
+
+
+class ReplayForward:
+    """A LocalForward look-alike; nothing listens on its port"""
+
+    _next_port = 40000
+    _port_lock = threading.Lock()
+
+    def __init__(self, remote_host, remote_port):
+        self.remote_host = remote_host
+        self.remote_port = remote_port
+        with ReplayForward._port_lock:
+            self.local_port = ReplayForward._next_port
+            ReplayForward._next_port += 1
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ReplayForwarder:
+    """Stands in for SSHForwarder during replay: no SSH connection is made"""
+
+    connected = True
+
+    def __init__(self, cassette):
+        self._cassette = cassette
+        self._transport = _ReplayTransport(cassette)
+
+    def connect(self):
+        return self._transport
+
+    def forward(self, remote_host, remote_port, *args, **kwargs):
+        recorded = self._cassette.replay('forward', json.dumps([remote_host, remote_port]))
+        if 'error' in recorded:
+            raise RecordedError(recorded['error'])
+        return self._cassette.remember_forward(ReplayForward(remote_host, remote_port), remote_host)
+
+    def close(self):
+        pass
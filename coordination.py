@@ -0,0 +1,153 @@
+"""Coordination between main.py processes on the same machine, through lock files
+
+fcntl locks are only available on POSIX; elsewhere everything here still
+works within one process but does not coordinate across processes.
+"""
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from tracing import tracer
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEFAULT_RATE = 10.0  # Requests per second per host, shared by every local process
+DEFAULT_BURST = 20  # Requests a host may take at once after being idle
+DEFAULT_CLAIM_TTL = 30 * 60  # Seconds a published trigger is followed by later processes
+
+_UNSAFE_CHARS_RE = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+def _safe_name(name):
+    return _UNSAFE_CHARS_RE.sub('_', name)
+
+
+@contextmanager
+def locked_file(path, thread_lock):
+    """Open `path` (created if missing) holding an exclusive lock on it for the duration
+
+    `thread_lock` serializes threads of this process, since flock locks are
+    held per open file rather than per thread.
+    """
+    with thread_lock:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield fd
+        finally:
+            os.close(fd)  # Releases the flock too
+
+
+def _read_json(fd):
+    os.lseek(fd, 0, os.SEEK_SET)
+    data = b''
+    while True:
+        chunk = os.read(fd, 4096)
+        if not chunk:
+            break
+        data += chunk
+    try:
+        return json.loads(data) if data else None
+    except ValueError:
+        return None
+
+
+def _write_json(fd, value):
+    os.lseek(fd, 0, os.SEEK_SET)
+    os.ftruncate(fd, 0)
+    os.write(fd, json.dumps(value).encode('utf-8'))
+
+
+class RateLimiter:
+    """Token bucket per host, kept in a file so every local process draws from the same bucket
+
+    `acquire(host)` blocks until a token is available and returns how long
+    it waited.
+    """
+
+    def __init__(self, directory, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        self.directory = directory
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def acquire(self, host):
+        if self.rate <= 0:
+            return 0.0
+        path = os.path.join(self.directory, f"{_safe_name(host)}.bucket")
+        started = time.monotonic()
+        while True:
+            with locked_file(path, self._lock) as fd:
+                now = time.time()
+                state = _read_json(fd) or {}
+                tokens = state.get('tokens', self.burst)
+                updated = state.get('updated', now)
+                tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+                if tokens >= 1:
+                    _write_json(fd, {'tokens': tokens - 1, 'updated': now})
+                    return time.monotonic() - started
+                _write_json(fd, {'tokens': tokens, 'updated': now})
+                delay = (1 - tokens) / self.rate
+            time.sleep(delay)
+
+
+class TriggerClaim:
+    """What the process holding an ENV_NAME's trigger lock found or published"""
+
+    def __init__(self, env_name, fd, record):
+        self.env_name = env_name
+        self.record = record
+        self._fd = fd
+
+    @property
+    def build_number(self):
+        """Build a previous leader published for this ENV_NAME, or None"""
+        return self.record.get('build_number') if self.record else None
+
+    @property
+    def params(self):
+        return self.record.get('params') if self.record else None
+
+    def publish(self, build_number, params):
+        """Record the build this process triggered, for processes waiting on the lock"""
+        self.record = {'build_number': build_number, 'params': params, 'published_at': time.time(),
+                       'pid': os.getpid()}
+        _write_json(self._fd, self.record)
+
+
+class TriggerLocks:
+    """Per-ENV_NAME lock held while a build is looked for, triggered and queued
+
+    The first process to take the lock is the leader: it triggers the build
+    and publishes its number before releasing. Processes that were waiting
+    then see the published build (for `claim_ttl` seconds) and follow it
+    instead of triggering a duplicate.
+    """
+
+    def __init__(self, directory, claim_ttl=DEFAULT_CLAIM_TTL):
+        self.directory = directory
+        self.claim_ttl = claim_ttl
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def claim(self, env_name):
+        with self._locks_lock:
+            thread_lock = self._locks.setdefault(env_name, threading.Lock())
+        path = os.path.join(self.directory, f"trigger-{_safe_name(env_name)}.json")
+        started = time.perf_counter()
+        with locked_file(path, thread_lock) as fd:
+            tracer.add_time('trigger_lock_wait', time.perf_counter() - started)
+            record = _read_json(fd)
+            if record and time.time() - record.get('published_at', 0) > self.claim_ttl:
+                record = None
+            yield TriggerClaim(env_name, fd, record)
@@ -0,0 +1,171 @@
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import tracer
+
+DEFAULT_TIMEOUT = 5  # Seconds allowed for each probe
+DEFAULT_WORKERS = 8
+HTTP_FIELDS = ('elk', 'scannerapi', 'alb', 'cnc', 'api')
+PGSQL_PORT = 5432
+MYSQL_PORT = 3306
+PRIVATE_IP_PORTS = (22,)
+
+# Probe outcomes
+OK = 'ok'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+class ProbeResult:
+    """Outcome of one probe: what was checked, how it went and how long it took"""
+
+    def __init__(self, name, kind, target, status, latency=None, detail=''):
+        self.name = name
+        self.kind = kind
+        self.target = target
+        self.status = status
+        self.latency = latency
+        self.detail = detail
+
+    @property
+    def ok(self):
+        return self.status == OK
+
+    def to_dict(self):
+        return {'name': self.name, 'kind': self.kind, 'target': self.target, 'status': self.status,
+                'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+                'detail': self.detail}
+
+
+def probe_http(session, url, timeout=DEFAULT_TIMEOUT):
+    """GET the endpoint; anything below 500 means it is up (auth pages and redirects count)"""
+    if '://' not in url:
+        url = f"https://{url}"
+    response = session.get(url, timeout=timeout, allow_redirects=False, stream=True)
+    try:
+        detail = f"HTTP {response.status_code}"
+        return (OK if response.status_code < 500 else FAILED), detail
+    finally:
+        response.close()
+
+
+def probe_tcp(host, port, timeout=DEFAULT_TIMEOUT, forwarder=None):
+    """Check that host:port accepts connections, through the bastion when a forwarder is given
+
+    Private IPs are usually only reachable from inside the VPC, so the
+    connection is made by the bastion as an SSH direct-tcpip channel.
+    """
+    if forwarder is None:
+        with socket.create_connection((host, port), timeout=timeout):
+            return OK, "connected"
+    channel = forwarder.connect().open_channel('direct-tcpip', (host, port), ('127.0.0.1', 0), timeout=timeout)
+    channel.close()
+    return OK, "connected via bastion"
+
+
+def probe_pgsql(forwarder, host, user, password, timeout=DEFAULT_TIMEOUT, port=PGSQL_PORT):
+    """Log in to PostgreSQL over a forward; without psycopg2 only the port is checked"""
+    forward = forwarder.forward(host, port, open_timeout=timeout)
+    try:
+        try:
+            import psycopg2
+        except ImportError:
+            return SKIPPED, "port reachable; install psycopg2 to test the login"
+        connection = psycopg2.connect(host='127.0.0.1', port=forward.local_port, user=user, password=password,
+                                      dbname='postgres', connect_timeout=max(1, int(timeout)))
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT version()")
+                version = cursor.fetchone()[0]
+        finally:
+            connection.close()
+        return OK, version.split(',')[0]
+    finally:
+        forward.close()
+
+
+def plan_probes(info, forwarder=None, http_session=None, timeout=DEFAULT_TIMEOUT,
+                private_ip_ports=PRIVATE_IP_PORTS):
+    """Turn extract_info() output into a list of (name, kind, target, check) probes
+
+    Probes needing a tool that is not available (an HTTP session, the
+    bastion forwarder) are still listed, with check=None, so the report
+    shows what was not verified.
+    """
+    probes = []
+    for field in HTTP_FIELDS:
+        if not info.get(field):
+            continue
+        check = None
+        if http_session is not None:
+            check = lambda url=info[field]: probe_http(http_session, url, timeout)
+        probes.append((field, 'http', info[field], check))
+
+    private_ips = (info.get('private_ips') or '').split()
+    for ip in private_ips:
+        for port in private_ip_ports:
+            probes.append(('private_ip', 'tcp', f"{ip}:{port}",
+                           lambda ip=ip, port=port: probe_tcp(ip, port, timeout, forwarder)))
+
+    for ip in info.get('mysql_ips') or []:
+        probes.append(('mysql', 'tcp', f"{ip}:{MYSQL_PORT}",
+                       lambda ip=ip: probe_tcp(ip, MYSQL_PORT, timeout, forwarder)))
+
+    if info.get('pgsql_host'):
+        check = None
+        if forwarder and info.get('pgsql_user') and info.get('pgsql_pass'):
+            check = lambda: probe_pgsql(forwarder, info['pgsql_host'], info['pgsql_user'], info['pgsql_pass'],
+                                        timeout)
+        probes.append(('pgsql', 'pgsql', f"{info['pgsql_host']}:{PGSQL_PORT}", check))
+    return probes
+
+
+def run_probes(probes, workers=DEFAULT_WORKERS):
+    """Run probes concurrently (at most `workers` at once); results come back in probe order"""
+
+    def run(probe):
+        name, kind, target, check = probe
+        if check is None:
+            return ProbeResult(name, kind, target, SKIPPED, detail="not configured")
+        started = time.perf_counter()
+        try:
+            status, detail = check()
+        except Exception as e:
+            status, detail = FAILED, f"{type(e).__name__}: {e}"
+        latency = time.perf_counter() - started
+        tracer.add_time(f"probe_{kind}", latency, failed=status == FAILED)
+        return ProbeResult(name, kind, target, status, latency, detail)
+
+    if not probes:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(probes))), thread_name_prefix='probe') as pool:
+        return list(pool.map(run, probes))
+
+
+def http_session(pool_size=DEFAULT_WORKERS, verify=True):
+    """A pooled requests session for the HTTP probes"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    session.verify = verify
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def format_report(results):
+    """Latency report table for a finished probe run"""
+    marks = {OK: '✓', FAILED: '✗', SKIPPED: '-'}
+    headers = ('', 'Probe', 'Target', 'Latency', 'Detail')
+    rows = [(marks[result.status], result.name, result.target,
+             f"{result.latency * 1000:.0f} ms" if result.latency is not None else '-', result.detail)
+            for result in results]
+    widths = [max(len(str(row[i])) for row in rows + [headers]) for i in range(len(headers))]
+    lines = ['  '.join(str(value).ljust(width) for value, width in zip(row, widths)).rstrip()
+             for row in [headers] + rows]
+    counts = {status: sum(1 for result in results if result.status == status) for status in marks}
+    lines.append(f"{counts[OK]} ok, {counts[FAILED]} failed, {counts[SKIPPED]} skipped")
+    return '\n'.join(lines)
@@ -0,0 +1,260 @@
+import re
+
+# Rule kinds
+FIRST = 'first'        # first token after the marker (may sit on a following line)
+IP_PAIR = 'ip_pair'    # an IP after the marker, plus an optional IP on the very next line
+IP_BLOCK = 'ip_block'  # every IP on the `window` lines following each marker
+
+IP_PATTERN = r'(?:\d{1,3}\.){3}\d{1,3}'
+_IP_PREFIX_RE = re.compile(IP_PATTERN)
+_IP_ANYWHERE_RE = re.compile(r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b')
+
+MAX_LINE_LENGTH = 64 * 1024  # Longer partial lines are flushed rather than buffered
+
+
+class FieldRule:
+    """One entry of the extraction table: where a field starts and how to read its value"""
+
+    __slots__ = ('key', 'marker', 'kind', 'window', 'value_re')
+
+    def __init__(self, key, marker, pattern=r'\S+', kind=FIRST, window=3):
+        self.key = key
+        self.marker = marker
+        self.kind = kind
+        self.window = window
+        self.value_re = re.compile(pattern)
+
+
+FIELD_RULES = [
+    FieldRule("elk", "ELK EndPoint:"),
+    FieldRule("scannerapi", "Scannerapi EndPoint:"),
+    FieldRule("alb", "ALB EndPoint:"),
+    FieldRule("cnc", "cnc EndPoint:"),
+    FieldRule("api", "api-endpoint:"),
+    FieldRule("private_ips", "Instance PrivateIP:", IP_PATTERN, kind=IP_PAIR),
+    FieldRule("mysql_user", "MySQL User:"),
+    FieldRule("mysql_pass", "MySQL Pass:"),
+    FieldRule("pgsql_host", "pgSQL private HOST:"),
+    FieldRule("pgsql_user", "pgSQL User:"),
+    FieldRule("pgsql_pass", "pgSQL Pass:"),
+    FieldRule("mysql_ips", "MySQL private HOST:", kind=IP_BLOCK, window=3),
+]
+
+
+def register_pattern(key, marker, pattern=r'\S+', kind=FIRST, window=3):
+    """Add (or replace) a field in the default extraction table"""
+    rule = FieldRule(key, marker, pattern, kind, window)
+    for i, existing in enumerate(FIELD_RULES):
+        if existing.key == key:
+            FIELD_RULES[i] = rule
+            return rule
+    FIELD_RULES.append(rule)
+    return rule
+
+
+class ConsoleExtractor:
+    """Single-pass, line-at-a-time extractor for Jenkins console output
+
+    Lines can come from any iterator (a file, `response.iter_lines()`, a
+    progressive log tail) or as arbitrary text chunks through `feed()`.
+    Only the current partial line and the extracted values are held in
+    memory. With `stop_early`, extraction finishes as soon as every field
+    has been found, an IP block counting as found once the window of its
+    first block with an IP has closed; blocks repeated later in the log are
+    then not read. Without it every block is collected.
+    """
+
+    def __init__(self, rules=None, stop_early=True):
+        self.rules = list(FIELD_RULES if rules is None else rules)
+        self.stop_early = stop_early
+        self._by_marker = {}
+        for rule in self.rules:
+            self._by_marker.setdefault(rule.marker, []).append(rule)
+        self._marker_re = re.compile('|'.join(re.escape(marker) for marker in self._by_marker))
+        self._single_keys = {rule.key for rule in self.rules if rule.kind != IP_BLOCK}
+        self._values = {}
+        self._pending = []         # rules whose marker ended its line; value is on a later line
+        self._pending_pair = None  # (rule, first_ip) waiting to see whether the next line has a second IP
+        self._ip_blocks = {rule.key: {} for rule in self.rules if rule.kind == IP_BLOCK}
+        self._block_remaining = {key: 0 for key in self._ip_blocks}
+        self._buffer = ''
+        self._done = False
+
+    @property
+    def done(self):
+        return self._done
+
+    def feed_line(self, line):
+        """Process one line; returns True once nothing more needs to be read"""
+        if self._done:
+            return True
+        if self._in_field() or self._marker_re.search(line):
+            self._process_line(line.rstrip('\r\n'))
+        return self._done
+
+    def feed(self, chunk):
+        """Process an arbitrary chunk of text, buffering any trailing partial line"""
+        if self._done or not chunk:
+            return self._done
+        data = self._buffer + chunk
+        cut = data.rfind('\n')
+        if cut == -1:
+            self._buffer = data
+        else:
+            self._buffer = data[cut + 1:]
+            self._scan(data, cut)
+        if len(self._buffer) > MAX_LINE_LENGTH:
+            line, self._buffer = self._buffer, ''
+            self.feed_line(line)
+        return self._done
+
+    def feed_lines(self, lines):
+        """Process lines from any iterator, stopping as soon as extraction is done"""
+        for line in lines:
+            if self.feed_line(line):
+                break
+        return self._done
+
+    def close(self):
+        """Flush the partial line left over by `feed()`"""
+        if self._buffer:
+            line, self._buffer = self._buffer, ''
+            self.feed_line(line)
+
+    def found(self, *keys):
+        """True once all of `keys` have a final value (IP blocks included)"""
+        for key in keys:
+            if key in self._ip_blocks:
+                if not self._ip_blocks[key] or self._block_remaining[key]:
+                    return False
+            elif key not in self._values:
+                return False
+        return True
+
+    def result(self):
+        """Extracted values so far, keyed like `extract_info()` output"""
+        values = dict(self._values)
+        if self._pending_pair:
+            rule, first_ip = self._pending_pair
+            values[rule.key] = first_ip
+        extracted = {}
+        for rule in self.rules:
+            if rule.kind == IP_BLOCK:
+                ips = list(self._ip_blocks[rule.key])
+                if ips:
+                    extracted[rule.key] = ips
+            elif rule.key in values:
+                extracted[rule.key] = values[rule.key].strip()
+        return extracted
+
+    def _scan(self, data, endpos):
+        """Process the complete lines in data[:endpos + 1], jumping between marker hits
+
+        Lines are only handled in Python when they contain a marker or sit
+        inside a multi-line field. Markers are located with `str.find`, and
+        a marker stops being searched for once its field has a value. The
+        last line ends at data[endpos] and may be empty; blank lines still
+        end an IP pair and count towards an IP block's window.
+        """
+        next_hit = {}
+        pos = 0
+        while pos <= endpos and not self._done:
+            if self._in_field():
+                end = data.find('\n', pos, endpos)
+                end = endpos if end == -1 else end
+            else:
+                hit = endpos
+                for marker in self._active_markers():
+                    found = next_hit.get(marker)
+                    if found is None or found < pos:
+                        found = data.find(marker, pos, endpos)
+                        found = endpos if found == -1 else found
+                        next_hit[marker] = found
+                    hit = min(hit, found)
+                if hit == endpos:
+                    return
+                line_start = data.rfind('\n', pos, hit)
+                pos = pos if line_start == -1 else line_start + 1
+                end = data.find('\n', hit, endpos)
+                end = endpos if end == -1 else end
+            self._process_line(data[pos:end].rstrip('\r'))
+            pos = end + 1
+
+    def _active_markers(self):
+        return [
+            marker for marker, rules in self._by_marker.items()
+            if any(rule.kind == IP_BLOCK or rule.key not in self._values for rule in rules)
+        ]
+
+    def _in_field(self):
+        return bool(self._pending or self._pending_pair or any(self._block_remaining.values()))
+
+    def _process_line(self, line):
+        if self._pending_pair:
+            rule, first_ip = self._pending_pair
+            self._pending_pair = None
+            second = _IP_PREFIX_RE.match(line)
+            self._values[rule.key] = f"{first_ip}\n{second.group(0)}" if second else first_ip
+
+        if self._pending:
+            text = line.lstrip()
+            if text:
+                pending, self._pending = self._pending, []
+                for rule in pending:
+                    self._apply(rule, text)
+
+        for key, remaining in self._block_remaining.items():
+            if remaining:
+                for ip in _IP_ANYWHERE_RE.findall(line):
+                    self._ip_blocks[key][ip] = None
+                self._block_remaining[key] = remaining - 1
+
+        for match in self._marker_re.finditer(line):
+            for rule in self._by_marker[match.group(0)]:
+                if rule.kind == IP_BLOCK:
+                    self._block_remaining[rule.key] = rule.window
+                    continue
+                if rule.key in self._values or rule in self._pending:
+                    continue
+                if self._pending_pair and self._pending_pair[0] is rule:
+                    continue
+                text = line[match.end():].lstrip()
+                if text:
+                    self._apply(rule, text)
+                else:
+                    self._pending.append(rule)
+
+        if self.stop_early and self._complete():
+            self._done = True
+
+    def _apply(self, rule, text):
+        match = rule.value_re.match(text)
+        if not match:
+            return
+        value = match.group(1) if match.groups() else match.group(0)
+        if rule.kind == IP_PAIR and match.end() == len(text):
+            self._pending_pair = (rule, value)
+        else:
+            self._values[rule.key] = value
+
+    def _complete(self):
+        if self._pending or self._pending_pair:
+            return False
+        if not self._single_keys.issubset(self._values):
+            return False
+        return self.found(*self._ip_blocks)
+
+
+def extract_from_lines(lines, rules=None, stop_early=True):
+    """Extract console fields from an iterator of lines"""
+    extractor = ConsoleExtractor(rules, stop_early=stop_early)
+    extractor.feed_lines(lines)
+    return extractor.result()
+
+
+def extract_from_text(text, rules=None, stop_early=True):
+    """Extract console fields from a complete console log"""
+    extractor = ConsoleExtractor(rules, stop_early=stop_early)
+    extractor.feed(text)
+    extractor.close()
+    return extractor.result()
@@ -0,0 +1,60 @@
+import hashlib
+import json
+
+# Build lookup modes
+MATCH_EXACT = 'exact'        # the build ran with exactly the requested parameters
+MATCH_ENV = 'env'            # only ENV_NAME has to match (the original behaviour)
+MATCH_SUPERSET = 'superset'  # every requested parameter matches; the build may have more (e.g. job defaults)
+MATCH_MODES = (MATCH_EXACT, MATCH_ENV, MATCH_SUPERSET)
+
+
+def normalize_params(params):
+    """Canonical form of a parameter dict: stripped string values, empty values dropped
+
+    Jenkins reports booleans as JSON true/false while parameter files hold
+    text, so both are reduced to the same lowercase strings.
+    """
+    normalized = {}
+    for name, value in (params or {}).items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        value = str(value).strip()
+        if value:
+            normalized[str(name).strip()] = value
+    return normalized
+
+
+def param_fingerprint(params):
+    """sha256 of the normalized parameters; equal for any two identical requests"""
+    canonical = json.dumps(normalize_params(params), sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def param_differences(requested, build_params, mode=MATCH_SUPERSET):
+    """Parameters that stop a build with `build_params` from serving `requested`
+
+    Returns a list of (name, requested value, build value) tuples; empty
+    means the build matches under `mode`.
+    """
+    requested = normalize_params(requested)
+    build_params = normalize_params(build_params)
+    if mode == MATCH_ENV:
+        names = ['ENV_NAME']
+    elif mode == MATCH_EXACT:
+        names = sorted(set(requested) | set(build_params))
+    elif mode == MATCH_SUPERSET:
+        names = sorted(requested)
+    else:
+        raise ValueError(f"unknown match mode {mode!r} (expected one of {', '.join(MATCH_MODES)})")
+    return [(name, requested.get(name), build_params.get(name))
+            for name in names if requested.get(name) != build_params.get(name)]
+
+
+def describe_differences(differences, limit=3):
+    """e.g. "PLATFORMAPI_BRANCH 'master' != 'develop'" for log lines"""
+    parts = [f"{name} {wanted!r} != {actual!r}" for name, wanted, actual in differences[:limit]]
+    if len(differences) > limit:
+        parts.append(f"{len(differences) - limit} more")
+    return ', '.join(parts)
@@ -0,0 +1,262 @@
+import csv
+import functools
+import glob
+import gzip
+import json
+import os
+import re
+import tempfile
+import time
+
+from table_export import CSV_NULL, HEX_SUFFIX, quote_identifier
+from tracing import tracer
+
+FIXTURE_PATTERNS = ('*.csv', '*.csv.gz', '*.ndjson', '*.ndjson.gz')
+METHODS = ('executemany', 'load-data')
+INITIAL_BATCH_SIZE = 500
+MIN_BATCH_SIZE = 50
+MAX_BATCH_SIZE = 50000
+COMMIT_ROWS = 200000  # Rows per transaction; a file smaller than this is loaded in one
+PACKET_SHARE = 0.5  # Fraction of the server's max_allowed_packet one batch may fill
+ROW_OVERHEAD = 8  # Bytes added per value for quoting and separators when sizing batches
+
+_ORDER_PREFIX_RE = re.compile(r'^\d+[_-]')
+
+
+def expand_fixture_paths(paths):
+    """Fixture files under `paths` (files or directories), in name order"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in FIXTURE_PATTERNS:
+                files.extend(glob.glob(os.path.join(path, pattern)))
+        else:
+            files.append(path)
+    return sorted(files, key=os.path.basename)
+
+
+def fixture_table(path):
+    """Table a fixture file loads into: '02_users.csv.gz' -> 'users' (the prefix only sets the order)"""
+    name = os.path.basename(path)
+    for suffix in ('.gz', '.csv', '.ndjson'):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return _ORDER_PREFIX_RE.sub('', name)
+
+
+def split_hex_columns(columns):
+    """Column names without HEX_SUFFIX, and the names of the columns that had it (their values are hex)"""
+    names = []
+    hex_columns = set()
+    for column in columns:
+        if column.endswith(HEX_SUFFIX):
+            column = column[:-len(HEX_SUFFIX)]
+            hex_columns.add(column)
+        names.append(column)
+    return names, hex_columns
+
+
+def read_fixture(path):
+    """Open a CSV (header row, \\N for NULL) or NDJSON fixture; returns (columns, row iterator, file)"""
+    opener = gzip.open if path.endswith('.gz') else open
+    f = opener(path, 'rt', encoding='utf-8', newline='')
+    try:
+        if '.ndjson' in os.path.basename(path):
+            first = f.readline()
+            columns = list(json.loads(first)) if first.strip() else []
+
+            def ndjson_rows():
+                if first.strip():
+                    yield _ndjson_values(json.loads(first), columns)
+                for line in f:
+                    if line.strip():
+                        yield _ndjson_values(json.loads(line), columns)
+            return columns, ndjson_rows(), f
+        reader = csv.reader(f)
+        columns = next(reader, [])
+        return columns, ([None if value == CSV_NULL else value for value in row] for row in reader), f
+    except Exception:
+        f.close()
+        raise
+
+
+class BatchTuner:
+    """Finds a good rows-per-statement size while loading
+
+    Starts small and doubles the batch while each doubling still raises
+    throughput noticeably; once it stops paying off the best size seen is
+    kept.
+    """
+
+    def __init__(self, initial=INITIAL_BATCH_SIZE, minimum=MIN_BATCH_SIZE, maximum=MAX_BATCH_SIZE, gain=1.1):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.gain = gain
+        self.settled = False
+        self._best_rate = 0.0
+        self._best_size = initial
+
+    def record(self, rows, seconds):
+        if self.settled or rows < self.size or seconds <= 0:
+            return
+        rate = rows / seconds
+        if rate > self._best_rate * self.gain:
+            self._best_rate, self._best_size = rate, self.size
+            if self.size >= self.maximum:
+                self.settled = True
+            else:
+                self.size = min(self.maximum, self.size * 2)
+        else:
+            self.size = self._best_size
+            self.settled = True
+
+
+def insert_statement(table, columns):
+    names = ', '.join(quote_identifier(column) for column in columns)
+    placeholders = ', '.join(['%s'] * len(columns))
+    # pymysql rewrites executemany() of this into one multi-row INSERT per batch
+    return f"INSERT INTO {quote_identifier(table)} ({names}) VALUES ({placeholders})"
+
+
+def load_executemany(cursor, table, columns, batch):
+    cursor.executemany(insert_statement(table, columns), batch)
+
+
+def load_data_infile(cursor, table, columns, batch, hex_columns=()):
+    """Write the batch as a MySQL-format tab-separated file and LOAD DATA LOCAL INFILE it
+
+    `hex_columns` are read into user variables and stored through UNHEX().
+    """
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='', suffix='.tsv', delete=False) as f:
+        for row in batch:
+            f.write('\t'.join(_tsv_value(value) for value in row) + '\n')
+        path = f.name
+    try:
+        names = ', '.join(f"@hex{i}" if column in hex_columns else quote_identifier(column)
+                          for i, column in enumerate(columns))
+        unhex = ', '.join(f"{quote_identifier(column)} = UNHEX(@hex{i})"
+                          for i, column in enumerate(columns) if column in hex_columns)
+        cursor.execute(f"LOAD DATA LOCAL INFILE %s INTO TABLE {quote_identifier(table)} CHARACTER SET utf8mb4 "
+                       f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({names})"
+                       + (f" SET {unhex}" if unhex else ''), (path,))
+    finally:
+        os.remove(path)
+
+
+def seed_file(connection, path, table, method='executemany', tuner=None, commit_rows=COMMIT_ROWS,
+              max_batch_bytes=None):
+    """Load one fixture file into `table`; returns {path, table, rows, seconds, rows_per_s, batch_size}
+
+    Rows are committed every `commit_rows`; if loading fails the open
+    transaction is rolled back and the error re-raised. A batch is also
+    sent early once its values reach `max_batch_bytes`, so a statement
+    never exceeds the server's packet limit (MySQL drops the connection
+    when one does). Columns exported as hex (see table_export.HEX_SUFFIX)
+    are decoded back to bytes.
+    """
+    tuner = tuner or BatchTuner()
+    columns, rows, f = read_fixture(path)
+    columns, hex_columns = split_hex_columns(columns)
+    if method == 'load-data':
+        load = functools.partial(load_data_infile, hex_columns=hex_columns)
+    else:
+        load = load_executemany
+        if hex_columns:
+            rows = _unhex_rows(rows, [i for i, column in enumerate(columns) if column in hex_columns])
+    started = time.perf_counter()
+    loaded = 0
+    uncommitted = 0
+    try:
+        with connection.cursor() as cursor:
+            batch = []
+            batch_bytes = 0
+            for row in rows:
+                batch.append(row)
+                if max_batch_bytes:
+                    batch_bytes += sum(len(str(value)) + ROW_OVERHEAD for value in row)
+                if len(batch) >= tuner.size or (max_batch_bytes and batch_bytes >= max_batch_bytes):
+                    loaded += _load_batch(load, cursor, table, columns, batch, tuner)
+                    uncommitted += len(batch)
+                    batch = []
+                    batch_bytes = 0
+                    if uncommitted >= commit_rows:
+                        connection.commit()
+                        uncommitted = 0
+            if batch:
+                loaded += _load_batch(load, cursor, table, columns, batch, tuner)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        f.close()
+    elapsed = time.perf_counter() - started
+    tracer.add_time('seed_file', elapsed)
+    return {'path': path, 'table': table, 'rows': loaded, 'seconds': elapsed,
+            'rows_per_s': loaded / elapsed if elapsed else 0.0, 'batch_size': tuner.size, 'method': method}
+
+
+def seed_fixtures(connection, paths, method='executemany', tables=None):
+    """Load every fixture file under `paths` over `connection`, in file-name order
+
+    Unique and foreign-key checks are switched off for the session while
+    loading (fixture files need not be ordered by foreign keys) and switched
+    back on afterwards. `tables`, when given, is the list of tables that
+    exist; files for other tables are refused up front.
+    """
+    files = expand_fixture_paths(paths)
+    if tables is not None:
+        unknown = [path for path in files if fixture_table(path) not in tables]
+        if unknown:
+            raise ValueError(f"fixtures for unknown tables: {', '.join(unknown)}")
+    tuner = BatchTuner()
+    results = []
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT @@max_allowed_packet")
+        max_batch_bytes = int(cursor.fetchone()[0] * PACKET_SHARE)
+        cursor.execute("SET SESSION unique_checks = 0, foreign_key_checks = 0")
+    try:
+        for path in files:
+            results.append(seed_file(connection, path, fixture_table(path), method=method, tuner=tuner,
+                                     max_batch_bytes=max_batch_bytes))
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SET SESSION unique_checks = 1, foreign_key_checks = 1")
+    return results
+
+
+def _load_batch(load, cursor, table, columns, batch, tuner):
+    """Load a batch and let the tuner time it; returns rows loaded"""
+    started = time.perf_counter()
+    load(cursor, table, columns, batch)
+    tuner.record(len(batch), time.perf_counter() - started)
+    return len(batch)
+
+
+def _unhex_rows(rows, positions):
+    for row in rows:
+        row = list(row)
+        for i in positions:
+            if row[i] is not None:
+                row[i] = bytes.fromhex(row[i])
+        yield row
+
+
+def _ndjson_values(record, columns):
+    return [_json_value(record.get(column)) for column in columns]
+
+
+def _json_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def _tsv_value(value):
+    if value is None:
+        return CSV_NULL
+    if isinstance(value, bool):
+        value = int(value)
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+            .replace('\r', '\\r'))
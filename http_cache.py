@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 128
+DEFAULT_TTL = 5  # Seconds an entry is served without asking Jenkins at all
+
+
+class CacheEntry:
+    """A cached response body with its validators and, once decoded, its parsed JSON"""
+
+    __slots__ = ('body', 'etag', 'last_modified', 'stored_at', '_parsed')
+
+    def __init__(self, body, etag=None, last_modified=None, stored_at=None):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at if stored_at is not None else time.time()
+        self._parsed = None
+
+    @property
+    def has_validators(self):
+        return bool(self.etag or self.last_modified)
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def json(self):
+        """Parsed body, decoded once per entry; treat the result as read-only"""
+        if self._parsed is None:
+            self._parsed = json.loads(self.body)
+        return self._parsed
+
+    def age(self):
+        return time.time() - self.stored_at
+
+
+class ResponseCache:
+    """In-memory LRU of responses with a TTL, optionally backed by a directory on disk
+
+    Entries younger than `ttl` are served straight from memory. Older
+    entries that carry an ETag or Last-Modified are revalidated with a
+    conditional request, and survive between runs through `directory`.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, directory=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        entry = self._load(key)
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    def is_fresh(self, entry, max_age=None):
+        max_age = self.ttl if max_age is None else max_age
+        return max_age > 0 and entry.age() < max_age
+
+    def put(self, key, entry):
+        self._remember(key, entry)
+        if entry.has_validators:
+            self._save(key, entry)
+
+    def touch(self, key, entry):
+        """Mark an entry as just revalidated (after a 304)"""
+        entry.stored_at = time.time()
+        self._remember(key, entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def _load(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('key') != key:
+            return None
+        # Entries from disk are only ever revalidated, never served as fresh
+        return CacheEntry(data['body'], data.get('etag'), data.get('last_modified'), stored_at=0)
+
+    def _save(self, key, entry):
+        if not self.directory:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'key': key, 'etag': entry.etag, 'last_modified': entry.last_modified,
+                           'body': entry.body}, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+
+def cache_key(url, params=None):
+    """Stable key for a GET of `url` with query `params`"""
+    if not params:
+        return url
+    query = '&'.join(f"{k}={v}" for k, v in sorted(params.items()))
+    return f"{url}?{query}"
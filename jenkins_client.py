@@ -0,0 +1,211 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+from http_cache import CacheEntry, cache_key
+from tracing import tracer
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = (5, 30)  # (connect, read) seconds
+
+
+class RequestStats:
+    """Latency counters for one kind of Jenkins request"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, elapsed, failed=False):
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        if failed:
+            self.errors += 1
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class JenkinsClient:
+    """Pooled, keep-alive HTTP client for the Jenkins REST API"""
+
+    def __init__(self, base_url, username, api_token, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT,
+                 cache=None, rate_limiter=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+
+        # requests is only loaded once a client is actually needed, which
+        # keeps commands that never talk to Jenkins quick to start
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        self.session.auth = (username, api_token)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def url(self, path):
+        """Resolve a path relative to the Jenkins root; absolute URLs pass through"""
+        if path.startswith(('http://', 'https://')):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def job_url(self, job_name, *parts):
+        """URL of a job (or something below it) inside the 'Environments' folder"""
+        path = f"job/Environments/job/{job_name}"
+        for part in parts:
+            path += f"/{str(part).strip('/')}"
+        return self.url(path)
+
+    def request(self, method, path, **kwargs):
+        """Send a request through the pooled session, recording its latency
+
+        With a rate limiter, the request first waits for a token from its
+        host's bucket (shared with other local processes); the wait is
+        traced as `jenkins_throttle`, not counted as request latency.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        url = self.url(path)
+        label = f"{method} {_endpoint_label(url)}"
+        if self.rate_limiter is not None:
+            waited = self.rate_limiter.acquire(urlparse(url).netloc)
+            if waited:
+                tracer.add_time('jenkins_throttle', waited)
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = self.session.request(method, url, **kwargs)
+            failed = response.status_code >= 400
+            tracer.count('http_requests', endpoint=label, status=response.status_code)
+            if not kwargs.get('stream'):
+                # Streamed bodies are counted by whoever consumes them
+                tracer.count('http_bytes', len(response.content), endpoint=label)
+            return response
+        finally:
+            self._record(label, time.perf_counter() - started, failed)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def get_json(self, path, params=None, max_age=None, **kwargs):
+        """GET a JSON document, raising for non-2xx responses
+
+        With a response cache, a copy younger than `max_age` seconds (the
+        cache TTL by default) is returned without a request, and older
+        copies are revalidated with If-None-Match/If-Modified-Since so an
+        unchanged document costs a 304 and no parsing. Pollers pass
+        `max_age=0` to always revalidate. Cached documents are shared, so
+        callers must not modify them.
+        """
+        if self.cache is None:
+            response = self.get(path, params=params, **kwargs)
+            response.raise_for_status()
+            return response.json()
+
+        url = self.url(path)
+        key = cache_key(url, params)
+        entry = self.cache.get(key)
+        if entry is not None and self.cache.is_fresh(entry, max_age):
+            self._record(f"GET {_endpoint_label(url)} (cached)", 0.0, False)
+            return entry.json()
+
+        headers = dict(kwargs.pop('headers', None) or {})
+        if entry is not None:
+            headers.update(entry.conditional_headers())
+        response = self.get(url, params=params, headers=headers, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            self.cache.touch(key, entry)
+            return entry.json()
+        response.raise_for_status()
+        entry = CacheEntry(response.text, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        self.cache.put(key, entry)
+        return entry.json()
+
+    def iter_builds(self, job_name, fields, batch_size=25, max_builds=None, start=0):
+        """Yield builds newest first, fetching `fields` for `batch_size` builds per request
+
+        Uses the `tree=builds[...]{start,end}` range syntax so a whole page of
+        builds, parameters included, costs a single round trip. Paging starts
+        `start` builds back and stops `max_builds` builds back.
+        """
+        url = self.job_url(job_name, "api/json")
+        while max_builds is None or start < max_builds:
+            end = start + batch_size
+            if max_builds is not None:
+                end = min(end, max_builds)
+            job_info = self.get_json(url, params={'tree': f"builds[{fields}]{{{start},{end}}}"})
+            builds = job_info.get('builds') or []
+            yield from builds
+            if len(builds) < end - start:
+                return
+            start = end
+
+    def progressive_text(self, job_name, build_number, start=0):
+        """Fetch console output from byte offset `start`
+
+        Returns (text, next_start, more_data); `more_data` stays True while
+        the build is still writing to its log.
+        """
+        url = self.job_url(job_name, build_number, "logText/progressiveText")
+        with tracer.timer('console_fetch'):
+            response = self.get(url, params={'start': start})
+        response.raise_for_status()
+        next_start = int(response.headers.get('X-Text-Size', start + len(response.content)))
+        more_data = response.headers.get('X-More-Data', '').lower() == 'true'
+        response.encoding = response.encoding or 'utf-8'
+        return response.text, next_start, more_data
+
+    def _record(self, label, elapsed, failed):
+        with self._stats_lock:
+            self.stats.setdefault(label, RequestStats()).record(elapsed, failed)
+
+    def latency_report(self):
+        """Return a printable summary of per-endpoint request latency"""
+        with self._stats_lock:
+            rows = sorted(self.stats.items())
+        if not rows:
+            return "No Jenkins requests made."
+        lines = [f"{'Request':<32} {'Count':>5} {'Errors':>6} {'Mean ms':>9} {'Max ms':>9}"]
+        for label, stat in rows:
+            lines.append(
+                f"{label:<32} {stat.count:>5} {stat.errors:>6} {stat.mean * 1000:>9.1f} {stat.max * 1000:>9.1f}"
+            )
+        return '\n'.join(lines)
+
+    def close(self):
+        self.session.close()
+
+
+def build_parameters(build):
+    """Return the ParametersAction values of a build JSON document as a dict"""
+    params = {}
+    for action in build.get('actions') or []:
+        if not action:
+            continue
+        if action.get('_class', 'hudson.model.ParametersAction') != 'hudson.model.ParametersAction':
+            continue
+        for param in action.get('parameters') or []:
+            if 'name' in param:
+                params[param['name']] = param.get('value')
+    return params
+
+
+def _endpoint_label(url):
+    """Collapse a URL to the Jenkins endpoint it hits, e.g. 'api/json' or 'consoleText'"""
+    path = url.split('?', 1)[0].rstrip('/')
+    segments = path.split('/')
+    if len(segments) >= 2 and segments[-2] == 'api':
+        return f"api/{segments[-1]}"
+    return segments[-1]
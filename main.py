@@ -1,89 +1,151 @@
-import requests
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
 import time
-import re
-import paramiko
-import pymysql
-import subprocess
-import random
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from batch import TriggerLimiter, dedupe_by_env_name, expand_param_paths, format_summary, trigger_limit
+import mysql_session
+from coordination import RateLimiter, TriggerLocks
+import endpoint_probe
+import schema_snapshot
+from build_waiter import (BUILD_STATUS_TREE, MAX_CONSECUTIVE_ERRORS, PollSchedule, WaitTimeout, wait_for_build,
+                          wait_for_queue)
+from extractor import ConsoleExtractor, extract_from_text
+from fingerprint import (MATCH_ENV, MATCH_MODES, MATCH_SUPERSET, describe_differences,
+                         param_differences, param_fingerprint)
+from http_cache import ResponseCache
+from jenkins_client import JenkinsClient, build_parameters
+from mysql_session import MySQLSession
+from param_profiles import ProfileError, ProfileLoader
+from ssh_forward import SSHForwarder
+from tracing import tracer
 
 JENKINS_URL = 'https://jenkins.cloudways.services/'  # Replace with actual Jenkins URL
 JOB_NAME = 'test'  # Job is inside 'environment' folder
 USERNAME = 'test'
 API_TOKEN = 'Test'
+USER_PARAMS_PATH = 'userParams.txt'
+PROFILE_CACHE_DIR = '.profile_cache'  # Compiled parameter profiles, reused while their files are unchanged
+JENKINS_POOL_SIZE = 10  # Keep-alive connections kept open to Jenkins
+JENKINS_TIMEOUT = (5, 30)  # (connect, read) timeout in seconds for every Jenkins call
+JENKINS_CACHE_TTL = 5  # Seconds a Jenkins JSON response is reused without revalidating it
+JENKINS_CACHE_DIR = '.jenkins_cache'  # Responses with ETag/Last-Modified kept between runs
+JENKINS_RATE_LIMIT = 10  # Requests per second to the Jenkins host, shared by all local processes (0 = no limit)
+JENKINS_RATE_BURST = 20  # Requests allowed at once after an idle spell
+COORDINATION_DIR = os.path.join(tempfile.gettempdir(), 'testauto')  # Lock files shared by local processes
+TRIGGER_CLAIM_TTL = 30 * 60  # Seconds a build triggered by another process is followed instead of re-triggered
+BUILD_LOOKUP_BATCH_SIZE = 25  # Builds fetched per tree= request when looking up ENV_NAME
+BUILD_LOOKUP_MAX_BUILDS = 500  # How far back in build history to look
+BUILD_LOOKUP_TREE = 'number,result,building,actions[_class,parameters[name,value]]'
+CONSOLE_CHUNK_SIZE = 256 * 1024  # Bytes read per chunk when streaming consoleText
+CONSOLE_POLL_INTERVAL = 10  # Longest gap between progressive console polls while a build runs
+QUEUE_WAIT_TIMEOUT = 15 * 60  # Seconds a triggered build may sit in the queue
+BUILD_WAIT_TIMEOUT = 90 * 60  # Seconds a build may run before we stop waiting for it
+MYSQL_FIELDS = ('mysql_ips', 'mysql_user', 'mysql_pass')
+BUILD_INDEX_PATH = '.build_index.sqlite3'  # Local cache of builds, their parameters and extracted info
+BUILD_INDEX_MAX_AGE = 60  # Seconds a build index refresh stays fresh enough to skip Jenkins
+BUILD_MATCH_MODE = MATCH_SUPERSET  # How an existing build's parameters must match the request to be reused
+MYSQL_PROBE_WORKERS = 4  # MySQL hosts probed at the same time
+SCHEMA_SNAPSHOT_DIR = '.schema_snapshots'  # Last seen schema of each ENV_NAME's database, for diffs
+EXPORT_DIR = 'exports'  # Where `export` writes <table>.<format>.gz files
+EXPORT_CHUNK_SIZE = 10000  # Rows fetched per round trip while exporting
+SEED_METHOD = 'executemany'  # or 'load-data' (LOAD DATA LOCAL INFILE; the server must allow local_infile)
+ANALYZE_BUILDS = 500  # Builds `analyze` looks back over by default
+ANALYZE_FETCH_WORKERS = 8  # Console logs downloaded at once by `analyze`
+ANALYZE_PARSE_WORKERS = os.cpu_count() or 2  # Processes parsing console logs in `analyze`
+CONSOLE_CACHE_DIR = '.console_cache'  # Finished builds' console logs (gzip), downloaded once for `analyze`
+BATCH_MAX_TRIGGERS = 4  # Builds a batch may have triggered and queued at once
+BATCH_MAX_PARALLEL = 20  # Environments a batch works on at once
+ENDPOINT_PROBE_WORKERS = 8  # Endpoint health probes run at the same time
+ENDPOINT_PROBE_TIMEOUT = 5  # Seconds each endpoint health probe may take
+ENDPOINT_PROBE_VERIFY_TLS = True  # Set False for environments with self-signed certificates
+BROKER_HOST = '127.0.0.1'  # `serve` listens here (localhost only: answers include credentials)
+BROKER_PORT = 8765
+BROKER_SOCKET_PATH = None  # e.g. /tmp/testauto.sock to serve on a Unix socket instead
+BROKER_TOKEN_PATH = os.path.join(os.path.expanduser('~'), '.testauto_broker_token')  # Bearer token TCP clients send
+BROKER_TTL = 60  # Seconds `serve` answers an ENV_NAME from memory before looking again
+BROKER_REFRESH_INTERVAL = 30  # Seconds between background refreshes of recently asked-for envs
+BROKER_TRACE_SPANS = 1000  # Most recent spans `serve` keeps for its exit trace (phase totals cover everything)
+TRACE_OUTPUT_PATH = 'run_trace.json'  # JSON phase trace written at the end of each run
+PROMETHEUS_TEXTFILE_PATH = None  # e.g. /var/lib/node_exporter/textfile/testauto.prom
 
 # SSH Configuration for MySQL connection
+BASTION_WARMUP = True  # Connect to the bastion while the build runs instead of after it
 SSH_HOST = 'test'
-SSH_PORT = test
+SSH_PORT = 22
 SSH_USERNAME = 'test'
 SSH_KEY_PATH = 'test'
 
-def read_user_params():
-    """Read parameters from userParams.txt file"""
-    params = {}
+_cassette = None  # Set by --record/--replay
+
+_jenkins_client = None
+_jenkins_client_lock = threading.Lock()
+
+def get_jenkins():
+    """Return the shared, pooled Jenkins client"""
+    global _jenkins_client
+    with _jenkins_client_lock:
+        if _jenkins_client is None:
+            cache = ResponseCache(ttl=JENKINS_CACHE_TTL, directory=JENKINS_CACHE_DIR)
+            limiter = RateLimiter(COORDINATION_DIR, JENKINS_RATE_LIMIT, JENKINS_RATE_BURST)
+            _jenkins_client = JenkinsClient(JENKINS_URL, USERNAME, API_TOKEN, pool_size=JENKINS_POOL_SIZE,
+                                            timeout=JENKINS_TIMEOUT, cache=cache, rate_limiter=limiter)
+            if _cassette is not None:
+                _cassette.attach(_jenkins_client.session)
+        return _jenkins_client
+
+_trigger_locks = None
+_trigger_locks_lock = threading.Lock()
+
+def get_trigger_locks():
+    """Return the per-ENV_NAME trigger locks shared with other local processes"""
+    global _trigger_locks
+    with _trigger_locks_lock:
+        if _trigger_locks is None:
+            _trigger_locks = TriggerLocks(COORDINATION_DIR, claim_ttl=TRIGGER_CLAIM_TTL)
+        return _trigger_locks
+
+_profile_loader = None
+_profile_loader_lock = threading.Lock()
+
+def get_profile_loader():
+    """Return the shared parameter-profile loader; each profile file is parsed at most once per run"""
+    global _profile_loader
+    with _profile_loader_lock:
+        if _profile_loader is None:
+            _profile_loader = ProfileLoader(cache_dir=PROFILE_CACHE_DIR)
+        return _profile_loader
+
+def read_user_params(path=USER_PARAMS_PATH):
+    """Read parameters from a parameter profile (userParams.txt-style or JSON, optionally extending a base)"""
     try:
-        with open('userParams.txt', 'r') as f:
-            lines = [line.strip() for line in f.readlines()]
-        
-        i = 0
-        while i < len(lines):
-            line = lines[i].strip()
-            
-            # Skip empty lines and notes
-            if not line or line.startswith('Note:'):
-                i += 1
-                continue
-            
-            # Check if this line looks like a parameter name (all caps with underscores)
-            if re.match(r'^[A-Z_]+$', line):
-                param_name = line
-                i += 1
-                
-                # Skip description lines and find the actual value
-                while i < len(lines):
-                    current_line = lines[i].strip()
-                    
-                    # If we hit another parameter name, break
-                    if re.match(r'^[A-Z_]+$', current_line):
-                        break
-                    
-                    # Skip notes and empty lines
-                    if not current_line or current_line.startswith('Note:'):
-                        i += 1
-                        continue
-                    
-                    # If it's not a description (doesn't contain "name" or "Branch"), it's likely a value
-                    if not any(word in current_line.lower() for word in ['name', 'branch', 'endpoint', 'service']):
-                        param_value = current_line
-                        if param_value:  # Only add non-empty values
-                            params[param_name] = param_value
-                        break
-                    
-                    i += 1
-                    
-            else:
-                i += 1
-        
-        # Validate ENV_NAME format if present
-        if 'ENV_NAME' in params:
-            env_name = params['ENV_NAME']
-            if not re.match(r'^[a-z]{1,3}$', env_name):
-                print(f"Warning: ENV_NAME '{env_name}' should be max 3 lowercase letters")
-        
-        return params
-    
-    except FileNotFoundError:
-        print("Error: userParams.txt file not found")
+        profile = get_profile_loader().load(path)
+    except FileNotFoundError as e:
+        print(f"Error: {e.filename} file not found")
+        return {}
+    except ProfileError as e:
+        print(f"Error: invalid parameters in {e}")
         return {}
     except Exception as e:
-        print(f"Error reading userParams.txt: {e}")
+        print(f"Error reading {path}: {e}")
         return {}
+    for warning in profile.warnings:
+        print(f"Warning: {warning}")
+    return profile.params
 
 def test_jenkins_connection():
     """Test if Jenkins server is reachable"""
+    import requests
+    
     try:
         print("Testing Jenkins connection...")
-        url = f"{JENKINS_URL}/api/json"
-        response = requests.get(url, auth=(USERNAME, API_TOKEN), timeout=10)
+        response = get_jenkins().get("api/json", timeout=10)
         
         if response.status_code == 200:
             print("✓ Jenkins connection successful")
@@ -104,22 +166,21 @@ def test_jenkins_connection():
 
 def check_job_exists():
     """Check if the Jenkins job exists and get its details"""
+    import requests
+    
     try:
         print(f"Checking if job '{JOB_NAME}' exists...")
-        url = f"{JENKINS_URL}/job/Environments/job/{JOB_NAME}/api/json"
-        response = requests.get(url, auth=(USERNAME, API_TOKEN), timeout=10)
+        jenkins = get_jenkins()
+        jenkins.get_json(jenkins.job_url(JOB_NAME, "api/json"), params={'tree': 'name'})
+        print(f"✓ Job '{JOB_NAME}' found")
+        return True
         
-        if response.status_code == 200:
-            job_info = response.json()
-            print(f"✓ Job '{JOB_NAME}' found")
-            return True
-        elif response.status_code == 404:
+    except requests.exceptions.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
             print(f"✗ Job '{JOB_NAME}' not found (404)")
-            return False
         else:
-            print(f"✗ Error checking job: {response.status_code}")
-            return False
-            
+            print(f"✗ Error checking job: {e}")
+        return False
     except Exception as e:
         print(f"✗ Error checking job: {e}")
         return False
@@ -128,15 +189,17 @@ def trigger_job(params):
     """Trigger Jenkins job with parameters and return build number"""
     try:
         # For parameterized builds, use /buildWithParameters
+        jenkins = get_jenkins()
         if params:
-            build_url = f"{JENKINS_URL}/job/Environments/job/{JOB_NAME}/buildWithParameters"
+            build_url = jenkins.job_url(JOB_NAME, "buildWithParameters")
             print(f"Triggering parameterized build: {build_url}")
         else:
-            build_url = f"{JENKINS_URL}/job/Environments/job/{JOB_NAME}/build"
+            build_url = jenkins.job_url(JOB_NAME, "build")
             print(f"Triggering simple build: {build_url}")
         
         # Jenkins expects parameters in a specific format for POST requests
-        response = requests.post(build_url, auth=(USERNAME, API_TOKEN), data=params, timeout=30)
+        with tracer.span('trigger'):
+            response = jenkins.post(build_url, data=params)
         
         if response.status_code == 201:
             print("✓ Job triggered successfully.")
@@ -166,275 +229,439 @@ def get_build_number_from_queue(queue_location):
     """Get build number from Jenkins queue location"""
     try:
         print("Waiting for build to start from queue...")
-        max_attempts = 30  # Wait up to 30 seconds for build to start
-        
-        for attempt in range(max_attempts):
-            try:
-                # Get queue item details
-                queue_response = requests.get(f"{queue_location}api/json", auth=(USERNAME, API_TOKEN), timeout=10)
-                
-                if queue_response.status_code == 200:
-                    queue_data = queue_response.json()
-                    
-                    # Check if build has started (executable field will contain build info)
-                    executable = queue_data.get('executable')
-                    if executable:
-                        build_number = executable.get('number')
-                        if build_number:
-                            print(f"✓ Build started with number: #{build_number}")
-                            return build_number
-                    
-                    # If still in queue, wait a bit
-                    print(f"  Attempt {attempt + 1}/{max_attempts}: Build still in queue...")
-                    time.sleep(1)
-                else:
-                    print(f"  Warning: Could not check queue status: {queue_response.status_code}")
-                    time.sleep(1)
-                    
-            except Exception as e:
-                print(f"  Error checking queue: {e}")
-                time.sleep(1)
+        with tracer.span('queue_wait'):
+            build_number = wait_for_queue(get_jenkins(), queue_location, QUEUE_WAIT_TIMEOUT)
+        if build_number:
+            print(f"✓ Build started with number: #{build_number}")
+        return build_number
         
+    except WaitTimeout:
         print("⚠️  Timeout waiting for build to start from queue, falling back to last build method")
         return get_last_build_number()
-        
     except Exception as e:
         print(f"✗ Error getting build number from queue: {e}")
         return get_last_build_number()
 
 def get_last_build_number():
-    url = f"{JENKINS_URL}/job/Environments/job/{JOB_NAME}/api/json"
-    response = requests.get(url, auth=(USERNAME, API_TOKEN))
-    return response.json()['lastBuild']['number']
+    jenkins = get_jenkins()
+    job_info = jenkins.get_json(jenkins.job_url(JOB_NAME, "api/json"), params={'tree': 'lastBuild[number]'},
+                                max_age=0)
+    return job_info['lastBuild']['number']
 
-def wait_for_job_completion(build_number):
-    url = f"{JENKINS_URL}/job/Environments/job/{JOB_NAME}/{build_number}/api/json"
-    while True:
-        response = requests.get(url, auth=(USERNAME, API_TOKEN)).json()
-        if not response['building']:
-            print("Job completed.")
-            return
-        print("Waiting for job to complete...")
-        time.sleep(10)
+def get_build_status(build_number):
+    """Current building/result/timing of a build, always revalidated with Jenkins"""
+    jenkins = get_jenkins()
+    return jenkins.get_json(jenkins.job_url(JOB_NAME, build_number, "api/json"),
+                            params={'tree': BUILD_STATUS_TREE}, max_age=0)
+
+@tracer.traced('build_wait')
+def wait_for_job_completion(build_number, timeout=None):
+    """Wait for a build to finish, polling densely only near its expected finish
+
+    Returns the build result, or None if the build did not finish in time.
+    """
+    jenkins = get_jenkins()
+    url = jenkins.job_url(JOB_NAME, build_number, "api/json")
+    
+    def report(status, schedule):
+        print(f"Waiting for job to complete... ({schedule.describe()})")
+    
+    try:
+        status = wait_for_build(jenkins, url, timeout or BUILD_WAIT_TIMEOUT, on_poll=report)
+    except WaitTimeout as e:
+        print(f"✗ Timed out waiting for build #{build_number}: {e}")
+        return None
+    except Exception as e:
+        print(f"✗ Error waiting for build #{build_number}: {e}")
+        return None
+    print(f"Job completed: {status.get('result')}")
+    return status.get('result')
 
 def fetch_console_output(build_number):
-    url = f"{JENKINS_URL}/job/Environments/job/{JOB_NAME}/{build_number}/consoleText"
-    response = requests.get(url, auth=(USERNAME, API_TOKEN))
+    jenkins = get_jenkins()
+    response = jenkins.get(jenkins.job_url(JOB_NAME, build_number, "consoleText"))
     return response.text
 
 def extract_info(console_output):
-    # Use regex to extract the values
-    patterns = {
-        "elk": r"ELK EndPoint:\s*(\S+)",
-        "scannerapi": r"Scannerapi EndPoint:\s*(\S+)",
-        "alb": r"ALB EndPoint:\s*(\S+)",
-        "cnc": r"cnc EndPoint:\s*(\S+)",
-        "api": r"api-endpoint:\s*(\S+)",
-        "private_ips": r"Instance PrivateIP:\s*((?:\d{1,3}\.){3}\d{1,3}(?:\n\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})?)",
-        "mysql_user": r"MySQL User:\s*(\S+)",
-        "mysql_pass": r"MySQL Pass:\s*(\S+)",
-        "pgsql_host": r"pgSQL private HOST:\s*(\S+)",
-        "pgsql_user": r"pgSQL User:\s*(\S+)",
-        "pgsql_pass": r"pgSQL Pass:\s*(\S+)"
-    }
-
-    extracted = {}
-    for key, pattern in patterns.items():
-        match = re.search(pattern, console_output)
-        if match:
-            extracted[key] = match.group(1).strip()
-    
-    # Extract MySQL IPs separately (there can be multiple)
-    mysql_ips = []
-    lines = console_output.split('\n')
-    
-    for i, line in enumerate(lines):
-        line = line.strip()
-        # Look for MySQL private HOST followed by IP addresses
-        if 'MySQL private HOST:' in line:
-            # Check next few lines for IP addresses
-            for j in range(i+1, min(i+4, len(lines))):
-                next_line = lines[j].strip()
-                # Check if it's an IP address
-                ip_pattern = r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b'
-                ips = re.findall(ip_pattern, next_line)
-                mysql_ips.extend(ips)
-    
-    # Remove duplicates and add to extracted info
-    mysql_ips = list(set(mysql_ips))
-    if mysql_ips:
-        extracted['mysql_ips'] = mysql_ips
-    
-    return extracted
-
-def test_mysql_connection(mysql_host, mysql_user, mysql_pass):
-    """Test MySQL connection to a specific host"""
-    local_port = random.randint(3308, 3320)
-    tunnel_process = None
+    """Extract endpoints and credentials from a complete console log"""
+    return extract_from_text(console_output)
+
+@tracer.traced('console_fetch')
+def stream_console_info(build_number):
+    """Stream consoleText through the extractor, stopping the download once every field is found"""
+    jenkins = get_jenkins()
+    extractor = ConsoleExtractor()
+    response = jenkins.get(jenkins.job_url(JOB_NAME, build_number, "consoleText"), stream=True)
+    try:
+        if response.status_code != 200:
+            print(f"✗ Failed to fetch console output for build #{build_number}: {response.status_code}")
+            return None
+        response.encoding = response.encoding or 'utf-8'
+        for chunk in response.iter_content(chunk_size=CONSOLE_CHUNK_SIZE, decode_unicode=True):
+            tracer.count('http_bytes', len(chunk), endpoint='GET consoleText')
+            with tracer.timer('extraction'):
+                if extractor.feed(chunk):
+                    break
+        extractor.close()
+        return extractor.result()
+    finally:
+        response.close()
+
+@tracer.traced('build_wait')
+def tail_console_info(build_number, on_mysql_ready=None):
+    """Follow a running build's console through progressiveText, extracting as the log grows
+
+    Only bytes past the last offset are downloaded on each poll.
+    `on_mysql_ready(info)` is called as soon as the MySQL endpoints and
+    credentials have appeared in the log, while the build is still running.
+    Failed polls are retried with backoff, like wait_for_build does.
+    Returns the extracted info once the build has finished, or None if it
+    did not finish in time or Jenkins kept failing.
+    """
+    jenkins = get_jenkins()
+    extractor = ConsoleExtractor()
+    start = 0
+    notified = False
+    errors = 0
+    deadline = time.monotonic() + BUILD_WAIT_TIMEOUT
+    schedule = PollSchedule(max_interval=CONSOLE_POLL_INTERVAL)
+    try:
+        status = get_build_status(build_number)
+        schedule.update(status.get('estimatedDuration'), status.get('timestamp'))
+    except Exception as e:
+        print(f"  Error checking build status: {e}")
+    
+    while True:
+        try:
+            text, start, more_data = jenkins.progressive_text(JOB_NAME, build_number, start)
+            errors = 0
+        except Exception as e:
+            errors += 1
+            if errors >= MAX_CONSECUTIVE_ERRORS:
+                print(f"✗ Could not follow the console of build #{build_number}: {e}")
+                return None
+            print(f"  Error fetching console ({errors}/{MAX_CONSECUTIVE_ERRORS}): {e}")
+            text, more_data = None, True
+        if text:
+            with tracer.timer('extraction'):
+                extractor.feed(text)
+        
+        if not notified and on_mysql_ready and extractor.found(*MYSQL_FIELDS):
+            notified = True
+            print(f"✓ MySQL endpoints found in console of build #{build_number} while it is still running")
+            on_mysql_ready(extractor.result())
+        
+        if not more_data:
+            print("Job completed.")
+            break
+        
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            print(f"✗ Timed out waiting for build #{build_number} after {BUILD_WAIT_TIMEOUT}s")
+            return None
+        
+        if extractor.done:
+            # Everything we need is already extracted; stop downloading the log
+            # and only watch the build status from here on
+            if wait_for_job_completion(build_number, timeout=remaining) is None:
+                return None
+            break
+        
+        if errors:
+            interval = min(CONSOLE_POLL_INTERVAL, schedule.min_interval * 2 ** (errors - 1))
+        else:
+            print(f"Waiting for job to complete... ({schedule.describe()}, console at {start} bytes)")
+            interval = schedule.next_interval()
+        time.sleep(min(interval, remaining))
+    
+    extractor.close()
+    return extractor.result()
+
+_ssh_forwarder = None
+_ssh_forwarder_lock = threading.Lock()
+
+def get_ssh_forwarder():
+    """Return the shared SSH forwarder; every MySQL tunnel runs over its one bastion connection"""
+    global _ssh_forwarder
+    with _ssh_forwarder_lock:
+        if _ssh_forwarder is None:
+            _ssh_forwarder = SSHForwarder(SSH_HOST, SSH_PORT, SSH_USERNAME, SSH_KEY_PATH)
+            if _cassette is not None:
+                _ssh_forwarder = _cassette.forwarder(_ssh_forwarder)
+        return _ssh_forwarder
+
+def start_bastion_warmup():
+    """Open and authenticate the bastion SSH transport in the background
+
+    The bastion connection does not depend on the build, so it is set up
+    while Jenkins lookups, queueing and the build run; MySQL forwards then
+    start on an already-authenticated transport. Forwards requested before
+    the warm-up finishes simply wait for it instead of connecting again.
+    """
+    forwarder = get_ssh_forwarder()
+    if forwarder.connected:
+        return None
+    
+    def warm_up():
+        started = time.perf_counter()
+        try:
+            forwarder.connect()
+            print(f"✓ Bastion {SSH_HOST} connected in the background ({time.perf_counter() - started:.1f}s)")
+        except Exception as e:
+            print(f"⚠️  Bastion warm-up failed ({e}); will retry when connecting to MySQL")
+    
+    thread = threading.Thread(target=warm_up, daemon=True, name='bastion-warmup')
+    thread.start()
+    return thread
+
+def probe_mysql_host(mysql_host, mysql_user, mysql_pass, cancel_event=None):
+    """Open a session to one MySQL host and check it for cloudways_new
+
+    Returns the open MySQLSession, switched to cloudways_new, when the
+    database is there; otherwise closes everything and returns None.
+    Setting `cancel_event` aborts the probe and tears its tunnel down.
+    """
+    session = None
+    cancel_event = cancel_event or threading.Event()
     
     try:
+        if cancel_event.is_set():
+            return None
         print(f"Testing MySQL connection to {mysql_host}...")
         
-        # Kill any existing tunnels
-        subprocess.run(['pkill', '-f', f'{local_port}:{mysql_host}:3306'], 
-                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        time.sleep(1)
-        
-        # Create SSH tunnel
-        tunnel_cmd = [
-            'ssh', '-i', SSH_KEY_PATH,
-            '-L', f'{local_port}:{mysql_host}:3306',
-            '-N', f'{SSH_USERNAME}@{SSH_HOST}',
-            '-p', str(SSH_PORT),
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'ConnectTimeout=10'
-        ]
-        
-        print(f"  Creating SSH tunnel: localhost:{local_port} -> {mysql_host}:3306")
-        
-        tunnel_process = subprocess.Popen(
-            tunnel_cmd,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.PIPE
-        )
-        
-        time.sleep(5)  # Wait for tunnel
-        
-        # Check if tunnel is running
-        if tunnel_process.poll() is not None:
-            stderr = tunnel_process.stderr.read().decode('utf-8')
-            print(f"  ✗ SSH tunnel failed: {stderr}")
-            return None, None
-        
-        print(f"  SSH tunnel established on port {local_port}")
-        
-        # Test MySQL connection
-        connection = pymysql.connect(
-            host='127.0.0.1',
-            port=local_port,
-            user=mysql_user,
-            password=mysql_pass,
-            connect_timeout=10,
-            charset='utf8mb4'
-        )
-        
+        # Forward a local port over the shared bastion connection; this returns
+        # as soon as the bastion has opened a channel to the MySQL host
+        session = MySQLSession.open(get_ssh_forwarder(), mysql_host, mysql_user, mysql_pass)
+        print(f"  SSH tunnel established: localhost:{session.local_port} -> {mysql_host}:3306")
         print(f"✓ MySQL connection to {mysql_host} successful")
         
-        # Check for cloudways_new database
-        cursor = connection.cursor()
-        cursor.execute("SHOW DATABASES")
-        databases = [db[0] for db in cursor.fetchall()]
+        if cancel_event.is_set():
+            print(f"  Probe of {mysql_host} cancelled")
+            session.close()
+            return None
         
+        # Databases and cloudways_new's tables (with row estimates and sizes) in one query
+        session.introspect('cloudways_new')
+        databases = session.databases()
         print(f"  Databases: {databases}")
         
         # Look for cloudways_new database
         if 'cloudways_new' in databases:
             print(f"  ✓ Found 'cloudways_new' database on {mysql_host}")
             
-            # Connect to the cloudways_new database and show tables
-            cursor.execute("USE cloudways_new")
-            cursor.execute("SHOW TABLES")
-            tables = [table[0] for table in cursor.fetchall()]
-            print(f"  Tables in cloudways_new database: {tables}")
-            
-            connection.close()
-            tunnel_process.terminate()
-            return mysql_host, 'cloudways_new'
+            # Switch to the cloudways_new database and show tables
+            session.use('cloudways_new')
+            print(f"  Tables in cloudways_new database: {session.tables()}")
+            return session
         
         print(f"  ✗ 'cloudways_new' database not found on {mysql_host}")
-        connection.close()
-        tunnel_process.terminate()
-        return None, None
+        session.close()
+        return None
         
     except Exception as e:
         print(f"✗ MySQL connection to {mysql_host} failed: {e}")
-        if tunnel_process:
-            tunnel_process.terminate()
+        if session:
+            session.close()
+        return None
+
+def test_mysql_connection(mysql_host, mysql_user, mysql_pass, cancel_event=None):
+    """Test MySQL connection to a specific host"""
+    session = probe_mysql_host(mysql_host, mysql_user, mysql_pass, cancel_event)
+    if session is None:
         return None, None
+    with session:
+        return session.mysql_host, session.database
+
+def report_schema_changes(session, env_name):
+    """Snapshot the session's database schema and print what changed since the last run for env_name
 
-def connect_and_work_with_database(mysql_host, database, mysql_user, mysql_pass):
-    """Connect to MySQL database and show basic information"""
-    local_port = random.randint(3308, 3320)
-    tunnel_process = None
+    Returns True when there was no earlier snapshot to compare with.
+    """
+    path = schema_snapshot.snapshot_path(env_name, SCHEMA_SNAPSHOT_DIR)
+    previous = schema_snapshot.load_snapshot(path)
+    snapshot = session.snapshot(env_name)
+    if previous is None:
+        print(f"\nSchema of '{session.database}' ({len(snapshot['tables'])} tables, first snapshot):")
+        for line in schema_snapshot.summarize(snapshot):
+            print(line)
+    else:
+        changes = schema_snapshot.diff_snapshots(previous, snapshot)
+        taken = time.strftime('%Y-%m-%d %H:%M', time.localtime(previous['taken_at']))
+        if changes:
+            print(f"\nSchema changes in '{session.database}' since {taken}:")
+            for change in changes:
+                print(f"  {change}")
+        else:
+            print(f"\n✓ No schema changes in '{session.database}' since {taken} ({len(snapshot['tables'])} tables)")
+    try:
+        schema_snapshot.save_snapshot(path, snapshot)
+    except OSError as e:
+        print(f"⚠️  Could not save schema snapshot to {path}: {e}")
+    return previous is None
+
+def connect_and_work_with_database(mysql_host, database, mysql_user, mysql_pass, session=None, env_name=None):
+    """Connect to MySQL database and show basic information
+
+    Pass the `session` returned by the probe to carry on over its tunnel
+    and connection (and its already-fetched table list) instead of opening
+    new ones; a session passed in is left open for the caller. With an
+    `env_name`, only the changes since that environment's last schema
+    snapshot are printed instead of every table.
+    """
+    owns_session = session is None
     
     try:
-        print(f"\nConnecting to MySQL database '{database}' on {mysql_host}...")
-        
-        # Kill any existing tunnels
-        subprocess.run(['pkill', '-f', f'{local_port}:{mysql_host}:3306'], 
-                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        time.sleep(1)
-        
-        # Create SSH tunnel
-        tunnel_cmd = [
-            'ssh', '-i', SSH_KEY_PATH,
-            '-L', f'{local_port}:{mysql_host}:3306',
-            '-N', f'{SSH_USERNAME}@{SSH_HOST}',
-            '-p', str(SSH_PORT),
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'ConnectTimeout=10'
-        ]
-        
-        tunnel_process = subprocess.Popen(
-            tunnel_cmd,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.PIPE
-        )
-        
-        time.sleep(5)  # Wait for tunnel
-        
-        # Connect to MySQL
-        connection = pymysql.connect(
-            host='127.0.0.1',
-            port=local_port,
-            user=mysql_user,
-            password=mysql_pass,
-            database=database,
-            connect_timeout=10,
-            charset='utf8mb4'
-        )
+        if owns_session:
+            print(f"\nConnecting to MySQL database '{database}' on {mysql_host}...")
+            session = MySQLSession.open(get_ssh_forwarder(), mysql_host, mysql_user, mysql_pass,
+                                        database=database)
+        else:
+            session.use(database)
         
         print(f"✓ Connected to MySQL database '{database}' on {mysql_host}")
         
         # Show database info
-        cursor = connection.cursor()
-        cursor.execute("SHOW TABLES")
-        tables = [table[0] for table in cursor.fetchall()]
-        print(f"\nTables in '{database}' database:")
-        for table in tables:
-            print(f"  - {table}")
+        tables = session.tables()
+        first_snapshot = True
+        if env_name:
+            first_snapshot = report_schema_changes(session, env_name)
+        else:
+            print(f"\nTables in '{database}' database:")
+            for table in tables:
+                print(f"  - {table}")
         
         # Check if users table exists
         if 'users' not in tables:
             print("✗ 'users' table not found in database")
-            connection.close()
-            tunnel_process.terminate()
             return False
         
         print(f"\n✓ Found 'users' table")
         
-        # Show users table structure
-        cursor.execute("DESCRIBE users")
-        columns = cursor.fetchall()
-        print(f"\nUsers table structure:")
-        for col in columns:
-            print(f"  {col[0]} ({col[1]})")
+        # Show users table structure (columns of every table come back in one query)
+        if first_snapshot:
+            print(f"\nUsers table structure:")
+            for col in session.columns().get('users', []):
+                print(f"  {col[0]} ({col[1]})")
         
         print(f"\n✓ Database connection successful! Ready for operations.")
-        
-        connection.close()
-        tunnel_process.terminate()
         print(f"\n✓ Database connection completed successfully!")
         return True
         
     except Exception as e:
         print(f"✗ Error working with database: {e}")
-        if tunnel_process:
-            tunnel_process.terminate()
         return False
+    finally:
+        if owns_session and session:
+            session.close()
 
-def connect_to_mysql_database(mysql_info):
-    """Connect to MySQL database using extracted information"""
+def probe_mysql_hosts(mysql_ips, mysql_user, mysql_pass):
+    """Probe MySQL hosts concurrently and return a session to the first with cloudways_new
+
+    Returns as soon as a host wins, without waiting for the other probes:
+    queued ones are cancelled, running ones stop at their next check of the
+    cancel event, and any session they still open is closed when they
+    finish. Returns None when no host has the database.
+    """
+    cancel_event = threading.Event()
+    started = time.perf_counter()
+    timings = {}
+    winner = None
+    
+    def probe(mysql_ip):
+        probe_started = time.perf_counter()
+        try:
+            return probe_mysql_host(mysql_ip, mysql_user, mysql_pass, cancel_event)
+        finally:
+            timings[mysql_ip] = time.perf_counter() - probe_started
+    
+    def close_late(future):
+        if not future.cancelled() and future.exception() is None and future.result() is not None:
+            future.result().close()
+    
+    workers = max(1, min(MYSQL_PROBE_WORKERS, len(mysql_ips)))
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mysql-probe')
+    try:
+        futures = {pool.submit(probe, mysql_ip): mysql_ip for mysql_ip in mysql_ips}
+        for future in as_completed(futures):
+            winner = future.result()
+            if winner is not None:
+                cancel_event.set()
+                for other in futures:
+                    if other is not future:
+                        other.cancel()
+                        other.add_done_callback(close_late)
+                break
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    
+    print(f"\nMySQL probe timings (total {time.perf_counter() - started:.1f}s):")
+    for mysql_ip in mysql_ips:
+        if mysql_ip in timings:
+            marker = "✓" if winner and mysql_ip == winner.mysql_host else " "
+            print(f"  {marker} {mysql_ip}: {timings[mysql_ip]:.1f}s")
+        else:
+            print(f"    {mysql_ip}: abandoned")
+    return winner
+
+@tracer.traced('seed')
+def seed_database(session, fixture_paths, method=None):
+    """Load fixture files into the session's database and report rows/sec per file
+
+    executemany loads reuse the session's own connection; LOAD DATA needs a
+    connection opened with local_infile, so a second one is opened over the
+    same forward. Returns True when every file loaded.
+    """
+    import fixture_seed
+    
+    method = method or SEED_METHOD
+    files = fixture_seed.expand_fixture_paths(fixture_paths)
+    if not files:
+        print("✗ No fixture files found.")
+        return False
+    print(f"\nSeeding {len(files)} fixture file(s) into '{session.database}' ({method})...")
+    connection = session.open_connection(local_infile=True) if method == 'load-data' else session.connection
+    started = time.perf_counter()
+    try:
+        results = fixture_seed.seed_fixtures(connection, files, method=method, tables=session.tables())
+    except Exception as e:
+        print(f"✗ Seeding failed: {e}")
+        return False
+    finally:
+        if connection is not session.connection:
+            connection.close()
+    total_rows = 0
+    for result in results:
+        total_rows += result['rows']
+        print(f"  ✓ {result['table']}: {result['rows']} rows in {result['seconds']:.1f}s "
+              f"({result['rows_per_s']:.0f} rows/s, batch {result['batch_size']}) from {result['path']}")
+    elapsed = time.perf_counter() - started
+    print(f"✓ Seeded {total_rows} rows in {elapsed:.1f}s ({total_rows / elapsed if elapsed else 0:.0f} rows/s)")
+    return True
+
+def seed_environment(mysql_info, fixture_paths, method=None):
+    """Find the cloudways_new host among mysql_info's IPs and seed fixtures into it"""
+    mysql_ips = mysql_info.get('mysql_ips', [])
+    mysql_user = mysql_info.get('mysql_user')
+    mysql_pass = mysql_info.get('mysql_pass')
+    if not mysql_ips or not mysql_user or not mysql_pass:
+        print("✗ Missing MySQL connection details")
+        return False
+    session = probe_mysql_hosts(mysql_ips, mysql_user, mysql_pass)
+    if session is None:
+        print("✗ Could not find MySQL server with 'cloudways_new' database")
+        return False
+    with session:
+        return seed_database(session, fixture_paths, method=method)
+
+@tracer.traced('mysql')
+def connect_to_mysql_database(mysql_info, env_name=None, fixtures=None, keep_session=False):
+    """Connect to MySQL database using extracted information
+
+    With `fixtures` (fixture files or directories), they are seeded over
+    the same connection as soon as the cloudways_new host is found. With
+    `keep_session` the open MySQLSession is returned instead of True and
+    the caller closes it.
+    """
     try:
         print("\n" + "="*60)
         print("CONNECTING TO MYSQL DATABASE")
@@ -451,19 +678,26 @@ def connect_to_mysql_database(mysql_info):
         print(f"MySQL IPs to test: {mysql_ips}")
         print(f"MySQL User: {mysql_user}")
         
-        # Test each MySQL IP to find the one with cloudways_new database
-        for mysql_ip in mysql_ips:
-            host, database = test_mysql_connection(mysql_ip, mysql_user, mysql_pass)
-            if host and database:
+        # Probe every MySQL IP at once; the first one with cloudways_new wins
+        session = probe_mysql_hosts(mysql_ips, mysql_user, mysql_pass)
+        if session:
+            with contextlib.ExitStack() as cleanup:
+                cleanup.callback(session.close)
                 print(f"\n✓ Successfully found MySQL server with 'cloudways_new' database!")
-                print(f"  Host: {host}")
-                print(f"  Database: {database}")
+                print(f"  Host: {session.mysql_host}")
+                print(f"  Database: {session.database}")
                 
-                # Show database connection details
-                print(f"\nConnecting to database to verify connection...")
-                connect_and_work_with_database(host, database, mysql_user, mysql_pass)
+                # Carry on over the probe's tunnel and connection
+                connect_and_work_with_database(session.mysql_host, session.database, mysql_user, mysql_pass,
+                                               session=session, env_name=env_name)
                 
-                return True
+                if fixtures:
+                    return seed_database(session, fixtures)
+                if keep_session:
+                    cleanup.pop_all()
+                    return session
+            
+            return True
         
         print("✗ Could not find MySQL server with 'cloudways_new' database")
         return False
@@ -472,85 +706,143 @@ def connect_to_mysql_database(mysql_info):
         print(f"✗ Error connecting to MySQL database: {e}")
         return False
 
-def check_existing_build_by_env_name(env_name):
-    """Check if a build exists (successful or building) for the given ENV_NAME"""
+class EarlyMySQLProbe:
+    """Runs connect_to_mysql_database in the background as soon as a running build reveals the endpoints
+
+    The session it reaches the database with is kept open, so fixtures can
+    be seeded over it once the build has finished.
+    """
+
+    def __init__(self, env_name=None):
+        self.env_name = env_name
+        self._thread = None
+        self._session = None
+
+    def start(self, info):
+        mysql_info = {k: v for k, v in info.items() if k.startswith('mysql')}
+        self._thread = threading.Thread(target=self._run, args=(mysql_info,), daemon=True)
+        self._thread.start()
+
+    def _run(self, mysql_info):
+        self._session = connect_to_mysql_database(mysql_info, env_name=self.env_name, keep_session=True) or None
+
+    def session(self):
+        """Wait for a started probe; the open session it reached the database with (the caller closes it) or None"""
+        if self._thread is None:
+            return None
+        self._thread.join()
+        session, self._session = self._session, None
+        return session
+
+    def close(self):
+        session = self.session()
+        if session is not None:
+            session.close()
+
+_build_index = None
+_build_index_lock = threading.Lock()
+
+def get_build_index():
+    """Return the shared local build index"""
+    global _build_index
+    with _build_index_lock:
+        if _build_index is None:
+            from build_index import BuildIndex
+            _build_index = BuildIndex(BUILD_INDEX_PATH)
+        return _build_index
+
+def remember_build_info(build_number, info):
+    """Record a finished build and its extracted info in the local index"""
     try:
-        print(f"Checking for existing builds with ENV_NAME='{env_name}'...")
-        
-        # Get job information to find recent builds
-        url = f"{JENKINS_URL}/job/Environments/job/{JOB_NAME}/api/json"
-        response = requests.get(url, auth=(USERNAME, API_TOKEN), timeout=10)
-        
-        if response.status_code != 200:
-            print(f"✗ Failed to get job information: {response.status_code}")
-            return None, None, None
-        
-        job_info = response.json()
-        builds = job_info.get('builds', [])
+        jenkins = get_jenkins()
+        build = jenkins.get_json(jenkins.job_url(JOB_NAME, build_number, "api/json"),
+                                 params={'tree': BUILD_LOOKUP_TREE}, max_age=0)
+        index = get_build_index()
+        index.record_build(JOB_NAME, build)
+        if info and not build.get('building'):
+            index.store_info(JOB_NAME, build_number, info)
+    except Exception as e:
+        print(f"⚠️  Could not update build index for build #{build_number}: {e}")
+
+def _match_builds(builds, params, match_mode):
+    """Reuse the newest BUILDING or SUCCESS build of params['ENV_NAME'] if it can serve `params`
+
+    `builds` are dicts with number, result, building and a `params` dict,
+    ordered newest first. Failed builds are skipped, as before; the first
+    BUILDING or SUCCESS build is what the environment currently runs, so
+    when its parameters differ under `match_mode` a new build is needed
+    even if an older build matches.
+    """
+    env_name = params.get('ENV_NAME')
+    checked = 0
+    for build in builds:
+        checked += 1
+        build_number = build['number']
+        result = build.get('result')
+        is_building = build.get('building', False)
         
-        if not builds:
-            print("✗ No builds found for this job")
-            return None, None, None
+        if build['params'].get('ENV_NAME') != env_name:
+            continue
+        if not is_building and result not in (None, 'SUCCESS'):
+            print(f"  Build #{build_number}: {result} with ENV_NAME='{env_name}' (will create new)")
+            continue
+        differences = param_differences(params, build['params'], match_mode)
+        if differences:
+            print(f"  Build #{build_number} is the newest for ENV_NAME='{env_name}' but its parameters differ "
+                  f"({describe_differences(differences)}), not reusing")
+            return None, False, None
+        if is_building or result is None:
+            print(f"✓ Found existing BUILDING build #{build_number} with ENV_NAME='{env_name}' ({match_mode} match)")
+            return build_number, True, 'BUILDING'
+        print(f"✓ Found existing SUCCESSFUL build #{build_number} with ENV_NAME='{env_name}' ({match_mode} match)")
+        return build_number, True, 'SUCCESS'
+    
+    print(f"✗ No existing build found with ENV_NAME='{env_name}' ({match_mode} match) in the last {checked} builds")
+    return None, False, None
+
+@tracer.traced('build_lookup')
+def check_existing_build_by_env_name(env_name, batch_size=None, max_builds=None, params=None, match_mode=None):
+    """Check if a build exists (successful or building) that can be reused for these parameters
+
+    `params` defaults to just ENV_NAME, and `match_mode` to BUILD_MATCH_MODE
+    (see fingerprint.MATCH_MODES). Looks in the local build index after an
+    incremental refresh; falls back to paging through Jenkins directly if
+    the index is unusable.
+    """
+    import sqlite3
+    
+    batch_size = batch_size or BUILD_LOOKUP_BATCH_SIZE
+    max_builds = max_builds or BUILD_LOOKUP_MAX_BUILDS
+    params = dict(params or {}, ENV_NAME=env_name)
+    match_mode = match_mode or BUILD_MATCH_MODE
+    try:
+        print(f"Checking for existing builds with ENV_NAME='{env_name}' ({match_mode} match)...")
         
-        print(f"Found {len(builds)} builds. Checking recent builds for ENV_NAME='{env_name}'...")
+        try:
+            index = get_build_index()
+            fetched = index.refresh(get_jenkins(), JOB_NAME, BUILD_LOOKUP_TREE, batch_size=batch_size,
+                                    max_builds=max_builds, max_age=BUILD_INDEX_MAX_AGE, env_name=env_name)
+            print(f"  Build index refreshed ({fetched} builds fetched from Jenkins)")
+            return _match_builds(index.builds_for_env(JOB_NAME, env_name), params, match_mode)
+        except sqlite3.Error as e:
+            print(f"⚠️  Build index unavailable ({e}), searching Jenkins directly")
         
-        # Check the last 10 builds to find one with matching ENV_NAME
-        for build in builds[:10]:  # Check last 10 builds
-            build_number = build['number']
-            build_url = build['url']
-            
-            try:
-                # Get build details
-                build_detail_url = f"{build_url}api/json"
-                build_response = requests.get(build_detail_url, auth=(USERNAME, API_TOKEN), timeout=10)
-                
-                if build_response.status_code == 200:
-                    build_detail = build_response.json()
-                    result = build_detail.get('result')
-                    is_building = build_detail.get('building', False)
-                    
-                    # Get build parameters
-                    actions = build_detail.get('actions', [])
-                    
-                    for action in actions:
-                        if action.get('_class') == 'hudson.model.ParametersAction':
-                            parameters = action.get('parameters', [])
-                            
-                            for param in parameters:
-                                if param.get('name') == 'ENV_NAME' and param.get('value') == env_name:
-                                    if is_building or result is None:
-                                        print(f"✓ Found existing BUILDING build #{build_number} with ENV_NAME='{env_name}'")
-                                        return build_number, True, 'BUILDING'
-                                    elif result == 'SUCCESS':
-                                        print(f"✓ Found existing SUCCESSFUL build #{build_number} with ENV_NAME='{env_name}'")
-                                        return build_number, True, 'SUCCESS'
-                                    else:
-                                        print(f"  Build #{build_number}: {result} with ENV_NAME='{env_name}' (will create new)")
-                    
-                    # If we reach here, this build doesn't have our ENV_NAME
-                    if result == 'SUCCESS':
-                        print(f"  Build #{build_number}: SUCCESS but different ENV_NAME")
-                    else:
-                        print(f"  Build #{build_number}: {result or 'BUILDING'} with different ENV_NAME")
-                        
-            except Exception as e:
-                print(f"  Error checking build #{build_number}: {e}")
-                continue
-        
-        print(f"✗ No existing build found with ENV_NAME='{env_name}'")
-        return None, False, None
+        # Pull number, status and parameters for a whole page of builds per request,
+        # paging further back through history until a match turns up
+        builds = get_jenkins().iter_builds(JOB_NAME, BUILD_LOOKUP_TREE, batch_size=batch_size,
+                                           max_builds=max_builds)
+        return _match_builds(({**build, 'params': build_parameters(build)} for build in builds), params, match_mode)
         
     except Exception as e:
         print(f"✗ Error checking existing builds: {e}")
         return None, False, None
 
 
-
 def fetch_console_output_for_build(build_number):
     """Fetch console output for a specific build number"""
     try:
-        url = f"{JENKINS_URL}/job/Environments/job/{JOB_NAME}/{build_number}/consoleText"
-        response = requests.get(url, auth=(USERNAME, API_TOKEN))
+        jenkins = get_jenkins()
+        response = jenkins.get(jenkins.job_url(JOB_NAME, build_number, "consoleText"))
         if response.status_code == 200:
             return response.text
         else:
@@ -560,82 +852,631 @@ def fetch_console_output_for_build(build_number):
         print(f"✗ Error fetching console output: {e}")
         return None
 
-def main():
-    print("=== AUTOMATED MYSQL CONNECTION ===")
+@tracer.traced('endpoint_probe')
+def check_endpoints(info):
+    """Probe every extracted endpoint at once (HTTP, private IPs and databases through the bastion)
+
+    Returns the list of endpoint_probe.ProbeResult, after printing a
+    latency report.
+    """
+    print("\nChecking endpoints...")
+    session = endpoint_probe.http_session(ENDPOINT_PROBE_WORKERS, verify=ENDPOINT_PROBE_VERIFY_TLS)
+    if _cassette is not None:
+        _cassette.attach(session)
+    try:
+        probes = endpoint_probe.plan_probes(info, forwarder=get_ssh_forwarder(), http_session=session,
+                                            timeout=ENDPOINT_PROBE_TIMEOUT)
+        started = time.perf_counter()
+        results = endpoint_probe.run_probes(probes, workers=ENDPOINT_PROBE_WORKERS)
+    finally:
+        session.close()
+    print(f"Endpoint health ({len(results)} probes in {time.perf_counter() - started:.1f}s):")
+    print(endpoint_probe.format_report(results))
+    return results
+
+def finished_build_info(build_number):
+    """Extracted info of a finished build, from the local index or else from its console"""
+    info = get_build_index().get_info(JOB_NAME, build_number)
+    if info:
+        print("✓ Using endpoints cached in the local build index")
+        return info
+    info = stream_console_info(build_number)
+    remember_build_info(build_number, info)
+    return info
+
+def lookup_env_info(env_name, cached_only=False):
+    """Endpoints of the newest usable build for env_name; returns (build_number, status, info)
+
+    With `cached_only` only the local build index is read, so Jenkins is
+    never contacted. A build that is still running has no info yet.
+    """
+    if cached_only:
+        for build in get_build_index().builds_for_env(JOB_NAME, env_name):
+            if build['result'] == 'SUCCESS' and build['info']:
+                return build['number'], 'SUCCESS', build['info']
+        print(f"✗ No SUCCESS build with stored endpoints for ENV_NAME='{env_name}' in {BUILD_INDEX_PATH}")
+        return None, None, None
     
-    # Read parameters first to get ENV_NAME
-    print("Reading parameters from userParams.txt...")
-    params = read_user_params()
-    if not params:
-        print("No parameters found or error reading file. Exiting.")
-        return
+    build_number, build_exists, build_status = check_existing_build_by_env_name(env_name, match_mode=MATCH_ENV)
+    if not build_exists:
+        return None, None, None
+    if build_status == 'BUILDING':
+        print(f"Build #{build_number} is still running; its endpoints are not available yet")
+        return build_number, build_status, None
+    return build_number, build_status, finished_build_info(build_number)
+
+def claimed_build_usable(build_number):
+    """Whether a build published by another process is still running or succeeded"""
+    try:
+        status = get_build_status(build_number)
+    except Exception as e:
+        print(f"⚠️  Could not check build #{build_number} triggered by another process ({e}); not following it")
+        return False
+    if status.get('building') or status.get('result') in (None, 'SUCCESS'):
+        return True
+    print(f"  Build #{build_number} triggered by another process finished {status.get('result')}; not following it")
+    return False
+
+def build_succeeded(result):
+    """Whether the build a provision_environment result refers to finished with SUCCESS"""
+    if result['status'] == 'REUSED':
+        return True
+    try:
+        status = get_build_status(result['build_number'])
+    except Exception as e:
+        print(f"✗ Could not check the result of build #{result['build_number']} ({e}); not seeding fixtures")
+        return False
+    if status.get('building') or status.get('result') != 'SUCCESS':
+        print(f"✗ Build #{result['build_number']} is {status.get('result') or 'still running'}; not seeding fixtures")
+        return False
+    return True
+
+@tracer.traced('provision')
+def provision_environment(params, trigger_slot=None, match_mode=None, check=False, fixtures=None):
+    """Find or build the environment described by `params` and connect to its MySQL database
+
+    `trigger_slot` is an optional context manager held while a new build is
+    triggered and queued (see batch.TriggerLimiter). `match_mode` decides
+    which existing builds may be reused (default BUILD_MATCH_MODE); with
+    `check` every extracted endpoint is health-probed at the end, and
+    `fixtures` are seeded into the database once, after the build has
+    finished successfully. Returns
+    a result dict with env_name, build_number, status, info, mysql_ok,
+    error, elapsed and the request's parameter fingerprint (plus
+    endpoints_ok when checked).
+    """
+    started = time.monotonic()
+    result = {'env_name': params.get('ENV_NAME'), 'build_number': None, 'status': None, 'info': None,
+              'mysql_ok': None, 'error': None, 'elapsed': None, 'fingerprint': param_fingerprint(params)}
     
-    print(f"\nFound {len(params)} parameters:")
-    for key, value in params.items():
-        print(f"  {key}: {value}")
+    def finish(error=None):
+        result['error'] = error
+        result['elapsed'] = time.monotonic() - started
+        return result
     
     env_name = params.get('ENV_NAME')
     if not env_name:
         print("✗ ENV_NAME not found in parameters. Cannot proceed.")
-        return
+        return finish("ENV_NAME not found")
+    
+    if BASTION_WARMUP:
+        start_bastion_warmup()
     
     print(f"\nLooking for existing builds with ENV_NAME='{env_name}'...")
+    early_probe = EarlyMySQLProbe(env_name)
     
     # Check if we should use an existing build based on ENV_NAME
-    existing_build_number, build_exists, build_status = check_existing_build_by_env_name(env_name)
+    existing_build_number, build_exists, build_status = check_existing_build_by_env_name(
+        env_name, params=params, match_mode=match_mode)
     
     if build_exists and existing_build_number:
+        result['build_number'] = existing_build_number
         if build_status == 'BUILDING':
             print(f"Found existing BUILDING build #{existing_build_number} with ENV_NAME='{env_name}'")
             print(f"Waiting for existing build #{existing_build_number} to complete instead of creating new build...")
             build_number = existing_build_number
-            wait_for_job_completion(build_number)
-            output = fetch_console_output(build_number)
+            result['status'] = 'REUSED (was building)'
+            info = tail_console_info(build_number, on_mysql_ready=early_probe.start)
+            remember_build_info(build_number, info)
         elif build_status == 'SUCCESS':
             print(f"Using existing SUCCESSFUL build #{existing_build_number} with ENV_NAME='{env_name}'")
-            output = fetch_console_output_for_build(existing_build_number)
-            
-            if not output:
-                print("Failed to fetch console output from existing build")
-                return
+            result['status'] = 'REUSED'
+            info = finished_build_info(existing_build_number)
     else:
         print(f"No existing build found with ENV_NAME='{env_name}'. Creating new build...")
         
         # Test Jenkins connection
         if not test_jenkins_connection():
             print("\n❌ Cannot connect to Jenkins server.")
-            return
+            return finish("cannot connect to Jenkins")
         
         # Check if job exists
         if not check_job_exists():
             print(f"\n❌ Job '{JOB_NAME}' not found.")
-            return
+            return finish(f"job '{JOB_NAME}' not found")
         
-        # Trigger Jenkins job
-        print(f"\nTriggering Jenkins job '{JOB_NAME}' with ENV_NAME='{env_name}'...")
-        build_number = trigger_job(params)
+        # Only one local process triggers a build for this ENV_NAME; the
+        # others wait on the lock and follow the build it publishes
+        with get_trigger_locks().claim(env_name) as claim:
+            if (claim.build_number and not param_differences(params, claim.params, match_mode or BUILD_MATCH_MODE)
+                    and claimed_build_usable(claim.build_number)):
+                build_number = claim.build_number
+                print(f"✓ Following build #{build_number}, triggered by another process for ENV_NAME='{env_name}'")
+                result['status'] = 'REUSED (triggered by another process)'
+            else:
+                # Trigger Jenkins job
+                print(f"\nTriggering Jenkins job '{JOB_NAME}' with ENV_NAME='{env_name}'...")
+                if trigger_slot is None:
+                    build_number = trigger_job(params)
+                else:
+                    with trigger_slot:
+                        build_number = trigger_job(params)
+                
+                if not build_number:
+                    print("✗ Failed to trigger job or get build number. Exiting.")
+                    return finish("failed to trigger job")
+                
+                claim.publish(build_number, params)
+                print(f"✓ Build #{build_number} triggered successfully")
+                result['status'] = 'NEW'
         
-        if not build_number:
-            print("✗ Failed to trigger job or get build number. Exiting.")
-            return
+        result['build_number'] = build_number
+        info = tail_console_info(build_number, on_mysql_ready=early_probe.start)
+        remember_build_info(build_number, info)
 
-        print(f"✓ Build #{build_number} triggered successfully")
-        wait_for_job_completion(build_number)
-        output = fetch_console_output(build_number)
-
-    # Extract MySQL information from console output
-    info = extract_info(output)
+    if info is None:
+        early_probe.close()
+        print("Failed to fetch console output")
+        return finish("failed to fetch console output")
+    result['info'] = info
 
     print("\nExtracted Info:")
     for key, value in info.items():
         print(f"{key}: {value}")
     
-    # Automatically connect to MySQL database
+    # Automatically connect to MySQL database, unless a probe started while
+    # the build was running has already done so
+    mysql_info = {k: v for k, v in info.items() if k.startswith('mysql')}
+    seed = fixtures if fixtures and build_succeeded(result) else None
+    early_session = early_probe.session()
+    if early_session is not None:
+        print("\n✓ MySQL database was reached while the build was still running")
+        with early_session:
+            result['mysql_ok'] = seed_database(early_session, seed) if seed else True
+    elif mysql_info and len(mysql_info) >= 3:
+        result['mysql_ok'] = connect_to_mysql_database(mysql_info, env_name=env_name, fixtures=seed)
+    else:
+        print("\n⚠️  MySQL connection details incomplete.")
+    error = None
+    if fixtures and not seed:
+        result['mysql_ok'] = False
+        error = f"fixtures not seeded: build #{result['build_number']} did not finish with SUCCESS"
+    
+    if check:
+        probes = check_endpoints(info)
+        result['endpoints_ok'] = not any(probe.status == endpoint_probe.FAILED for probe in probes)
+    
+    return finish(error)
+
+def run_batch(paths, max_triggers=BATCH_MAX_TRIGGERS, max_parallel=BATCH_MAX_PARALLEL, match_mode=None,
+              check=False, fixtures=None):
+    """Provision every environment described by the parameter files under `paths` concurrently"""
+    files = expand_param_paths(paths)
+    if not files:
+        print("✗ No parameter files found.")
+        return []
+    
+    entries = [(path, read_user_params(path)) for path in files]
+    entries, skipped = dedupe_by_env_name([(path, params) for path, params in entries if params])
+    for path, reason in skipped:
+        print(f"⚠️  Skipping {path}: {reason}")
+    if not entries:
+        print("✗ No environments left to provision.")
+        return []
+    
+    limiter = TriggerLimiter(trigger_limit(get_jenkins(), max_triggers))
+    print(f"\nProvisioning {len(entries)} environments "
+          f"({max_parallel} at a time, at most {limiter.limit} concurrent triggers)...")
+    
+    def run(path, params):
+        try:
+            result = provision_environment(params, trigger_slot=limiter, match_mode=match_mode, check=check,
+                                           fixtures=fixtures)
+        except Exception as e:
+            result = {'env_name': params.get('ENV_NAME'), 'error': str(e)}
+        result['path'] = path
+        return result
+    
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel), thread_name_prefix='provision') as pool:
+        results = list(pool.map(lambda entry: run(*entry), entries))
+    
+    print("\n" + "="*60)
+    print("BATCH SUMMARY")
+    print("="*60)
+    print(format_summary(results))
+    return results
+
+COMMANDS = ('lookup', 'provision', 'extract', 'probe-db', 'health', 'export', 'seed', 'wait', 'serve', 'analyze')
+
+def cmd_lookup(args):
+    """Print the endpoints of an environment's newest build"""
+    with contextlib.redirect_stdout(sys.stderr) if args.json else contextlib.nullcontext():
+        build_number, status, info = lookup_env_info(args.env_name, cached_only=args.cached)
+    if args.json:
+        print(json.dumps({'env_name': args.env_name, 'build_number': build_number, 'status': status,
+                          'info': info}, indent=2))
+    elif info:
+        print(f"\nENV_NAME='{args.env_name}', build #{build_number} ({status}):")
+        for key, value in info.items():
+            print(f"{key}: {value}")
+    return 0 if info else 1
+
+def cmd_provision(args):
+    """Find or build environments and connect to their MySQL databases"""
+    print("=== AUTOMATED MYSQL CONNECTION ===")
+    
+    if args.batch:
+        results = run_batch(args.batch, max_triggers=args.max_triggers, max_parallel=args.max_parallel,
+                            match_mode=args.match, check=args.check_endpoints, fixtures=args.seed)
+        return 0 if results and not any(result.get('error') for result in results) else 1
+    
+    # Read parameters first to get ENV_NAME
+    print(f"Reading parameters from {args.params}...")
+    with tracer.span('param_parsing'):
+        params = read_user_params(args.params)
+    if not params:
+        print("No parameters found or error reading file. Exiting.")
+        return 1
+    
+    print(f"\nFound {len(params)} parameters:")
+    for key, value in params.items():
+        print(f"  {key}: {value}")
+    
+    result = provision_environment(params, match_mode=args.match, check=args.check_endpoints, fixtures=args.seed)
+    return 1 if result['error'] else 0
+
+def cmd_extract(args):
+    """Extract endpoints from a saved console log (or stdin) and print them as JSON"""
+    extractor = ConsoleExtractor()
+    source = sys.stdin if args.path == '-' else open(args.path, encoding='utf-8', errors='replace')
+    try:
+        while True:
+            chunk = source.read(CONSOLE_CHUNK_SIZE)
+            if not chunk or extractor.feed(chunk):
+                break
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    extractor.close()
+    info = extractor.result()
+    print(json.dumps(info, indent=2))
+    return 0 if info else 1
+
+@tracer.traced('export')
+def export_environment_tables(info, tables, directory, fmt='csv', workers=1, split=1, chunk_size=None):
+    """Find the environment's cloudways_new host and stream `tables` from it into gzip files"""
+    import table_export
+    
+    mysql_ips, mysql_user, mysql_pass = info.get('mysql_ips'), info.get('mysql_user'), info.get('mysql_pass')
+    if not mysql_ips or not mysql_user or not mysql_pass:
+        print("✗ Missing MySQL connection details")
+        return None
+    session = probe_mysql_hosts(mysql_ips, mysql_user, mysql_pass)
+    if session is None:
+        print("✗ Could not find MySQL server with 'cloudways_new' database")
+        return None
+    with session:
+        print(f"\nExporting {', '.join(tables)} from {session.mysql_host} to {directory} "
+              f"({fmt}, {workers} connection(s))...")
+        started = time.perf_counter()
+        results = table_export.export_tables(session, tables, directory, fmt=fmt, workers=workers, split=split,
+                                             chunk_size=chunk_size or EXPORT_CHUNK_SIZE)
+    for result in results:
+        rate = result['rows'] / result['seconds'] if result['seconds'] else 0
+        print(f"✓ {result['table']}: {result['rows']} rows, {result['bytes'] / 1024 / 1024:.1f} MB "
+              f"in {result['seconds']:.1f}s ({rate:.0f} rows/s) -> {result['path']}")
+    print(f"Export finished in {time.perf_counter() - started:.1f}s")
+    return results
+
+def _info_from_args(args):
+    """Endpoints named on the command line, by ENV_NAME or as a saved JSON file"""
+    if args.info:
+        with open(args.info, encoding='utf-8') as f:
+            info = json.load(f)
+        # Accept both `extract` output and `lookup --json` output
+        if isinstance(info.get('info'), dict):
+            info = info['info']
+        return info
+    if args.env_name:
+        _, _, info = lookup_env_info(args.env_name, cached_only=args.cached)
+        return info
+    print("✗ Give an ENV_NAME or --info FILE")
+    return None
+
+def cmd_probe_db(args):
+    """Connect to an environment's MySQL database, given its ENV_NAME or saved endpoints"""
+    info = _info_from_args(args)
+    if not info:
+        return 1
     mysql_info = {k: v for k, v in info.items() if k.startswith('mysql')}
-    if mysql_info and len(mysql_info) >= 3:
-        connect_to_mysql_database(mysql_info)
+    return 0 if connect_to_mysql_database(mysql_info, env_name=args.env_name) else 1
+
+def cmd_health(args):
+    """Probe every endpoint of an environment concurrently and print a latency report"""
+    with contextlib.redirect_stdout(sys.stderr) if args.json else contextlib.nullcontext():
+        info = _info_from_args(args)
+        if not info:
+            return 1
+        results = check_endpoints(info)
+    if args.json:
+        print(json.dumps([result.to_dict() for result in results], indent=2))
+    return 1 if any(result.status == endpoint_probe.FAILED for result in results) else 0
+
+def cmd_export(args):
+    """Stream tables of an environment's cloudways_new database into compressed CSV or NDJSON files"""
+    info = _info_from_args(args)
+    if not info:
+        return 1
+    try:
+        results = export_environment_tables(info, args.tables, args.out, fmt=args.format, workers=args.workers,
+                                            split=args.split, chunk_size=args.chunk_size)
+    except ValueError as e:
+        print(f"✗ {e}")
+        return 1
+    return 0 if results else 1
+
+def cmd_seed(args):
+    """Load fixture files into an environment's cloudways_new database"""
+    info = _info_from_args(args)
+    if not info:
+        return 1
+    return 0 if seed_environment(info, args.fixtures, method=args.method) else 1
+
+def cmd_wait(args):
+    """Wait for a build to finish, optionally following its console for the endpoints"""
+    if args.follow:
+        info = tail_console_info(args.build_number)
+        remember_build_info(args.build_number, info)
+        if info is None:
+            return 1
+        print("\nExtracted Info:")
+        for key, value in info.items():
+            print(f"{key}: {value}")
+        return 0 if info else 1
+    result = wait_for_job_completion(args.build_number, timeout=args.timeout)
+    return 0 if result == 'SUCCESS' else 1
+
+def open_mysql_forward(info):
+    """Forward to the environment's cloudways_new host, kept open without a connection; returns (host, forward)"""
+    session = probe_mysql_hosts(info['mysql_ips'], info.get('mysql_user'), info.get('mysql_pass'))
+    if session is None:
+        raise LookupError("no MySQL server with a 'cloudways_new' database")
+    session.connection.close()
+    return session.mysql_host, session.forward
+
+def cmd_serve(args):
+    """Run a local daemon answering env lookups and provisioning from warm state"""
+    from broker import Broker, load_token, make_server
+    
+    # The daemon serves requests until stopped; only its recent spans are kept for the trace
+    tracer.keep_spans(BROKER_TRACE_SPANS)
+    start_bastion_warmup()
+    get_jenkins()
+    limiter = TriggerLimiter(BATCH_MAX_TRIGGERS)
+    broker = Broker(lookup_env_info,
+                    lambda params: provision_environment(params, trigger_slot=limiter),
+                    open_mysql_forward, ttl=args.ttl, refresh_interval=args.refresh)
+    token = None if args.socket else load_token(BROKER_TOKEN_PATH)
+    server = make_server(broker, args.host, args.port, socket_path=args.socket, token=token)
+    broker.start()
+    where = args.socket or f"http://{args.host}:{args.port}"
+    print(f"✓ Broker listening on {where} (GET /env/ENV_NAME, GET /env/ENV_NAME/mysql, "
+          f"POST /env/ENV_NAME/provision, GET /health)")
+    if token:
+        print(f"  Clients send 'Authorization: Bearer <token>' with the token from {BROKER_TOKEN_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping broker...")
+    finally:
+        server.server_close()
+        broker.close()
+        if _ssh_forwarder is not None:
+            _ssh_forwarder.close()
+    return 0
+
+def cmd_analyze(args):
+    """Report build durations, slow stages and failures over the job's recent builds"""
+    import build_analytics
+    
+    with contextlib.redirect_stdout(sys.stderr) if args.json else contextlib.nullcontext():
+        print(f"Analyzing the last {args.builds} builds of '{JOB_NAME}' (consoles cached in {args.cache_dir})...")
+        started = time.perf_counter()
+        with tracer.span('analyze'):
+            records = build_analytics.analyze_builds(get_jenkins(), JOB_NAME, args.builds, args.cache_dir,
+                                                     fetch_workers=args.fetch_workers,
+                                                     parse_workers=args.parse_workers)
+        print(f"✓ Analyzed {len(records)} builds in {time.perf_counter() - started:.1f}s")
+    if not records:
+        return 1
+    summary = build_analytics.summarize(records)
+    if args.json:
+        print(json.dumps(summary, indent=2))
     else:
-        print(f"\n⚠️  MySQL connection details incomplete.")
+        print()
+        print(build_analytics.format_report(summary))
+    return 0
+
+def build_parser():
+    import fixture_seed, table_export
+    
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--trace', default=TRACE_OUTPUT_PATH, metavar='PATH',
+                        help="where to write the JSON phase trace (empty to disable)")
+    common.add_argument('--prom-textfile', default=PROMETHEUS_TEXTFILE_PATH, metavar='PATH',
+                        help="also write phase timings for the node_exporter textfile collector")
+    recording = common.add_mutually_exclusive_group()
+    recording.add_argument('--record', metavar='CASSETTE',
+                           help="save every Jenkins/HTTP exchange, bastion channel and MySQL query of this run")
+    recording.add_argument('--replay', metavar='CASSETTE',
+                           help="answer from a recorded cassette instead of Jenkins, the bastion and MySQL; "
+                                "sleeps take no time")
+    
+    parser = argparse.ArgumentParser(description="Provision Jenkins environments and connect to their MySQL database")
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
+    
+    lookup = commands.add_parser('lookup', parents=[common], help=cmd_lookup.__doc__)
+    lookup.add_argument('env_name', metavar='ENV_NAME')
+    lookup.add_argument('--cached', action='store_true', help="answer from the local build index only")
+    lookup.add_argument('--json', action='store_true', help="print the result as JSON")
+    lookup.set_defaults(handler=cmd_lookup)
+    
+    provision = commands.add_parser('provision', parents=[common], help=cmd_provision.__doc__)
+    provision.add_argument('--params', default=USER_PARAMS_PATH, metavar='PATH',
+                           help=f"parameter file for a single environment (default {USER_PARAMS_PATH})")
+    provision.add_argument('--batch', nargs='+', metavar='PATH',
+                           help="parameter files or directories of them to provision concurrently")
+    provision.add_argument('--max-triggers', type=int, default=BATCH_MAX_TRIGGERS,
+                           help="most builds triggered and waiting in the Jenkins queue at once")
+    provision.add_argument('--max-parallel', type=int, default=BATCH_MAX_PARALLEL,
+                           help="most environments handled at once")
+    provision.add_argument('--match', choices=MATCH_MODES, default=BUILD_MATCH_MODE,
+                           help="how an existing build's parameters must match to be reused: exactly, only "
+                                "ENV_NAME, or every requested parameter (default %(default)s)")
+    provision.add_argument('--check-endpoints', action='store_true',
+                           help="health-probe every extracted endpoint once the environment is ready")
+    provision.add_argument('--seed', nargs='+', metavar='PATH',
+                           help="fixture files or directories to load into cloudways_new once it is reachable")
+    provision.set_defaults(handler=cmd_provision)
+    
+    extract = commands.add_parser('extract', parents=[common], help=cmd_extract.__doc__)
+    extract.add_argument('path', nargs='?', default='-', metavar='FILE', help="console log (default stdin)")
+    extract.set_defaults(handler=cmd_extract, trace=None)
+    
+    probe_db = commands.add_parser('probe-db', parents=[common], help=cmd_probe_db.__doc__)
+    probe_db.add_argument('env_name', nargs='?', metavar='ENV_NAME')
+    probe_db.add_argument('--info', metavar='FILE', help="JSON written by `extract` or `lookup --json`")
+    probe_db.add_argument('--cached', action='store_true', help="read the endpoints from the local build index only")
+    probe_db.set_defaults(handler=cmd_probe_db)
+    
+    health = commands.add_parser('health', parents=[common], help=cmd_health.__doc__)
+    health.add_argument('env_name', nargs='?', metavar='ENV_NAME')
+    health.add_argument('--info', metavar='FILE', help="JSON written by `extract` or `lookup --json`")
+    health.add_argument('--cached', action='store_true', help="read the endpoints from the local build index only")
+    health.add_argument('--json', action='store_true', help="also print the probe results as JSON")
+    health.set_defaults(handler=cmd_health)
+    
+    export = commands.add_parser('export', parents=[common], help=cmd_export.__doc__)
+    export.add_argument('env_name', nargs='?', metavar='ENV_NAME')
+    export.add_argument('--info', metavar='FILE', help="JSON written by `extract` or `lookup --json`")
+    export.add_argument('--cached', action='store_true', help="read the endpoints from the local build index only")
+    export.add_argument('--tables', nargs='+', default=['users'], metavar='TABLE', help="tables to export")
+    export.add_argument('--format', choices=table_export.FORMATS, default='csv')
+    export.add_argument('--out', default=EXPORT_DIR, metavar='DIR', help="output directory")
+    export.add_argument('--workers', type=int, default=1,
+                        help="connections exporting at once (tables, or key ranges with --split)")
+    export.add_argument('--split', type=int, default=1,
+                        help="split each table with an integer primary key into this many ranges")
+    export.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help="rows fetched per round trip")
+    export.set_defaults(handler=cmd_export)
+    
+    seed = commands.add_parser('seed', parents=[common], help=cmd_seed.__doc__)
+    seed.add_argument('env_name', nargs='?', metavar='ENV_NAME')
+    seed.add_argument('--info', metavar='FILE', help="JSON written by `extract` or `lookup --json`")
+    seed.add_argument('--cached', action='store_true', help="read the endpoints from the local build index only")
+    seed.add_argument('--fixtures', nargs='+', required=True, metavar='PATH',
+                      help="CSV/NDJSON fixture files (optionally .gz) or directories; file name = table name")
+    seed.add_argument('--method', choices=fixture_seed.METHODS, default=SEED_METHOD)
+    seed.set_defaults(handler=cmd_seed)
+    
+    wait = commands.add_parser('wait', parents=[common], help=cmd_wait.__doc__)
+    wait.add_argument('build_number', type=int, metavar='BUILD')
+    wait.add_argument('--timeout', type=float, default=BUILD_WAIT_TIMEOUT, help="seconds to wait")
+    wait.add_argument('--follow', action='store_true', help="tail the console and print the extracted endpoints")
+    wait.set_defaults(handler=cmd_wait)
+    
+    serve = commands.add_parser('serve', parents=[common], help=cmd_serve.__doc__)
+    serve.add_argument('--host', default=BROKER_HOST)
+    serve.add_argument('--port', type=int, default=BROKER_PORT)
+    serve.add_argument('--socket', default=BROKER_SOCKET_PATH, metavar='PATH',
+                       help="listen on this Unix socket instead of host:port")
+    serve.add_argument('--ttl', type=float, default=BROKER_TTL,
+                       help="seconds an answer is served from memory (default %(default)s)")
+    serve.add_argument('--refresh', type=float, default=BROKER_REFRESH_INTERVAL,
+                       help="seconds between background refreshes (default %(default)s)")
+    serve.set_defaults(handler=cmd_serve)
+    
+    analyze = commands.add_parser('analyze', parents=[common], help=cmd_analyze.__doc__)
+    analyze.add_argument('--builds', type=int, default=ANALYZE_BUILDS, metavar='N', help="how many recent builds")
+    analyze.add_argument('--fetch-workers', type=int, default=ANALYZE_FETCH_WORKERS,
+                         help="console logs downloaded at once")
+    analyze.add_argument('--parse-workers', type=int, default=ANALYZE_PARSE_WORKERS,
+                         help="processes parsing logs (default: one per CPU)")
+    analyze.add_argument('--cache-dir', default=CONSOLE_CACHE_DIR, metavar='DIR')
+    analyze.add_argument('--json', action='store_true', help="print the summary as JSON")
+    analyze.set_defaults(handler=cmd_analyze)
+    return parser
+
+def main(argv=None):
+    """Run one subcommand; `python main.py [--batch ...]` without one still means `provision`"""
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] not in COMMANDS + ('-h', '--help'):
+        argv = ['provision'] + argv
+    args = build_parser().parse_args(argv)
+    scratch = None
+    if args.record or args.replay:
+        import cassette
+        scratch = (use_cassette(args.record, cassette.RECORD) if args.record
+                   else use_cassette(args.replay, cassette.REPLAY))
+    try:
+        status = args.handler(args)
+    finally:
+        if _cassette is not None:
+            _cassette.close()
+            shutil.rmtree(scratch, ignore_errors=True)
+    
+    with contextlib.redirect_stdout(sys.stderr) if getattr(args, 'json', False) else contextlib.nullcontext():
+        if _jenkins_client is not None:
+            print("\nJenkins request latency:")
+            print(_jenkins_client.latency_report())
+        write_trace(args.trace, args.prom_textfile)
+    return status
+
+def use_cassette(path, mode):
+    """Record this run's traffic to a cassette, or replay it from one; returns the run's scratch directory
+
+    Local state that changes which requests are made (the response cache,
+    build index, schema snapshots and coordination files) is kept in a
+    fresh scratch directory, so a recording and its replays start alike.
+    On replay, this program's own modules run on the cassette's virtual
+    clock.
+    """
+    import build_index, build_waiter, cassette, coordination, http_cache
+    
+    global _cassette, JENKINS_CACHE_DIR, BUILD_INDEX_PATH, SCHEMA_SNAPSHOT_DIR, COORDINATION_DIR, JENKINS_RATE_LIMIT
+    _cassette = cassette.Cassette(path, mode, clock_modules=[sys.modules[__name__], build_waiter, build_index,
+                                                             coordination, http_cache])
+    scratch = tempfile.mkdtemp(prefix='cassette-')
+    JENKINS_CACHE_DIR = None
+    BUILD_INDEX_PATH = os.path.join(scratch, 'build_index.sqlite3')
+    SCHEMA_SNAPSHOT_DIR = os.path.join(scratch, 'schema_snapshots')
+    COORDINATION_DIR = scratch
+    if mode == cassette.REPLAY:
+        JENKINS_RATE_LIMIT = 0
+    mysql_session.connection_hook = _cassette.connection_hook
+    print(f"{'Recording to' if mode == cassette.RECORD else 'Replaying'} cassette {path}", file=sys.stderr)
+    return scratch
+
+def write_trace(json_path, prometheus_path=None):
+    """Write the run's phase timings as a JSON trace and, optionally, a Prometheus textfile"""
+    try:
+        if json_path:
+            tracer.write_json(json_path)
+            print(f"Phase trace written to {json_path}")
+        if prometheus_path:
+            tracer.write_prometheus(prometheus_path)
+    except OSError as e:
+        print(f"⚠️  Could not write phase trace: {e}")
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import schema_snapshot
+from tracing import tracer
+
+MYSQL_PORT = 3306
+CONNECT_TIMEOUT = 10
+
+# Called as connection_hook(connect, settings) instead of connect(settings) when set;
+# cassette.Cassette uses it to record or replay every connection
+connection_hook = None
+
+
+def open_mysql_connection(port, user, password, database=None, host='127.0.0.1', **kwargs):
+    """Open a pymysql connection with the settings every caller in this repo uses"""
+    settings = dict(host=host, port=port, user=user, password=password, database=database,
+                    connect_timeout=CONNECT_TIMEOUT, charset='utf8mb4', **kwargs)
+    if connection_hook is not None:
+        return connection_hook(_connect, settings)
+    return _connect(settings)
+
+
+def _connect(settings):
+    import pymysql
+
+    return pymysql.connect(**settings)
+
+
+class MySQLSession:
+    """An SSH forward and the MySQL connection running over it, closed together
+
+    Whatever the session has already learned about the server (its
+    databases, the tables of the selected database) is kept, so the next
+    phase can carry on without querying it again.
+    """
+
+    def __init__(self, mysql_host, forward, connection, database=None, user=None, password=None):
+        self.mysql_host = mysql_host
+        self.forward = forward
+        self.connection = connection
+        self.database = database
+        self.user = user
+        self.password = password
+        self._databases = None
+        self._tables = None
+        self._table_stats = {}
+        self._columns = {}
+
+    @classmethod
+    def open(cls, forwarder, mysql_host, user, password, database=None, port=MYSQL_PORT):
+        """Forward a local port to mysql_host over `forwarder` and connect through it"""
+        with tracer.timer('tunnel_setup'):
+            forward = forwarder.forward(mysql_host, port)
+        try:
+            with tracer.timer('mysql_connect'):
+                connection = open_mysql_connection(forward.local_port, user, password, database=database)
+        except Exception:
+            forward.close()
+            raise
+        return cls(mysql_host, forward, connection, database, user, password)
+
+    @property
+    def local_port(self):
+        return self.forward.local_port
+
+    def cursor(self):
+        return self.connection.cursor()
+
+    def open_connection(self, **kwargs):
+        """Another connection to the same server and database over this session's forward
+
+        For work that needs its own connection, e.g. parallel exports; the
+        caller closes it.
+        """
+        with tracer.timer('mysql_connect'):
+            return open_mysql_connection(self.local_port, self.user, self.password, database=self.database,
+                                         **kwargs)
+
+    def introspect(self, database):
+        """List the databases and `database`'s tables with row estimates and sizes, in one query
+
+        The answers are kept, so databases() and tables() (for `database`)
+        need no further round trips. Returns {table: stats}.
+        """
+        with tracer.timer('schema_queries'), self.cursor() as cursor:
+            self._databases, tables = schema_snapshot.fetch_tables(cursor, database)
+        self._table_stats[database] = tables
+        if database == self.database:
+            self._tables = list(tables)
+        return tables
+
+    def databases(self, refresh=False):
+        if self._databases is None or refresh:
+            with tracer.timer('schema_queries'), self.cursor() as cursor:
+                cursor.execute("SHOW DATABASES")
+                self._databases = [row[0] for row in cursor.fetchall()]
+        return self._databases
+
+    def use(self, database):
+        """Switch the connection to `database`"""
+        if database != self.database:
+            self.connection.select_db(database)
+            self.database = database
+            self._tables = list(self._table_stats[database]) if database in self._table_stats else None
+
+    def tables(self, refresh=False):
+        """Tables of the selected database, queried once per session"""
+        if self._tables is None or refresh:
+            with tracer.timer('schema_queries'), self.cursor() as cursor:
+                cursor.execute("SHOW TABLES")
+                self._tables = [row[0] for row in cursor.fetchall()]
+        return self._tables
+
+    def columns(self):
+        """{table: [[column, type, nullable, key], ...]} for the selected database, in one query"""
+        if self.database not in self._columns:
+            with tracer.timer('schema_queries'), self.cursor() as cursor:
+                self._columns[self.database] = schema_snapshot.fetch_columns(cursor, self.database)
+        return self._columns[self.database]
+
+    def snapshot(self, env_name):
+        """Schema snapshot of the selected database (see schema_snapshot.build_snapshot)"""
+        tables = self._table_stats.get(self.database)
+        if tables is None:
+            tables = self.introspect(self.database)
+        return schema_snapshot.build_snapshot(env_name, self.mysql_host, self.database, self.databases(), tables,
+                                              self.columns())
+
+    def close(self):
+        try:
+            self.connection.close()
+        except Exception:
+            pass
+        finally:
+            self.forward.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,252 @@
+"""Parameter profiles: userParams.txt-style (or JSON) files that may extend a base profile
+
+Text profiles are blocks of a NAME line (capitals, digits and underscores),
+an optional description line and the value, with "Note:" lines anywhere in
+between. An `@extends PATH` line (relative to the profile) pulls
+in a base profile whose parameters this one overrides:
+
+    @extends base.txt
+    ENV_NAME
+    xyr
+    PLATFORMAPI_BRANCH
+    feature/service-x
+
+JSON profiles are {"extends": PATH, "params": {...}} or a flat {name: value}.
+
+Resolved profiles are validated against a schema and compiled to a small
+JSON file keyed by the mtime and size of every file they were built from,
+so an unchanged profile loads without being parsed again.
+"""
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import threading
+
+from fingerprint import param_fingerprint
+
+FORMAT_VERSION = 2
+EXTENDS_DIRECTIVE = '@extends'
+MAX_DEPTH = 10
+
+# Schema rules by parameter name (shell-style patterns allowed); unknown parameters are passed through.
+# Rules with 'warn' only produce warnings, the rest make the profile invalid.
+PROFILE_SCHEMA = {
+    'ENV_NAME': {'required': True, 'pattern': r'^[a-z0-9]{1,3}$', 'warn': True,
+                 'hint': "at most 3 lowercase letters or digits, e.g. nvd or as1"},
+    'ENV_TYPE': {'pattern': r'^[a-z0-9_-]+$', 'hint': "a lowercase word such as dev"},
+    '*_BRANCH': {'pattern': r'^(?!.*\.\.)[^\s~^:?*\[\\]+$', 'hint': "a git branch name (no spaces)"},
+}
+
+_NAME_RE = re.compile(r'^[A-Z][A-Z0-9_]*$')
+_DESCRIPTION_WORDS = ('name', 'branch', 'endpoint', 'service')
+
+
+class ProfileError(ValueError):
+    """A profile that cannot be read, resolved or validated"""
+
+
+class Profile:
+    """A resolved, validated profile: its parameters, their fingerprint, the files they came from
+    and any schema warnings"""
+
+    def __init__(self, path, params, fingerprint, sources, warnings=()):
+        self.path = path
+        self.params = params
+        self.fingerprint = fingerprint
+        self.sources = sources
+        self.warnings = list(warnings)
+
+    def to_dict(self):
+        return {'path': self.path, 'params': self.params, 'fingerprint': self.fingerprint,
+                'sources': self.sources, 'warnings': self.warnings}
+
+
+def _is_description(line):
+    return ' ' in line and any(word in line.lower() for word in _DESCRIPTION_WORDS)
+
+
+def _block_value(lines):
+    """The value of one NAME block from its description/value lines, or None when it has none
+
+    With two or more lines the first is the description, so the value is
+    never mistaken for one whatever it contains (e.g. feature/service-x).
+    A lone line is the value unless it reads like a description ("CNC
+    branch name"), which means the value was left out.
+    """
+    for line in lines[1:] if len(lines) > 1 else lines:
+        if not _is_description(line):
+            return line
+    return None
+
+
+def parse_blocks(lines):
+    """{NAME: value} from userParams.txt-style lines; blocks without a value are left out"""
+    params = {}
+    blocks = []
+    for line in lines:
+        line = line.strip()
+        if _NAME_RE.match(line):
+            blocks.append((line, []))
+        elif blocks and line and not line.startswith(('Note:', '#')):
+            blocks[-1][1].append(line)
+    for name, block in blocks:
+        value = _block_value(block)
+        if value:
+            params[name] = value
+    return params
+
+
+def parse_profile_file(path):
+    """Read one file; returns (extends path or None, params) without resolving the base"""
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    if path.endswith('.json'):
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise ProfileError(f"{path}: invalid JSON: {e}")
+        if not isinstance(data, dict):
+            raise ProfileError(f"{path}: expected a JSON object")
+        if 'params' in data or 'extends' in data:
+            params = data.get('params') or {}
+            if not isinstance(params, dict):
+                raise ProfileError(f"{path}: 'params' must be an object")
+            return data.get('extends'), {str(k): str(v) for k, v in params.items() if v is not None}
+        return None, {str(k): str(v) for k, v in data.items() if v is not None}
+    extends = None
+    lines = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith(EXTENDS_DIRECTIVE + ' '):
+            if extends is not None:
+                raise ProfileError(f"{path}: more than one {EXTENDS_DIRECTIVE} line")
+            extends = stripped[len(EXTENDS_DIRECTIVE):].strip()
+        else:
+            lines.append(line)
+    return extends, parse_blocks(lines)
+
+
+def validate(params, schema=PROFILE_SCHEMA):
+    """Problems with resolved `params` under `schema`, as (errors, warnings) lists of messages"""
+    errors = []
+    warnings = []
+    for name, rule in schema.items():
+        if rule.get('required') and '*' not in name and not params.get(name):
+            (warnings if rule.get('warn') else errors).append(f"{name} is required")
+    for name, value in params.items():
+        for pattern, rule in schema.items():
+            if not fnmatch.fnmatchcase(name, pattern):
+                continue
+            problems = warnings if rule.get('warn') else errors
+            if 'pattern' in rule and not re.match(rule['pattern'], value):
+                problems.append(f"{name}={value!r} is not {rule.get('hint') or 'valid'}")
+            if 'choices' in rule and value not in rule['choices']:
+                problems.append(f"{name}={value!r} is not one of {', '.join(rule['choices'])}")
+    return errors, warnings
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class ProfileLoader:
+    """Loads profiles through an in-memory and (optionally) on-disk cache of compiled profiles
+
+    Each file is parsed at most once per (mtime, size), however many
+    profiles extend it, so a batch of hundreds of profiles sharing a base
+    parses the base once. Compiled profiles in `cache_dir` are reused while
+    none of their source files has changed.
+    """
+
+    def __init__(self, cache_dir=None, schema=PROFILE_SCHEMA):
+        self.cache_dir = cache_dir
+        self.schema = schema
+        # Compiled profiles were validated against this exact schema
+        self._schema_hash = hashlib.sha1(json.dumps(schema, sort_keys=True).encode('utf-8')).hexdigest()
+        self.parses = 0
+        self._parsed = {}
+        self._compiled = {}
+        self._lock = threading.RLock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def load(self, path):
+        """The resolved, validated Profile for `path`; raises ProfileError or OSError"""
+        real = os.path.realpath(path)
+        with self._lock:
+            profile = self._compiled.get(real)
+            if profile is not None and self._fresh(profile.sources):
+                return profile
+            profile = self._load_compiled(real)
+            if profile is None:
+                params, sources = self._resolve(real, [])
+                errors, warnings = validate(params, self.schema)
+                if errors:
+                    raise ProfileError(f"{path}: " + '; '.join(errors))
+                profile = Profile(real, params, param_fingerprint(params), sources, warnings)
+                self._save_compiled(profile)
+            self._compiled[real] = profile
+            return profile
+
+    def _resolve(self, real, chain):
+        if real in chain:
+            raise ProfileError(f"{real}: circular {EXTENDS_DIRECTIVE} ({' -> '.join(chain + [real])})")
+        if len(chain) >= MAX_DEPTH:
+            raise ProfileError(f"{real}: {EXTENDS_DIRECTIVE} chain deeper than {MAX_DEPTH}")
+        extends, own = self._parse(real)
+        sources = [[real] + _stamp(real)]
+        params = {}
+        if extends:
+            base = os.path.realpath(os.path.join(os.path.dirname(real), extends))
+            params, base_sources = self._resolve(base, chain + [real])
+            sources += base_sources
+        params = dict(params, **own)
+        return params, sources
+
+    def _parse(self, real):
+        stamp = _stamp(real)
+        cached = self._parsed.get(real)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        result = parse_profile_file(real)
+        self.parses += 1
+        self._parsed[real] = (stamp, result)
+        return result
+
+    @staticmethod
+    def _fresh(sources):
+        try:
+            return all(_stamp(path) == stamp for path, *stamp in sources)
+        except OSError:
+            return False
+
+    def _cache_path(self, real):
+        return os.path.join(self.cache_dir, hashlib.sha1(real.encode('utf-8')).hexdigest() + '.json')
+
+    def _load_compiled(self, real):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(real), encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (data.get('version') != FORMAT_VERSION or data.get('schema') != self._schema_hash
+                or data.get('path') != real or not self._fresh(data['sources'])):
+            return None
+        return Profile(real, data['params'], data['fingerprint'], data['sources'], data.get('warnings', ()))
+
+    def _save_compiled(self, profile):
+        if not self.cache_dir:
+            return
+        path = self._cache_path(profile.path)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(dict(profile.to_dict(), version=FORMAT_VERSION, schema=self._schema_hash), f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass  # The cache only saves time; loading still works without it
@@ -0,0 +1,126 @@
+import json
+import os
+import time
+
+DEFAULT_DIRECTORY = '.schema_snapshots'
+ROW_CHANGE_RATIO = 0.1  # Row estimates are approximate; smaller changes are not reported
+ROW_CHANGE_MIN = 1000
+
+# Every database, joined with the tables of one of them: databases, tables,
+# row estimates and sizes in a single round trip
+TABLES_QUERY = """
+SELECT s.SCHEMA_NAME, t.TABLE_NAME, t.TABLE_TYPE, t.ENGINE, t.TABLE_ROWS, t.DATA_LENGTH, t.INDEX_LENGTH
+FROM information_schema.SCHEMATA s
+LEFT JOIN information_schema.TABLES t ON t.TABLE_SCHEMA = s.SCHEMA_NAME AND t.TABLE_SCHEMA = %s
+ORDER BY s.SCHEMA_NAME, t.TABLE_NAME
+"""
+
+COLUMNS_QUERY = """
+SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY
+FROM information_schema.COLUMNS
+WHERE TABLE_SCHEMA = %s
+ORDER BY TABLE_NAME, ORDINAL_POSITION
+"""
+
+
+def fetch_tables(cursor, database):
+    """Run TABLES_QUERY; returns (database names, {table: stats}) for `database`"""
+    cursor.execute(TABLES_QUERY, (database,))
+    databases = []
+    tables = {}
+    for schema, table, table_type, engine, rows, data_length, index_length in cursor.fetchall():
+        if not databases or databases[-1] != schema:
+            databases.append(schema)
+        if table is not None:
+            tables[table] = {'type': table_type, 'engine': engine, 'rows': rows or 0,
+                             'data_bytes': data_length or 0, 'index_bytes': index_length or 0}
+    return databases, tables
+
+
+def fetch_columns(cursor, database):
+    """Run COLUMNS_QUERY; returns {table: [[column, type, nullable, key], ...]} in column order"""
+    cursor.execute(COLUMNS_QUERY, (database,))
+    columns = {}
+    for table, column, column_type, nullable, key in cursor.fetchall():
+        columns.setdefault(table, []).append([column, column_type, nullable, key or ''])
+    return columns
+
+
+def build_snapshot(env_name, host, database, databases, tables, columns):
+    return {
+        'env_name': env_name,
+        'host': host,
+        'database': database,
+        'taken_at': time.time(),
+        'databases': list(databases),
+        'tables': {name: dict(stats, columns=columns.get(name, [])) for name, stats in sorted(tables.items())},
+    }
+
+
+def snapshot_path(env_name, directory=DEFAULT_DIRECTORY):
+    return os.path.join(directory, f"{env_name}.json")
+
+
+def load_snapshot(path):
+    """The stored snapshot, or None if there is none (or it is unreadable)"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_snapshot(path, snapshot):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def diff_snapshots(old, new):
+    """Human-readable changes from `old` to `new`, one line each; empty when nothing changed"""
+    changes = []
+    old_databases, new_databases = set(old.get('databases', [])), set(new.get('databases', []))
+    changes += [f"+ database {name}" for name in sorted(new_databases - old_databases)]
+    changes += [f"- database {name}" for name in sorted(old_databases - new_databases)]
+
+    old_tables, new_tables = old.get('tables', {}), new.get('tables', {})
+    for name in sorted(set(old_tables) | set(new_tables)):
+        if name not in old_tables:
+            changes.append(f"+ table {name} ({len(new_tables[name]['columns'])} columns, "
+                           f"~{new_tables[name]['rows']} rows)")
+            continue
+        if name not in new_tables:
+            changes.append(f"- table {name}")
+            continue
+        before, after = old_tables[name], new_tables[name]
+        old_columns = {column[0]: column for column in before['columns']}
+        new_columns = {column[0]: column for column in after['columns']}
+        for column in new_columns:
+            if column not in old_columns:
+                changes.append(f"+ column {name}.{column} {new_columns[column][1]}")
+            elif new_columns[column] != old_columns[column]:
+                changes.append(f"~ column {name}.{column} {_describe_column(old_columns[column])} -> "
+                               f"{_describe_column(new_columns[column])}")
+        changes += [f"- column {name}.{column}" for column in old_columns if column not in new_columns]
+        if abs(after['rows'] - before['rows']) > max(ROW_CHANGE_MIN, before['rows'] * ROW_CHANGE_RATIO):
+            changes.append(f"~ rows {name} ~{before['rows']} -> ~{after['rows']}")
+    return changes
+
+
+def summarize(snapshot):
+    """One line per table with rows and size, for a first snapshot that has nothing to diff against"""
+    lines = []
+    for name, stats in snapshot['tables'].items():
+        size_mb = (stats['data_bytes'] + stats['index_bytes']) / 1024 / 1024
+        lines.append(f"  - {name} ({len(stats['columns'])} columns, ~{stats['rows']} rows, {size_mb:.1f} MB)")
+    return lines
+
+
+def _describe_column(column):
+    _, column_type, nullable, key = column
+    parts = [column_type, 'NULL' if nullable == 'YES' else 'NOT NULL']
+    if key:
+        parts.append(key)
+    return ' '.join(parts)
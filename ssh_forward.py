@@ -0,0 +1,172 @@
+import select
+import socket
+import threading
+
+CONNECT_TIMEOUT = 10
+KEEPALIVE_INTERVAL = 30
+CHANNEL_OPEN_TIMEOUT = 10
+BUFFER_SIZE = 32 * 1024
+
+
+class LocalForward:
+    """Forwards connections on an OS-assigned local port to remote_host:remote_port over SSH
+
+    The first channel is opened up front, so by the time the forward is
+    returned the bastion has already reached the remote host and `ready` is
+    set; that channel is handed to the first local connection.
+    """
+
+    def __init__(self, transport, remote_host, remote_port, bind_host='127.0.0.1',
+                 open_timeout=CHANNEL_OPEN_TIMEOUT):
+        self.transport = transport
+        self.remote_host = remote_host
+        self.remote_port = remote_port
+        self.open_timeout = open_timeout
+        self.ready = threading.Event()
+        self._closed = threading.Event()
+        self._lock = threading.Lock()
+
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.bind((bind_host, 0))
+        self._listener.listen(16)
+        self.local_port = self._listener.getsockname()[1]
+
+        try:
+            self._spare_channel = self._open_channel()
+        except Exception:
+            self._listener.close()
+            raise
+        self.ready.set()
+
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True,
+                                        name=f"forward-{self.local_port}")
+        self._thread.start()
+
+    @property
+    def closed(self):
+        return self._closed.is_set()
+
+    def _open_channel(self):
+        return self.transport.open_channel(
+            'direct-tcpip',
+            (self.remote_host, self.remote_port),
+            ('127.0.0.1', self.local_port),
+            timeout=self.open_timeout,
+        )
+
+    def _accept_loop(self):
+        while not self._closed.is_set():
+            try:
+                client, _ = self._listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(client,), daemon=True).start()
+
+    def _handle(self, client):
+        with self._lock:
+            channel, self._spare_channel = self._spare_channel, None
+        try:
+            if channel is None or channel.closed:
+                channel = self._open_channel()
+        except Exception:
+            client.close()
+            return
+        try:
+            _pump(client, channel, self._closed)
+        finally:
+            channel.close()
+            client.close()
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        try:
+            self._listener.close()
+        except OSError:
+            pass
+        with self._lock:
+            channel, self._spare_channel = self._spare_channel, None
+        if channel is not None:
+            channel.close()
+
+
+class SSHForwarder:
+    """One authenticated SSH transport to the bastion, shared by any number of local forwards"""
+
+    def __init__(self, host, port, username, key_path, connect_timeout=CONNECT_TIMEOUT,
+                 keepalive=KEEPALIVE_INTERVAL):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.key_path = key_path
+        self.connect_timeout = connect_timeout
+        self.keepalive = keepalive
+        self._client = None
+        self._forwards = []
+        self._lock = threading.Lock()
+
+    @property
+    def connected(self):
+        transport = self._client.get_transport() if self._client else None
+        return bool(transport and transport.is_active())
+
+    def connect(self):
+        """Open (or reuse) the SSH transport to the bastion"""
+        with self._lock:
+            if self.connected:
+                return self._client.get_transport()
+            import paramiko  # pulls in cryptography; slow to import, so only on first connect
+
+            client = paramiko.SSHClient()
+            # Same trust model as `ssh -o StrictHostKeyChecking=no`
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            client.connect(
+                self.host,
+                port=self.port,
+                username=self.username,
+                key_filename=self.key_path,
+                timeout=self.connect_timeout,
+                banner_timeout=self.connect_timeout,
+                auth_timeout=self.connect_timeout,
+                look_for_keys=False,
+                allow_agent=False,
+            )
+            transport = client.get_transport()
+            transport.set_keepalive(self.keepalive)
+            self._client = client
+            return transport
+
+    def forward(self, remote_host, remote_port, open_timeout=CHANNEL_OPEN_TIMEOUT):
+        """Start a local forward to remote_host:remote_port; returns once it is ready"""
+        transport = self.connect()
+        forward = LocalForward(transport, remote_host, remote_port, open_timeout=open_timeout)
+        with self._lock:
+            self._forwards = [f for f in self._forwards if not f.closed]
+            self._forwards.append(forward)
+        return forward
+
+    def close(self):
+        with self._lock:
+            forwards, self._forwards = self._forwards, []
+            client, self._client = self._client, None
+        for forward in forwards:
+            forward.close()
+        if client is not None:
+            client.close()
+
+
+def _pump(sock, channel, stop_event):
+    """Copy bytes both ways between a local socket and an SSH channel until either side closes"""
+    while not stop_event.is_set():
+        readable, _, _ = select.select([sock, channel], [], [], 1.0)
+        if sock in readable:
+            data = sock.recv(BUFFER_SIZE)
+            if not data:
+                return
+            channel.sendall(data)
+        if channel in readable:
+            data = channel.recv(BUFFER_SIZE)
+            if not data:
+                return
+            sock.sendall(data)
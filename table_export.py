@@ -0,0 +1,189 @@
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import tracer
+
+DEFAULT_CHUNK_SIZE = 10000  # Rows fetched from the server per round trip
+NET_WRITE_TIMEOUT = 600  # Server waits this long for us while we compress and write a chunk
+CSV_NULL = r'\N'  # How NULL is written in CSV, as LOAD DATA INFILE reads it back
+FORMATS = ('csv', 'ndjson')
+HEX_SUFFIX = ':hex'  # Marks a binary column in the CSV header or NDJSON keys; its values are hex
+
+_INTEGER_TYPE_RE = re.compile(r'^(?:tiny|small|medium|big)?int\b')
+_BINARY_TYPE_RE = re.compile(r'^(?:(?:tiny|medium|long)?blob|(?:var)?binary|bit)\b')
+
+
+def server_side_cursor(connection):
+    """An unbuffered pymysql cursor: rows stream from the server instead of being loaded all at once"""
+    import pymysql.cursors
+
+    return connection.cursor(pymysql.cursors.SSCursor)
+
+
+def quote_identifier(name):
+    return '`' + str(name).replace('`', '``') + '`'
+
+
+def export_path(directory, table, fmt):
+    return os.path.join(directory, f"{table}.{fmt}.gz")
+
+
+def binary_columns(columns):
+    """Names of the BLOB, BINARY and BIT columns among [[column, type, nullable, key], ...]"""
+    return {column[0] for column in columns if _BINARY_TYPE_RE.match(column[1].lower())}
+
+
+class ExportTask:
+    """One table, or one primary-key range of it, exported on its own connection"""
+
+    def __init__(self, table, part=0, key=None, low=None, high=None):
+        self.table = table
+        self.part = part
+        self.key = key
+        self.low = low
+        self.high = high
+
+    def query(self):
+        sql = f"SELECT * FROM {quote_identifier(self.table)}"
+        if self.key is None:
+            return sql, ()
+        key = quote_identifier(self.key)
+        return f"{sql} WHERE {key} >= %s AND {key} < %s ORDER BY {key}", (self.low, self.high)
+
+
+def plan_tasks(connection, table, columns, split=1):
+    """Split a table into `split` primary-key ranges when it has a single integer primary key
+
+    Tables without one (or with split <= 1) are exported as a single task.
+    """
+    keys = [column for column in columns if column[3] == 'PRI']
+    if split <= 1 or len(keys) != 1 or not _INTEGER_TYPE_RE.match(keys[0][1].lower()):
+        return [ExportTask(table)]
+    key = keys[0][0]
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN({quote_identifier(key)}), MAX({quote_identifier(key)}) "
+                       f"FROM {quote_identifier(table)}")
+        low, high = cursor.fetchone()
+    if low is None:
+        return [ExportTask(table)]
+    step = max(1, (high - low + 1 + split - 1) // split)
+    return [ExportTask(table, part, key, start, min(start + step, high + 1))
+            for part, start in enumerate(range(low, high + 1, step))]
+
+
+def write_rows(cursor, path, fmt, header, chunk_size=DEFAULT_CHUNK_SIZE, hex_columns=()):
+    """Stream an executed cursor into a gzip file, `chunk_size` rows at a time; returns the row count
+
+    `hex_columns` are named with HEX_SUFFIX, so a loader knows to decode them.
+    """
+    rows = 0
+    with gzip.open(path, 'wb', compresslevel=6) as raw:
+        out = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+        columns = [name + HEX_SUFFIX if name in hex_columns else name
+                   for name in (description[0] for description in cursor.description)]
+        writer = csv.writer(out) if fmt == 'csv' else None
+        if writer and header:
+            writer.writerow(columns)
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            if writer:
+                writer.writerows([CSV_NULL if value is None else _text(value) for value in row] for row in chunk)
+            else:
+                out.write(''.join(json.dumps(dict(zip(columns, row)), default=_text, ensure_ascii=False) + '\n'
+                                  for row in chunk))
+            rows += len(chunk)
+        out.flush()
+        out.detach()
+    return rows
+
+
+def run_task(connection, task, path, fmt, chunk_size=DEFAULT_CHUNK_SIZE, cursor_factory=server_side_cursor,
+             hex_columns=()):
+    started = time.perf_counter()
+    with connection.cursor() as cursor:
+        cursor.execute(f"SET SESSION net_write_timeout = {NET_WRITE_TIMEOUT}")
+    cursor = cursor_factory(connection)
+    try:
+        cursor.execute(*task.query())
+        rows = write_rows(cursor, path, fmt, header=task.part == 0, chunk_size=chunk_size, hex_columns=hex_columns)
+    finally:
+        cursor.close()
+    tracer.add_time('export_part', time.perf_counter() - started)
+    return rows
+
+
+def export_tables(session, tables, directory, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE, workers=1, split=1,
+                  cursor_factory=server_side_cursor):
+    """Export `tables` of the session's database to `directory` as <table>.<fmt>.gz
+
+    Rows are streamed through a server-side cursor, so memory use does not
+    grow with table size. With `workers` > 1 tables (and, with `split` > 1,
+    primary-key ranges of a table) are exported at the same time, each on
+    its own connection over the session's forward; the parts of a table are
+    joined into one file (concatenated gzip members). A table listed twice
+    is exported once. Binary values (BLOB, BINARY, BIT) are written as hex
+    in columns named with HEX_SUFFIX, which fixture_seed decodes on load.
+    Returns a list of {table, path, rows, bytes, seconds, parts} dicts.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r} (expected one of {', '.join(FORMATS)})")
+    tables = list(dict.fromkeys(tables))
+    os.makedirs(directory, exist_ok=True)
+    columns = session.columns()
+    missing = [table for table in tables if table not in columns]
+    if missing:
+        raise ValueError(f"no such table in {session.database}: {', '.join(missing)}")
+
+    tasks = []
+    for table in tables:
+        tasks += plan_tasks(session.connection, table, columns[table], split if workers > 1 else 1)
+
+    def part_path(task):
+        return f"{export_path(directory, task.table, fmt)}.part{task.part}"
+
+    def run(task):
+        started = time.perf_counter()
+        hex_columns = binary_columns(columns[task.table])
+        if workers <= 1:
+            rows = run_task(session.connection, task, part_path(task), fmt, chunk_size, cursor_factory, hex_columns)
+        else:
+            connection = session.open_connection()
+            try:
+                rows = run_task(connection, task, part_path(task), fmt, chunk_size, cursor_factory, hex_columns)
+            finally:
+                connection.close()
+        return task, rows, time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='export') as pool:
+        finished = list(pool.map(run, tasks))
+
+    results = []
+    for table in tables:
+        parts = [(task, rows, seconds) for task, rows, seconds in finished if task.table == table]
+        path = export_path(directory, table, fmt)
+        with open(path, 'wb') as out:
+            for task, _, _ in sorted(parts, key=lambda part: part[0].part):
+                with open(part_path(task), 'rb') as part:
+                    shutil.copyfileobj(part, out)
+                os.remove(part_path(task))
+        results.append({'table': table, 'path': path, 'rows': sum(rows for _, rows, _ in parts),
+                        'bytes': os.path.getsize(path), 'seconds': max(seconds for _, _, seconds in parts),
+                        'parts': len(parts)})
+    return results
+
+
+def _text(value):
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value) if not isinstance(value, (int, float, str)) else value
@@ -0,0 +1,112 @@
+import http.client
+import os
+import socket
+import stat
+import threading
+
+import pytest
+
+from broker import Broker, load_token, make_server
+
+
+class FakeForward:
+    def __init__(self, port):
+        self.local_port = port
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_broker(builds):
+    opened = []
+
+    def lookup(env_name):
+        number = builds[env_name]
+        return number, 'SUCCESS', {'mysql_ips': [f"10.0.0.{number}"], 'mysql_user': 'u', 'mysql_pass': 'p'}
+
+    def open_mysql(info):
+        forward = FakeForward(40000 + len(opened))
+        opened.append(forward)
+        return info['mysql_ips'][0], forward
+
+    return Broker(lookup, lambda params: {}, open_mysql, ttl=0), opened
+
+
+@pytest.fixture
+def tcp_server(tmp_path):
+    broker, _ = make_broker({'nvd': 1})
+    token = load_token(str(tmp_path / 'token'))
+    server = make_server(broker, '127.0.0.1', 0, token=token)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address[1], token
+    server.shutdown()
+    server.server_close()
+
+
+def _get(port, path, headers):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    try:
+        connection.request('GET', path, headers=headers)
+        return connection.getresponse().status
+    finally:
+        connection.close()
+
+
+def test_tcp_requests_need_the_token(tcp_server):
+    port, token = tcp_server
+    assert _get(port, '/env/nvd', {'Authorization': f"Bearer {token}"}) == 200
+    assert _get(port, '/env/nvd', {}) == 403
+    assert _get(port, '/env/nvd', {'Authorization': 'Bearer wrong'}) == 403
+
+
+def test_tcp_requests_need_a_local_host_header(tcp_server):
+    port, token = tcp_server
+    auth = {'Authorization': f"Bearer {token}"}
+    assert _get(port, '/health', dict(auth, Host=f"localhost:{port}")) == 200
+    assert _get(port, '/health', dict(auth, Host=f"attacker.example:{port}")) == 403
+
+
+def test_token_file_is_private_and_stable(tmp_path):
+    path = str(tmp_path / 'token')
+    token = load_token(path)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert load_token(path) == token
+
+
+def test_tcp_without_token_is_refused():
+    broker, _ = make_broker({})
+    with pytest.raises(ValueError):
+        make_server(broker, '127.0.0.1', 0)
+
+
+def test_unix_socket_is_private_and_only_stale_sockets_are_replaced(tmp_path):
+    broker, _ = make_broker({})
+    path = str(tmp_path / 'broker.sock')
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+    server = make_server(broker, socket_path=path)
+    try:
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+        with pytest.raises(OSError):
+            make_server(broker, socket_path=path)
+    finally:
+        server.server_close()
+    regular = tmp_path / 'not-a-socket'
+    regular.write_text('keep me')
+    with pytest.raises(OSError):
+        make_server(broker, socket_path=str(regular))
+    assert regular.read_text() == 'keep me'
+
+
+def test_forwards_are_replaced_when_the_build_changes():
+    builds = {'nvd': 1}
+    broker, opened = make_broker(builds)
+    first = broker.mysql('nvd')
+    assert broker.mysql('nvd')['local_port'] == first['local_port']
+    builds['nvd'] = 2
+    second = broker.mysql('nvd')
+    assert second['mysql_host'] == '10.0.0.2'
+    assert opened[0].closed and not opened[1].closed
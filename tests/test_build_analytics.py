@@ -0,0 +1,33 @@
+import gzip
+
+import build_analytics
+
+
+def _write_console(tmp_path, text):
+    path = tmp_path / '1.log.gz'
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write(text)
+    return str(path)
+
+
+def test_failed_stage_is_the_stage_of_the_first_error(tmp_path):
+    path = _write_console(tmp_path, "[Pipeline] { (Checkout)\n[Pipeline] { (Deploy)\nERROR: boom\n"
+                                    "[Pipeline] { (Cleanup)\n")
+    parsed = build_analytics.parse_console(path)
+    assert parsed['failed_stage'] == 'Deploy' and parsed['error'] == 'boom'
+
+
+def test_failed_stage_is_unknown_without_an_error_line(tmp_path):
+    path = _write_console(tmp_path, "[Pipeline] { (Checkout)\n[Pipeline] { (Cleanup)\nAborted by admin\n")
+    parsed = build_analytics.parse_console(path)
+    assert parsed['failed_stage'] is None
+    record = {'result': 'ABORTED', 'params': {}, 'stages': {}, 'duration': 1, 'timestamp': 0,
+              'failed_stage': parsed['failed_stage'], 'error': parsed['error'], 'missing_fields': []}
+    assert build_analytics.summarize([record])['failure_stages'] == {'(unknown)': 1}
+
+
+def test_lines_merely_starting_with_error_are_not_errors(tmp_path):
+    path = _write_console(tmp_path, "[Pipeline] { (Test)\nErrors: 0\nErrorDocument 404 /404.html\n"
+                                    "[Pipeline] { (Deploy)\nError: connection refused\n")
+    parsed = build_analytics.parse_console(path)
+    assert parsed['error'] == 'connection refused' and parsed['failed_stage'] == 'Deploy'
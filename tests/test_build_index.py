@@ -0,0 +1,120 @@
+import re
+import threading
+import time
+
+from build_index import BuildIndex
+from jenkins_client import JenkinsClient
+
+TREE = 'number,result,building,actions[_class,parameters[name,value]]'
+_RANGE_RE = re.compile(r'\{(\d+),(\d+)\}$')
+
+
+class FakeJenkins:
+    """Serves `tree=builds[...]{start,end}` pages of a fake history through the real iter_builds"""
+
+    iter_builds = JenkinsClient.iter_builds
+
+    def __init__(self, builds):
+        self.builds = builds  # newest first
+        self.pages = []
+
+    def job_url(self, job, *parts):
+        return '/'.join([job] + [str(part) for part in parts])
+
+    def get_json(self, url, params=None, max_age=None):
+        match = _RANGE_RE.search(params['tree'])
+        if match is None:
+            number = int(url.split('/')[1])
+            return next(build for build in self.builds if build['number'] == number)
+        start, end = int(match.group(1)), int(match.group(2))
+        self.pages.append((start, end))
+        return {'builds': self.builds[start:end]}
+
+    def add(self, build):
+        self.builds.insert(0, build)
+
+
+def _build(number, env_name, result='SUCCESS'):
+    return {'number': number, 'result': result, 'building': result is None,
+            'actions': [{'_class': 'hudson.model.ParametersAction',
+                         'parameters': [{'name': 'ENV_NAME', 'value': env_name}]}]}
+
+
+def _history(count, env_at):
+    """`count` builds numbered count..1, env 'nvd' only at the given numbers"""
+    return [_build(number, 'nvd' if number in env_at else f"e{number}") for number in range(count, 0, -1)]
+
+
+def test_iter_builds_stops_at_max_builds_and_at_the_end_of_history():
+    jenkins = FakeJenkins(_history(60, set()))
+    assert len(list(jenkins.iter_builds('job', TREE, batch_size=25, max_builds=30))) == 30
+    assert jenkins.pages == [(0, 25), (25, 30)]
+    jenkins.pages = []
+    assert len(list(jenkins.iter_builds('job', TREE, batch_size=25))) == 60
+    assert jenkins.pages == [(0, 25), (25, 50), (50, 75)]
+    jenkins.pages = []
+    assert [b['number'] for b in jenkins.iter_builds('job', TREE, batch_size=25, start=55)] == [5, 4, 3, 2, 1]
+
+
+def test_cold_refresh_stops_at_the_first_deciding_build(tmp_path):
+    jenkins = FakeJenkins(_history(500, {499}))
+    index = BuildIndex(str(tmp_path / 'index.sqlite3'))
+    index.refresh(jenkins, 'job', TREE, batch_size=25, max_builds=500, env_name='nvd')
+    assert jenkins.pages == [(0, 25)]
+    assert index.builds_for_env('job', 'nvd')[0]['number'] == 499
+    assert index.coverage('job') == (499, False)
+
+
+def test_backfill_pages_on_from_the_cached_history_when_needed(tmp_path):
+    jenkins = FakeJenkins(_history(500, {499, 420}))
+    index = BuildIndex(str(tmp_path / 'index.sqlite3'))
+    index.refresh(jenkins, 'job', TREE, batch_size=25, max_builds=500, env_name='nvd')
+    jenkins.pages = []
+    jenkins.add(_build(501, 'other'))
+    index.refresh(jenkins, 'job', TREE, batch_size=25, max_builds=500, env_name='xyr')
+    # One page of new builds, then older history from where the cold refresh stopped, to the end
+    assert jenkins.pages[0] == (0, 25)
+    assert jenkins.pages[1][0] == 2 and jenkins.pages[-1][1] == 500
+    assert index.coverage('job')[1] is True
+    jenkins.pages = []
+    index.refresh(jenkins, 'job', TREE, batch_size=25, max_builds=500, env_name='xyr', max_age=60)
+    assert jenkins.pages == []
+
+
+def test_backfill_does_not_skip_history_after_jenkins_discards_cached_builds(tmp_path):
+    jenkins = FakeJenkins(_history(500, {480}))
+    jenkins.builds[25]['actions'][0]['parameters'][0]['value'] = 'abc'  # build #475
+    index = BuildIndex(str(tmp_path / 'index.sqlite3'))
+    index.refresh(jenkins, 'job', TREE, batch_size=25, max_builds=500, env_name='nvd')
+    assert index.coverage('job') == (480, False)
+    jenkins.builds = [build for build in jenkins.builds if not 481 <= build['number'] <= 490]
+    index.refresh(jenkins, 'job', TREE, batch_size=25, max_builds=500, env_name='abc')
+    assert [build['number'] for build in index.builds_for_env('job', 'abc')] == [475]
+
+def test_failed_builds_do_not_stop_the_cold_refresh(tmp_path):
+    builds = _history(100, set())
+    builds[0] = _build(100, 'nvd', result='FAILURE')
+    builds[40] = _build(60, 'nvd')
+    jenkins = FakeJenkins(builds)
+    index = BuildIndex(str(tmp_path / 'index.sqlite3'))
+    index.refresh(jenkins, 'job', TREE, batch_size=25, max_builds=500, env_name='nvd')
+    assert jenkins.pages == [(0, 25), (25, 50)]
+    assert [b['number'] for b in index.builds_for_env('job', 'nvd')] == [100, 60]
+
+
+def test_concurrent_refreshes_run_once(tmp_path):
+    class SlowJenkins(FakeJenkins):
+        def get_json(self, url, params=None, max_age=None):
+            time.sleep(0.05)
+            return super().get_json(url, params, max_age)
+
+    jenkins = SlowJenkins(_history(30, {29}))
+    index = BuildIndex(str(tmp_path / 'index.sqlite3'))
+    threads = [threading.Thread(target=index.refresh, args=(jenkins, 'job', TREE),
+                                kwargs={'batch_size': 25, 'max_builds': 500, 'max_age': 60, 'env_name': 'nvd'})
+               for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert jenkins.pages == [(0, 25)]
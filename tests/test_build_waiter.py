@@ -0,0 +1,76 @@
+import pytest
+
+import build_waiter
+from build_waiter import PollSchedule, WaitTimeout, wait_for_queue
+
+
+class FakeClock:
+    """Stands in for the time module: sleeping only moves the clock"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(build_waiter, 'time', clock)
+    return clock
+
+
+def _schedule(clock, elapsed, estimated=600):
+    return PollSchedule(estimated_ms=estimated * 1000, started_ms=(clock.now - elapsed) * 1000,
+                        min_interval=2, max_interval=60)
+
+
+def test_polls_are_sparse_early_and_dense_near_the_eta(clock):
+    assert _schedule(clock, elapsed=0).next_interval() == 60  # halfway to the ETA, capped at max
+    assert _schedule(clock, elapsed=520).next_interval() == 40
+    assert _schedule(clock, elapsed=590).next_interval() == 5
+    assert _schedule(clock, elapsed=599).next_interval() == 2  # clamped to min
+    assert _schedule(clock, elapsed=900).next_interval() == 2  # overdue
+
+
+def test_without_an_estimate_polls_at_the_fixed_interval(clock):
+    assert PollSchedule().next_interval() == build_waiter.UNKNOWN_ESTIMATE_INTERVAL
+    assert PollSchedule(min_interval=20).next_interval() == 20
+
+
+class QueueClient:
+    def __init__(self, answers):
+        self.answers = list(answers)
+
+    def get_json(self, url, params=None, max_age=None):
+        answer = self.answers.pop(0) if len(self.answers) > 1 else self.answers[0]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+def test_wait_for_queue_backs_off_until_the_build_starts(clock):
+    client = QueueClient([{'why': 'busy'}, ConnectionError('down'), {'why': 'busy'}, {'executable': {'number': 7}}])
+    assert wait_for_queue(client, 'queue/item/1/', timeout=60) == 7
+    assert clock.sleeps == [0.5, 1, 2]
+
+
+def test_wait_for_queue_returns_none_when_cancelled(clock):
+    assert wait_for_queue(QueueClient([{'why': 'busy'}, {'cancelled': True}]), 'queue/item/1/', timeout=60) is None
+
+
+def test_wait_for_queue_times_out_at_the_deadline(clock):
+    started = clock.now
+    with pytest.raises(WaitTimeout):
+        wait_for_queue(QueueClient([{'why': 'busy'}]), 'queue/item/1/', timeout=30, max_interval=8)
+    assert clock.now - started == 30
+    assert max(clock.sleeps) == 8
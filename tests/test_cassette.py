@@ -0,0 +1,121 @@
+import socket
+import time
+import types
+
+import pytest
+
+from cassette import REPLAY, RECORD, Cassette, CassetteMiss, RecordedError, VirtualClock
+
+
+class FakeForward:
+    def __init__(self, port):
+        self.local_port = port
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeForwarder:
+    connected = True
+
+    def forward(self, remote_host, remote_port):
+        if remote_host == 'gone.internal':
+            raise socket.gaierror(-2, 'Name or service not known')
+        return FakeForward(33060)
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    description = None
+    rowcount = -1
+
+    def execute(self, sql, args=None):
+        if sql.startswith('BROKEN'):
+            raise RuntimeError(1064, 'You have an error in your SQL syntax')
+        self.description = [('Database', 253)]
+        self._rows = [('cloudways_new',), ('mysql',)]
+        self.rowcount = 2
+        return 2
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def cursor(self):
+        return FakeCursor()
+
+
+def _run(cassette):
+    forwarder = cassette.forwarder(FakeForwarder())
+    with pytest.raises(Exception, match='Name or service not known'):
+        forwarder.forward('gone.internal', 3306)
+    forward = forwarder.forward('10.0.0.5', 3306)
+    connection = cassette.connection_hook(lambda settings: FakeConnection(),
+                                          {'host': '127.0.0.1', 'port': forward.local_port, 'user': 'u',
+                                           'database': None})
+    cursor = connection.cursor()
+    cursor.execute('SHOW DATABASES')
+    rows = cursor.fetchall()
+    with pytest.raises(Exception, match='SQL syntax'):
+        connection.cursor().execute('BROKEN')
+    return rows
+
+
+def test_round_trip_replays_successes_and_failures(tmp_path):
+    path = str(tmp_path / 'run.json')
+    recording = Cassette(path, RECORD)
+    recorded_rows = _run(recording)
+    recording.close()
+
+    replaying = Cassette(path, REPLAY)
+    try:
+        assert _run(replaying) == recorded_rows == [('cloudways_new',), ('mysql',)]
+        with pytest.raises(CassetteMiss):
+            replaying.forwarder(None).forward('never.recorded', 3306)
+    finally:
+        replaying.close()
+
+
+def test_replayed_forward_failure_is_a_recorded_error(tmp_path):
+    path = str(tmp_path / 'run.json')
+    recording = Cassette(path, RECORD)
+    with pytest.raises(socket.gaierror):
+        recording.forwarder(FakeForwarder()).forward('gone.internal', 3306)
+    recording.close()
+    replaying = Cassette(path, REPLAY)
+    with pytest.raises(RecordedError):
+        replaying.forwarder(None).forward('gone.internal', 3306)
+    replaying.close()
+
+
+def test_virtual_clock_only_affects_installed_modules():
+    module = types.ModuleType('clocked')
+    module.time = time
+    real_sleep = time.sleep
+    clock = VirtualClock()
+    with clock.installed([module]):
+        before = module.time.time()
+        module.time.sleep(3600)
+        assert module.time.time() - before >= 3600
+        assert module.time.perf_counter is time.perf_counter
+        assert time.sleep is real_sleep
+        assert time.time() - before < 60
+    assert module.time is time
+
+
+def test_replay_cassette_restores_modules_on_close(tmp_path):
+    path = str(tmp_path / 'run.json')
+    Cassette(path, RECORD).close()
+    module = types.ModuleType('clocked')
+    module.time = time
+    replaying = Cassette(path, REPLAY, clock_modules=[module])
+    assert module.time is not time
+    replaying.close()
+    assert module.time is time
@@ -0,0 +1,44 @@
+import threading
+
+from coordination import TriggerLocks
+
+
+def test_claim_lifecycle(tmp_path):
+    locks = TriggerLocks(str(tmp_path))
+    with locks.claim('nvd') as claim:
+        assert claim.build_number is None
+        claim.publish(42, {'ENV_NAME': 'nvd'})
+    with locks.claim('nvd') as claim:
+        assert claim.build_number == 42
+        assert claim.params == {'ENV_NAME': 'nvd'}
+    with locks.claim('xyr') as claim:
+        assert claim.build_number is None
+
+
+def test_expired_claim_is_ignored(tmp_path):
+    with TriggerLocks(str(tmp_path)).claim('nvd') as claim:
+        claim.publish(42, {'ENV_NAME': 'nvd'})
+    with TriggerLocks(str(tmp_path), claim_ttl=-1).claim('nvd') as claim:
+        assert claim.build_number is None
+
+
+def test_waiters_see_the_leaders_build(tmp_path):
+    locks = TriggerLocks(str(tmp_path))
+    seen = []
+    triggered = []
+
+    def provision():
+        with locks.claim('nvd') as claim:
+            if claim.build_number:
+                seen.append(claim.build_number)
+            else:
+                triggered.append(1)
+                claim.publish(7, {'ENV_NAME': 'nvd'})
+
+    threads = [threading.Thread(target=provision) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert triggered == [1]
+    assert seen == [7] * 7
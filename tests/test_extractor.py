@@ -0,0 +1,111 @@
+import random
+
+from benchmarks.bench_extract import legacy_extract_info
+from extractor import ConsoleExtractor, extract_from_text
+
+
+def _normalise(info):
+    info = dict(info)
+    if 'mysql_ips' in info:
+        info['mysql_ips'] = sorted(info['mysql_ips'])
+    return info
+
+
+def _feed_chunks(chunks, stop_early=True):
+    extractor = ConsoleExtractor(stop_early=stop_early)
+    for chunk in chunks:
+        if extractor.feed(chunk):
+            break
+    extractor.close()
+    return _normalise(extractor.result())
+
+
+def _ip(rng):
+    return '.'.join(str(rng.randint(0, 255)) for _ in range(4))
+
+
+def _random_log(rng):
+    lines = []
+    for _ in range(rng.randint(1, 15)):
+        kind = rng.random()
+        if kind < 0.2:
+            lines.append('')
+        elif kind < 0.4:
+            lines.append(_ip(rng))
+        elif kind < 0.5:
+            lines.append('MySQL private HOST:' + rng.choice(['', ' ' + _ip(rng)]))
+        elif kind < 0.6:
+            lines.append('Instance PrivateIP:' + rng.choice(['', ' ' + _ip(rng), f" {_ip(rng)} x", '  ']))
+        elif kind < 0.75:
+            lines.append(rng.choice(['ELK EndPoint:', 'MySQL User:', 'MySQL Pass:'])
+                         + rng.choice(['', ' v' + str(rng.randint(0, 9)), '  ']))
+        elif kind < 0.85:
+            lines.append('filler ' + rng.choice(['', 'text', _ip(rng)]))
+        else:
+            lines.append(f" {_ip(rng)} ")
+    return '\n'.join(lines) + rng.choice(['', '\n'])
+
+
+def _random_chunks(rng, text):
+    chunks = []
+    pos = 0
+    while pos < len(text):
+        size = rng.randint(1, 8)
+        chunks.append(text[pos:pos + size])
+        pos += size
+    return chunks
+
+
+def test_matches_legacy_parser_on_chunked_input():
+    rng = random.Random(1)
+    for _ in range(3000):
+        text = _random_log(rng)
+        expected = _normalise(legacy_extract_info(text))
+        assert _normalise(extract_from_text(text, stop_early=False)) == expected, text
+        assert _feed_chunks(_random_chunks(rng, text), stop_early=False) == expected, text
+
+
+def test_stopping_early_only_skips_later_ip_blocks():
+    rng = random.Random(2)
+    for _ in range(3000):
+        text = _random_log(rng)
+        expected = _normalise(legacy_extract_info(text))
+        whole = _normalise(extract_from_text(text))
+        assert _feed_chunks(_random_chunks(rng, text)) == whole, text
+        assert set(whole.get('mysql_ips', [])) <= set(expected.get('mysql_ips', [])), text
+        assert {k: v for k, v in whole.items() if k != 'mysql_ips'} == \
+            {k: v for k, v in expected.items() if k != 'mysql_ips'}, text
+
+
+def _full_log(tail):
+    return ("ELK EndPoint: elk\nScannerapi EndPoint: scan\nALB EndPoint: alb\ncnc EndPoint: cnc\n"
+            "api-endpoint: api\nInstance PrivateIP: 10.0.0.9\nMySQL User: admin\nMySQL Pass: secret\n"
+            "pgSQL private HOST: pg\npgSQL User: pguser\npgSQL Pass: pgpass\n"
+            "MySQL private HOST:\n10.0.0.1\n\n\n" + tail)
+
+
+def test_stops_once_every_field_and_the_first_mysql_block_are_read():
+    extractor = ConsoleExtractor()
+    assert extractor.feed(_full_log("MySQL private HOST:\n10.0.0.2\n"))
+    assert extractor.result()['mysql_ips'] == ['10.0.0.1']
+
+
+def test_without_stop_early_later_mysql_blocks_are_collected():
+    info = extract_from_text(_full_log("MySQL private HOST:\n10.0.0.2\n"), stop_early=False)
+    assert info['mysql_ips'] == ['10.0.0.1', '10.0.0.2']
+
+
+def test_blank_line_at_chunk_boundary_counts_towards_ip_block():
+    chunks = ["MySQL private HOST:\n10.0.0.1\n", "\n", "\n", "Instance PrivateIP: 10.9.9.9\n"]
+    assert _feed_chunks(chunks)['mysql_ips'] == ['10.0.0.1']
+
+
+def test_blank_line_at_chunk_boundary_ends_ip_pair():
+    chunks = ["Instance PrivateIP: 10.0.0.1\n", "\n", "10.0.0.2\n"]
+    assert _feed_chunks(chunks)['private_ips'] == '10.0.0.1'
+
+
+def test_every_mysql_host_block_is_collected():
+    text = ("MySQL User: admin\nMySQL Pass: secret\nMySQL private HOST:\n10.0.0.1\n\n\n\n"
+            "MySQL private HOST:\n10.0.0.2\n")
+    assert _normalise(extract_from_text(text, stop_early=False))['mysql_ips'] == ['10.0.0.1', '10.0.0.2']
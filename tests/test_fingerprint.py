@@ -0,0 +1,23 @@
+import pytest
+
+from fingerprint import MATCH_ENV, MATCH_EXACT, MATCH_SUPERSET, param_differences, param_fingerprint
+
+
+def test_fingerprint_ignores_order_whitespace_and_empty_values():
+    assert param_fingerprint({'A': ' 1 ', 'B': True, 'C': ''}) == param_fingerprint({'B': 'true', 'A': '1'})
+
+
+@pytest.mark.parametrize('mode, expected', [
+    (MATCH_ENV, []),
+    (MATCH_SUPERSET, [('BRANCH', 'main', 'dev')]),
+    (MATCH_EXACT, [('BRANCH', 'main', 'dev'), ('EXTRA', None, '1')]),
+])
+def test_param_differences(mode, expected):
+    requested = {'ENV_NAME': 'nvd', 'BRANCH': 'main'}
+    build = {'ENV_NAME': 'nvd', 'BRANCH': 'dev', 'EXTRA': '1'}
+    assert param_differences(requested, build, mode) == expected
+
+
+def test_param_differences_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        param_differences({}, {}, 'fuzzy')
@@ -0,0 +1,51 @@
+import fixture_seed
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, args=None):
+        self.connection.statements.append(sql)
+
+    def fetchone(self):
+        return (self.connection.max_allowed_packet,)
+
+    def executemany(self, sql, rows):
+        self.connection.batches.append(list(rows))
+
+
+class FakeConnection:
+    def __init__(self, max_allowed_packet):
+        self.max_allowed_packet = max_allowed_packet
+        self.statements = []
+        self.batches = []
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+def test_batches_stay_under_the_servers_packet_limit(tmp_path):
+    path = tmp_path / '01_users.csv'
+    path.write_text('id,name\n' + ''.join(f"{i},{'x' * 100}\n" for i in range(1000)))
+    connection = FakeConnection(max_allowed_packet=4096)
+    results = fixture_seed.seed_fixtures(connection, [str(tmp_path)])
+    assert results[0]['table'] == 'users' and results[0]['rows'] == 1000
+    assert sum(len(batch) for batch in connection.batches) == 1000
+    limit = 4096 * fixture_seed.PACKET_SHARE
+    for batch in connection.batches:
+        assert sum(len(str(value)) + fixture_seed.ROW_OVERHEAD for row in batch[:-1] for value in row) < limit
+    assert connection.statements[-1] == "SET SESSION unique_checks = 1, foreign_key_checks = 1"
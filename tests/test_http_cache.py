@@ -0,0 +1,72 @@
+import time
+
+from http_cache import CacheEntry, ResponseCache
+from jenkins_client import JenkinsClient
+
+
+class FakeResponse:
+    def __init__(self, status_code, text='', headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+
+class CachingClient:
+    """The real JenkinsClient.get_json over scripted responses instead of a requests session"""
+
+    get_json = JenkinsClient.get_json
+    url = JenkinsClient.url
+
+    def __init__(self, responses, cache):
+        self.base_url = 'https://jenkins'
+        self.cache = cache
+        self.responses = list(responses)
+        self.sent = []
+
+    def get(self, url, params=None, headers=None, **kwargs):
+        self.sent.append(dict(headers or {}))
+        return self.responses.pop(0)
+
+    def _record(self, label, elapsed, failed):
+        pass
+
+
+def test_304_revalidation_reuses_the_cached_body():
+    client = CachingClient([FakeResponse(200, '{"builds": [1]}', {'ETag': '"v1"'}), FakeResponse(304)],
+                           ResponseCache())
+    first = client.get_json('job/x/api/json')
+    second = client.get_json('job/x/api/json', max_age=0)
+    assert client.sent == [{}, {'If-None-Match': '"v1"'}]
+    assert second is first and second == {'builds': [1]}
+
+
+def test_fresh_entries_are_served_without_a_request_until_max_age():
+    client = CachingClient([FakeResponse(200, '{"n": 1}'), FakeResponse(200, '{"n": 2}')], ResponseCache(ttl=5))
+    assert client.get_json('api/json') == {'n': 1}
+    assert client.get_json('api/json') == {'n': 1}
+    assert len(client.sent) == 1
+    client.cache.get('https://jenkins/api/json').stored_at = time.time() - 6
+    assert client.get_json('api/json') == {'n': 2}
+    assert len(client.sent) == 2
+
+
+def test_is_fresh_honours_max_age():
+    cache = ResponseCache(ttl=5)
+    entry = CacheEntry('{}', stored_at=time.time() - 3)
+    assert cache.is_fresh(entry)
+    assert not cache.is_fresh(entry, max_age=2)
+    assert not cache.is_fresh(entry, max_age=0)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    for key in ('a', 'b'):
+        cache.put(key, CacheEntry('{}'))
+    cache.get('a')
+    cache.put('c', CacheEntry('{}'))
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
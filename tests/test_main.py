@@ -0,0 +1,178 @@
+import threading
+import time
+
+import pytest
+
+import main
+
+
+class FakeJenkins:
+    def __init__(self, statuses):
+        self.statuses = statuses
+
+    def job_url(self, *parts):
+        return '/'.join(str(part) for part in parts)
+
+    def get_json(self, url, params=None, max_age=None):
+        status = self.statuses[int(url.split('/')[1])]
+        if isinstance(status, Exception):
+            raise status
+        return status
+
+
+@pytest.mark.parametrize('status, usable', [
+    ({'building': True, 'result': None}, True),
+    ({'building': False, 'result': 'SUCCESS'}, True),
+    ({'building': False, 'result': 'FAILURE'}, False),
+    ({'building': False, 'result': 'ABORTED'}, False),
+    (ConnectionError('down'), False),
+])
+def test_claimed_build_usable(monkeypatch, status, usable):
+    monkeypatch.setattr(main, 'get_jenkins', lambda: FakeJenkins({12: status}))
+    assert main.claimed_build_usable(12) is usable
+
+
+def _build(number, result='SUCCESS', building=False, **params):
+    return {'number': number, 'result': result, 'building': building, 'params': dict(ENV_NAME='nvd', **params)}
+
+
+def test_match_builds_reuses_newest_matching_build():
+    builds = [dict(_build(30, BRANCH='feature'), params={'ENV_NAME': 'xyr'}), _build(20, BRANCH='main')]
+    assert main._match_builds(builds, {'ENV_NAME': 'nvd', 'BRANCH': 'main'}, 'superset') == (20, True, 'SUCCESS')
+
+
+def test_match_builds_does_not_reuse_a_build_older_than_a_differing_one():
+    builds = [_build(30, BRANCH='feature'), _build(20, BRANCH='main')]
+    assert main._match_builds(builds, {'ENV_NAME': 'nvd', 'BRANCH': 'main'}, 'superset') == (None, False, None)
+
+
+def test_match_builds_skips_failed_builds():
+    builds = [_build(31, result='FAILURE', BRANCH='feature'), _build(30, result=None, building=True, BRANCH='main')]
+    assert main._match_builds(builds, {'ENV_NAME': 'nvd', 'BRANCH': 'main'}, 'superset') == (30, True, 'BUILDING')
+
+
+def test_match_builds_env_mode_ignores_other_parameters():
+    builds = [_build(30, BRANCH='feature')]
+    assert main._match_builds(builds, {'ENV_NAME': 'nvd', 'BRANCH': 'main'}, 'env') == (30, True, 'SUCCESS')
+
+
+def test_match_builds_exact_mode_rejects_extra_build_parameters():
+    builds = [_build(30, BRANCH='main', EXTRA='1')]
+    assert main._match_builds(builds, {'ENV_NAME': 'nvd', 'BRANCH': 'main'}, 'exact') == (None, False, None)
+
+
+class FakeSession:
+    def __init__(self, mysql_host):
+        self.mysql_host = mysql_host
+        self.closed = threading.Event()
+
+    def close(self):
+        self.closed.set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def test_probe_mysql_hosts_returns_winner_without_waiting_for_slow_probes(monkeypatch):
+    late = FakeSession('10.0.0.2')
+    late_started = threading.Event()
+    release = threading.Event()
+
+    def probe(mysql_host, user, password, cancel_event):
+        if mysql_host == '10.0.0.1':
+            late_started.wait(5)
+            return FakeSession(mysql_host)
+        late_started.set()
+        release.wait(5)
+        return late
+
+    monkeypatch.setattr(main, 'probe_mysql_host', probe)
+    started = time.monotonic()
+    winner = main.probe_mysql_hosts(['10.0.0.1', '10.0.0.2'], 'user', 'pass')
+    assert winner.mysql_host == '10.0.0.1'
+    assert time.monotonic() - started < 2
+    assert not late.closed.is_set()
+    release.set()
+    assert late.closed.wait(5)
+
+
+class ConsoleJenkins(FakeJenkins):
+    def __init__(self, responses):
+        super().__init__({})
+        self.responses = list(responses)
+
+    def get_json(self, url, params=None, max_age=None):
+        return {'building': True, 'estimatedDuration': 1000, 'timestamp': time.time() * 1000}
+
+    def progressive_text(self, job_name, build_number, start):
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(main.time, 'sleep', lambda seconds: None)
+
+
+def test_tail_console_info_retries_transient_errors(monkeypatch, no_sleep):
+    responses = [('MySQL User: admin\n', 18, True), ConnectionError('reset'),
+                 ('MySQL Pass: secret\n', 37, False)]
+    monkeypatch.setattr(main, 'get_jenkins', lambda: ConsoleJenkins(responses))
+    assert main.tail_console_info(5) == {'mysql_user': 'admin', 'mysql_pass': 'secret'}
+
+
+def test_tail_console_info_gives_up_after_repeated_errors(monkeypatch, no_sleep):
+    responses = [ConnectionError('down')] * main.MAX_CONSECUTIVE_ERRORS
+    monkeypatch.setattr(main, 'get_jenkins', lambda: ConsoleJenkins(responses))
+    assert main.tail_console_info(5) is None
+
+
+def test_tail_console_info_timeout_is_a_failure(monkeypatch, no_sleep):
+    monkeypatch.setattr(main, 'BUILD_WAIT_TIMEOUT', 0)
+    monkeypatch.setattr(main, 'get_jenkins', lambda: ConsoleJenkins([('MySQL User: admin\n', 18, True)]))
+    assert main.tail_console_info(5) is None
+
+
+@pytest.fixture
+def building_env(monkeypatch):
+    """provision_environment against a running build whose console reveals MySQL early"""
+    info = {'mysql_ips': ['10.0.0.1'], 'mysql_user': 'admin', 'mysql_pass': 'secret'}
+    early = FakeSession('10.0.0.1')
+    seeded = []
+
+    def tail(build_number, on_mysql_ready=None):
+        on_mysql_ready(info)
+        return info
+
+    def connect(mysql_info, env_name=None, fixtures=None, keep_session=False):
+        assert keep_session, "MySQL must not be probed again after the early probe"
+        return early
+
+    monkeypatch.setattr(main, 'BASTION_WARMUP', False)
+    monkeypatch.setattr(main, 'check_existing_build_by_env_name', lambda *a, **k: (7, True, 'BUILDING'))
+    monkeypatch.setattr(main, 'tail_console_info', tail)
+    monkeypatch.setattr(main, 'remember_build_info', lambda *args: None)
+    monkeypatch.setattr(main, 'connect_to_mysql_database', connect)
+    monkeypatch.setattr(main, 'seed_database', lambda session, paths: seeded.append(session) or True)
+    return early, seeded
+
+
+def test_provision_seeds_over_the_early_probe_session(monkeypatch, building_env):
+    early, seeded = building_env
+    monkeypatch.setattr(main, 'get_build_status', lambda number: {'building': False, 'result': 'SUCCESS'})
+    result = main.provision_environment({'ENV_NAME': 'abc'}, fixtures=['fixtures'])
+    assert seeded == [early] and early.closed.is_set()
+    assert result['mysql_ok'] is True and result['error'] is None
+
+
+def test_provision_reports_fixtures_refused_for_a_failed_build(monkeypatch, building_env):
+    early, seeded = building_env
+    monkeypatch.setattr(main, 'get_build_status', lambda number: {'building': False, 'result': 'FAILURE'})
+    result = main.provision_environment({'ENV_NAME': 'abc'}, fixtures=['fixtures'])
+    assert seeded == [] and early.closed.is_set()
+    assert result['mysql_ok'] is False and 'not seeded' in result['error']
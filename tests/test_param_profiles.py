@@ -0,0 +1,73 @@
+import pytest
+
+import main
+from param_profiles import ProfileError, ProfileLoader, parse_blocks, validate
+
+
+def test_name_description_value():
+    lines = ['PLATFORMAPI_BRANCH', 'Platform Branch name', 'master']
+    assert parse_blocks(lines) == {'PLATFORMAPI_BRANCH': 'master'}
+
+
+def test_name_value():
+    assert parse_blocks(['COMM_BRANCH', 'master', 'ENV_TYPE', 'dev']) == {'COMM_BRANCH': 'master', 'ENV_TYPE': 'dev'}
+
+
+def test_value_that_reads_like_a_description_word():
+    lines = ['PLATFORMAPI_BRANCH', 'Platform Branch name', 'feature/service-x', 'COMM_BRANCH', 'feature/service-y']
+    assert parse_blocks(lines) == {'PLATFORMAPI_BRANCH': 'feature/service-x', 'COMM_BRANCH': 'feature/service-y'}
+
+
+def test_missing_value_is_no_value():
+    lines = ['CNC_BRANCH', 'CNC branch name', 'MWAPI_BRANCH', 'Middleware Branch name', 'master']
+    assert parse_blocks(lines) == {'MWAPI_BRANCH': 'master'}
+
+
+def test_notes_and_blank_lines_are_skipped():
+    lines = ['ENV_NAME', '', 'Note: ENV NAME should be max 3 alphabets like nvd, as1.', 'xyr', '', 'ENV_TYPE']
+    assert parse_blocks(lines) == {'ENV_NAME': 'xyr'}
+
+
+def test_env_name_format_is_only_a_warning():
+    errors, warnings = validate({'ENV_NAME': 'TooLong', 'CNC_BRANCH': 'master'})
+    assert errors == []
+    assert len(warnings) == 1 and 'ENV_NAME' in warnings[0]
+
+
+def test_bad_branch_is_an_error():
+    errors, _ = validate({'ENV_NAME': 'nvd', 'CNC_BRANCH': 'has space'})
+    assert errors
+
+
+def test_profile_without_value_still_loads(tmp_path):
+    path = tmp_path / 'userParams.txt'
+    path.write_text('ENV_NAME\nxyr\nCNC_BRANCH\nCNC branch name\n')
+    assert ProfileLoader().load(str(path)).params == {'ENV_NAME': 'xyr'}
+
+
+def test_extends_and_warnings_survive_the_compiled_cache(tmp_path):
+    (tmp_path / 'base.txt').write_text('ENV_TYPE\ndev\nCNC_BRANCH\nmaster\n')
+    path = tmp_path / 'mine.txt'
+    path.write_text('@extends base.txt\nENV_NAME\ntoolong\nCNC_BRANCH\nCNC branch name\nfeature/x\n')
+    cache = tmp_path / 'cache'
+    first = ProfileLoader(cache_dir=str(cache)).load(str(path))
+    second = ProfileLoader(cache_dir=str(cache))
+    profile = second.load(str(path))
+    assert second.parses == 0
+    assert profile.params == first.params == {'ENV_TYPE': 'dev', 'CNC_BRANCH': 'feature/x', 'ENV_NAME': 'toolong'}
+    assert profile.warnings == first.warnings and profile.warnings
+
+
+def test_circular_extends(tmp_path):
+    (tmp_path / 'a.txt').write_text('@extends b.txt\nENV_NAME\nnvd\n')
+    (tmp_path / 'b.txt').write_text('@extends a.txt\n')
+    with pytest.raises(ProfileError):
+        ProfileLoader().load(str(tmp_path / 'a.txt'))
+
+
+def test_read_user_params_prints_env_name_warning(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(main, '_profile_loader', ProfileLoader())
+    path = tmp_path / 'userParams.txt'
+    path.write_text('ENV_NAME\ntoolong\n')
+    assert main.read_user_params(str(path)) == {'ENV_NAME': 'toolong'}
+    assert 'Warning: ENV_NAME' in capsys.readouterr().out
@@ -0,0 +1,36 @@
+import schema_snapshot
+
+
+def _stats(rows):
+    return {'type': 'BASE TABLE', 'engine': 'InnoDB', 'rows': rows, 'data_bytes': 16384, 'index_bytes': 0}
+
+
+def _snapshot(tables, columns):
+    return schema_snapshot.build_snapshot('nvd', '10.0.0.1', 'cloudways_new', ['cloudways_new', 'mysql'],
+                                          tables, columns)
+
+
+def test_snapshot_round_trips_through_disk(tmp_path):
+    snapshot = _snapshot({'users': _stats(10)}, {'users': [['id', 'int(11)', 'NO', 'PRI']]})
+    path = schema_snapshot.snapshot_path('nvd', str(tmp_path / 'snapshots'))
+    schema_snapshot.save_snapshot(path, snapshot)
+    assert schema_snapshot.load_snapshot(path) == snapshot
+    assert schema_snapshot.load_snapshot(str(tmp_path / 'missing.json')) is None
+
+
+def test_diff_reports_added_tables_dropped_columns_and_row_changes(tmp_path):
+    old = _snapshot({'users': _stats(10000), 'servers': _stats(500)},
+                    {'users': [['id', 'int(11)', 'NO', 'PRI'], ['email', 'varchar(255)', 'YES', '']],
+                     'servers': [['id', 'int(11)', 'NO', 'PRI']]})
+    new = _snapshot({'users': _stats(25000), 'servers': _stats(520), 'apps': _stats(3)},
+                    {'users': [['id', 'int(11)', 'NO', 'PRI']],
+                     'servers': [['id', 'int(11)', 'NO', 'PRI']],
+                     'apps': [['id', 'int(11)', 'NO', 'PRI'], ['name', 'varchar(64)', 'NO', '']]})
+    path = str(tmp_path / 'nvd.json')
+    schema_snapshot.save_snapshot(path, old)
+    assert schema_snapshot.diff_snapshots(schema_snapshot.load_snapshot(path), new) == [
+        "+ table apps (2 columns, ~3 rows)",
+        "- column users.email",
+        "~ rows users ~10000 -> ~25000",
+    ]
+    assert schema_snapshot.diff_snapshots(new, new) == []
@@ -0,0 +1,120 @@
+import csv
+import gzip
+
+import fixture_seed
+import table_export
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.description = [('id',), ('payload',)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, args=()):
+        pass
+
+    def fetchmany(self, size):
+        chunk, self.rows = self.rows[:size], self.rows[size:]
+        return chunk
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return FakeCursor(list(self.rows))
+
+
+class FakeSession:
+    database = 'cloudways_new'
+
+    def __init__(self, rows):
+        self.connection = FakeConnection(rows)
+
+    def columns(self):
+        return {'blobs': [('id', 'int', 'NO', 'PRI'), ('payload', 'blob', 'YES', '')]}
+
+
+def _export(tmp_path, tables):
+    rows = [(1, b'\xff\x00ab'), (2, None)]
+    session = FakeSession(rows)
+    return table_export.export_tables(session, tables, str(tmp_path),
+                                      cursor_factory=lambda connection: connection.cursor())
+
+
+def test_binary_columns_are_marked_and_written_as_hex(tmp_path):
+    results = _export(tmp_path, ['blobs'])
+    with gzip.open(results[0]['path'], 'rt', encoding='utf-8', newline='') as f:
+        assert list(csv.reader(f)) == [['id', 'payload:hex'], ['1', 'ff006162'], ['2', table_export.CSV_NULL]]
+
+
+def test_duplicate_tables_are_exported_once(tmp_path):
+    results = _export(tmp_path, ['blobs', 'blobs'])
+    assert [result['table'] for result in results] == ['blobs']
+    assert results[0]['rows'] == 2
+
+
+class RangeConnection:
+    def cursor(self):
+        return RangeCursor()
+
+
+class RangeCursor(FakeCursor):
+    def __init__(self):
+        super().__init__([])
+
+    def fetchone(self):
+        return 1, 100
+
+
+def test_only_integer_primary_keys_are_split_into_ranges():
+    connection = RangeConnection()
+    for column_type in ('int(11)', 'bigint(20) unsigned', 'tinyint(4)', 'mediumint', 'smallint(6)'):
+        tasks = table_export.plan_tasks(connection, 't', [['id', column_type, 'NO', 'PRI']], split=4)
+        assert len(tasks) == 4, column_type
+    for column_type in ('point', 'varchar(32)', 'interval_type'):
+        assert len(table_export.plan_tasks(connection, 't', [['id', column_type, 'NO', 'PRI']], split=4)) == 1
+
+
+class SeedCursor(FakeCursor):
+    def __init__(self, seeded):
+        super().__init__([])
+        self.seeded = seeded
+
+    def execute(self, sql, args=()):
+        self.seeded.append(sql)
+
+    def executemany(self, sql, rows):
+        self.seeded.extend(rows)
+
+
+class SeedConnection:
+    def __init__(self):
+        self.seeded = []
+
+    def cursor(self):
+        return SeedCursor(self.seeded)
+
+    def commit(self):
+        pass
+
+
+def test_exported_binary_columns_seed_back_as_bytes(tmp_path):
+    path = _export(tmp_path, ['blobs'])[0]['path']
+    connection = SeedConnection()
+    fixture_seed.seed_file(connection, path, 'blobs')
+    assert connection.seeded == [['1', b'\xff\x00ab'], ['2', None]]
+
+    connection = SeedConnection()
+    fixture_seed.seed_file(connection, path, 'blobs', method='load-data')
+    assert connection.seeded[0].endswith("(`id`, @hex1) SET `payload` = UNHEX(@hex1)")
@@ -0,0 +1,12 @@
+from tracing import Tracer
+
+
+def test_keep_spans_bounds_the_span_list_but_not_the_totals():
+    tracer = Tracer()
+    tracer.keep_spans(3)
+    for i in range(10):
+        with tracer.span('lookup', n=i):
+            pass
+    data = tracer.to_dict()
+    assert [span['attrs']['n'] for span in data['spans']] == [7, 8, 9]
+    assert data['phases']['lookup']['count'] == 10
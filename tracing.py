@@ -0,0 +1,180 @@
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+
+class PhaseTotals:
+    """Accumulated time spent in one phase"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+
+    def add(self, elapsed, failed=False):
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        if failed:
+            self.errors += 1
+
+    def to_dict(self):
+        return {'count': self.count, 'total_s': round(self.total, 6), 'max_s': round(self.max, 6),
+                'errors': self.errors}
+
+
+class Tracer:
+    """Lightweight phase timing for a run
+
+    `span()` records an individual, nestable interval (with attributes) in
+    the trace; `timer()` only adds to a phase's totals, for hot paths that
+    run many times per phase. Both are safe to use from several threads.
+    A long-running process should `keep_spans()` a bounded number of spans;
+    phase totals and counters always cover the whole run.
+    """
+
+    def __init__(self):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started_at = time.time()
+        self.spans = []
+        self.phases = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def keep_spans(self, limit):
+        """Keep only the `limit` most recent spans from now on"""
+        with self._lock:
+            self.spans = deque(self.spans, maxlen=limit)
+
+    @contextmanager
+    def span(self, name, **attrs):
+        stack = self._stack()
+        if stack and stack[-1]['name'] == name:
+            # Re-entering the phase we are already in (e.g. a waiter called
+            # from a tail loop) must not count its time twice
+            yield stack[-1]
+            return
+        record = {'name': name, 'parent': stack[-1]['name'] if stack else None,
+                  'thread': threading.current_thread().name,
+                  'start': round(time.time() - self.started_at, 6), 'attrs': attrs}
+        stack.append(record)
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield record
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            stack.pop()
+            record['duration'] = round(elapsed, 6)
+            record['status'] = 'error' if failed else 'ok'
+            with self._lock:
+                self.spans.append(record)
+                self.phases.setdefault(name, PhaseTotals()).add(elapsed, failed)
+
+    def traced(self, name):
+        """Decorator running the whole function inside span(name)"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @contextmanager
+    def timer(self, name):
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self.add_time(name, time.perf_counter() - started, failed)
+
+    def add_time(self, name, elapsed, failed=False):
+        with self._lock:
+            self.phases.setdefault(name, PhaseTotals()).add(elapsed, failed)
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'run_id': self.run_id,
+                'started_at': self.started_at,
+                'duration_s': round(time.time() - self.started_at, 6),
+                'phases': {name: totals.to_dict() for name, totals in sorted(self.phases.items())},
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                'spans': sorted(self.spans, key=lambda record: record['start']),
+            }
+
+    def write_json(self, path):
+        _atomic_write(path, json.dumps(self.to_dict(), indent=2, default=str))
+
+    def write_prometheus(self, path, prefix='testauto'):
+        """Write a node_exporter textfile-collector file with this run's phase timings and counters"""
+        data = self.to_dict()
+        lines = [
+            f"# HELP {prefix}_run_duration_seconds Wall time of the last run.",
+            f"# TYPE {prefix}_run_duration_seconds gauge",
+            f"{prefix}_run_duration_seconds {data['duration_s']}",
+            f"# HELP {prefix}_run_timestamp_seconds Start time of the last run.",
+            f"# TYPE {prefix}_run_timestamp_seconds gauge",
+            f"{prefix}_run_timestamp_seconds {data['started_at']:.3f}",
+            f"# HELP {prefix}_phase_duration_seconds Time spent in each phase during the last run.",
+            f"# TYPE {prefix}_phase_duration_seconds gauge",
+        ]
+        for name, totals in data['phases'].items():
+            lines.append(f'{prefix}_phase_duration_seconds{{phase="{_escape(name)}"}} {totals["total_s"]}')
+        lines += [
+            f"# HELP {prefix}_phase_calls Times each phase ran during the last run.",
+            f"# TYPE {prefix}_phase_calls gauge",
+        ]
+        for name, totals in data['phases'].items():
+            lines.append(f'{prefix}_phase_calls{{phase="{_escape(name)}"}} {totals["count"]}')
+        counter_names = sorted({counter['name'] for counter in data['counters']})
+        for counter_name in counter_names:
+            metric = f"{prefix}_{counter_name}"
+            lines.append(f"# TYPE {metric} gauge")
+            for counter in data['counters']:
+                if counter['name'] != counter_name:
+                    continue
+                labels = ','.join(f'{k}="{_escape(v)}"' for k, v in counter['labels'].items())
+                lines.append(f"{metric}{{{labels}}} {counter['value']}" if labels else f"{metric} {counter['value']}")
+        _atomic_write(path, '\n'.join(lines) + '\n')
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _atomic_write(path, text):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+tracer = Tracer()